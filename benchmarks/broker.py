@@ -0,0 +1,294 @@
+"""
+A minimal MQTT broker stand-in for the benchmarks, so the real publish path of the client can be measured
+without a mosquitto installation.
+
+It speaks enough of MQTT 3.1.1 and 5 for `MQTT`: CONNECT, PUBLISH with QoS 0, 1 and 2 (the full handshake),
+SUBSCRIBE (with the ``+`` and ``#`` wildcards and the retained messages), PINGREQ and DISCONNECT.
+It does not keep sessions, does not accept topic aliases, and forwards the messages to the subscribers with QoS 0.
+Every received PUBLISH is recorded with its arrival time, on the `time.monotonic` clock of the host.
+
+Usage:
+    python -m benchmarks.broker [--port 1883]
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+@dataclass
+class Received:
+    """
+    A PUBLISH packet which arrived at the broker, ``at`` is a `time.monotonic` value.
+    """
+    topic: str
+    size: int
+    qos: int
+    at: float
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        length, digit = divmod(length, 128)
+        encoded.append(digit | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack(">H", len(data)) + data
+
+
+def packet(packet_type: int, body: bytes, flags: int = 0) -> bytes:
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+def matches(topic_filter: str, topic: str) -> bool:
+    """
+    True if `topic` matches a subscription filter with the ``+`` and ``#`` wildcards.
+    """
+    filter_levels, topic_levels = topic_filter.split("/"), topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or level not in ("+", topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class Session:
+    """
+    One client connection, served by its own thread.
+    """
+
+    def __init__(self, broker: "Broker", sock: socket.socket) -> None:
+        self.broker = broker
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.write_lock = threading.Lock()
+        self.version = 4
+        self.subscriptions: List[str] = []
+
+    def send(self, data: bytes) -> None:
+        with self.write_lock:
+            self.sock.sendall(data)
+
+    def read_string(self, body: bytes, offset: int) -> Tuple[str, int]:
+        length = struct.unpack_from(">H", body, offset)[0]
+        return body[offset + 2:offset + 2 + length].decode("utf-8"), offset + 2 + length
+
+    def skip_properties(self, body: bytes, offset: int) -> int:
+        """
+        Skip the properties of an MQTT v5 packet, the stand-in does not use them.
+        """
+        if self.version < 5:
+            return offset
+        length, shift = 0, 0
+        while True:
+            byte = body[offset]
+            offset += 1
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return offset + length
+
+    def read_packet(self) -> Optional[Tuple[int, int, bytes]]:
+        header = self.reader.read(1)
+        if not header:
+            return None
+        length, shift = 0, 0
+        while True:
+            byte = self.reader.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header[0] >> 4, header[0] & 0x0F, self.reader.read(length)
+
+    def serve(self) -> None:
+        try:
+            while True:
+                received = self.read_packet()
+                if received is None or received[0] == DISCONNECT:
+                    return
+                self.handle(*received)
+        except (OSError, IndexError, struct.error):
+            return
+        finally:
+            self.broker.remove(self)
+            self.sock.close()
+
+    def handle(self, packet_type: int, flags: int, body: bytes) -> None:
+        if packet_type == CONNECT:
+            _, offset = self.read_string(body, 0)
+            self.version = body[offset]
+            # Session present 0, return / reason code 0, and no properties in v5
+            self.send(packet(CONNACK, b"\x00\x00" + (b"\x00" if self.version >= 5 else b"")))
+        elif packet_type == PUBLISH:
+            self.on_publish(flags, body)
+        elif packet_type == PUBREL:
+            self.send(packet(PUBCOMP, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            self.on_subscribe(body)
+        elif packet_type == UNSUBSCRIBE:
+            self.send(packet(UNSUBACK, body[:2] + (b"\x00" if self.version >= 5 else b"")))
+        elif packet_type == PINGREQ:
+            self.send(packet(PINGRESP, b""))
+
+    def on_publish(self, flags: int, body: bytes) -> None:
+        at = time.monotonic()
+        qos, retain = (flags >> 1) & 0x03, flags & 0x01
+        topic, offset = self.read_string(body, 0)
+        packet_id = body[offset:offset + 2] if qos else b""
+        payload = body[self.skip_properties(body, offset + len(packet_id)):]
+        if qos == 1:
+            self.send(packet(PUBACK, packet_id))
+        elif qos == 2:
+            self.send(packet(PUBREC, packet_id))
+        self.broker.deliver(Received(topic, len(payload), qos, at), payload, retain)
+
+    def on_subscribe(self, body: bytes) -> None:
+        offset = self.skip_properties(body, 2)
+        filters = []
+        while offset < len(body):
+            topic_filter, offset = self.read_string(body, offset)
+            filters.append(topic_filter)
+            offset += 1
+        self.subscriptions.extend(filters)
+        properties = b"\x00" if self.version >= 5 else b""
+        # Every subscription is granted with QoS 0
+        self.send(packet(SUBACK, body[:2] + properties + bytes(len(filters)), 0))
+        for topic, payload in self.broker.retained_for(filters):
+            self.forward(topic, payload)
+
+    def forward(self, topic: str, payload: bytes) -> None:
+        properties = b"\x00" if self.version >= 5 else b""
+        self.send(packet(PUBLISH, encode_string(topic) + properties + payload))
+
+
+class Broker:
+    """
+    The broker stand-in, it listens on `host` from a background thread.
+
+    Parameters
+    ----------
+    host : str, optional
+        The address to listen on.
+    port : int, optional
+        The port to listen on, a free port is picked if 0.
+    on_message : Callable[[Received, bytes], None], optional
+        Called with every received message and its payload, on the thread of the publishing client.
+
+    Attributes
+    ----------
+    received : List[Received]
+        The received messages, in the order of arrival.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 on_message: Optional[Callable[[Received, bytes], None]] = None) -> None:
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.received: List[Received] = []
+        self.retained: Dict[str, bytes] = {}
+        self.sessions: List[Session] = []
+        self.lock = threading.Lock()
+        self.server: Optional[socket.socket] = None
+
+    def __enter__(self) -> "Broker":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> "Broker":
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept, name="broker", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        with self.lock:
+            sessions = list(self.sessions)
+        for session in sessions:
+            session.sock.close()
+
+    def accept(self) -> None:
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = Session(self, sock)
+            with self.lock:
+                self.sessions.append(session)
+            threading.Thread(target=session.serve, name="broker-session", daemon=True).start()
+
+    def remove(self, session: Session) -> None:
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def deliver(self, message: Received, payload: bytes, retain: bool) -> None:
+        with self.lock:
+            self.received.append(message)
+            if retain:
+                if payload:
+                    self.retained[message.topic] = payload
+                else:
+                    self.retained.pop(message.topic, None)
+            subscribers = [session for session in self.sessions
+                           if any(matches(topic_filter, message.topic) for topic_filter in session.subscriptions)]
+        if self.on_message is not None:
+            self.on_message(message, payload)
+        for session in subscribers:
+            try:
+                session.forward(message.topic, payload)
+            except OSError:
+                continue
+
+    def retained_for(self, filters: List[str]) -> List[Tuple[str, bytes]]:
+        with self.lock:
+            return [(topic, payload) for topic, payload in self.retained.items()
+                    if any(matches(topic_filter, topic) for topic_filter in filters)]
+
+    def messages(self, topic: str) -> List[Received]:
+        """
+        The received messages of a topic.
+        """
+        with self.lock:
+            return [message for message in self.received if message.topic == topic]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    def report(message: Received, payload: bytes) -> None:
+        print(f"{message.topic:30} {message.size:>10} bytes  QoS {message.qos}")
+
+    with Broker(args.host, args.port, on_message=report) as broker:
+        print(f"Listening on {broker.host}:{broker.port}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
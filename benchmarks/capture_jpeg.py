@@ -0,0 +1,106 @@
+"""
+Compares the legacy RGB + PIL capture path with the direct-to-JPEG capture path of `Camera`.
+
+- ``rgb-pil``: RGB frame from the camera, encoded by PIL
+  (what `Transmit.create_base64_image` did before `Camera.capture_jpeg`).
+- ``jpeg``: `Camera.capture_jpeg`, YUV420 frame encoded from its planes by libjpeg-turbo
+  (falls back to PIL if `simplejpeg` is not installed).
+
+Both paths encode with the same JPEG quality, the old path always used the PIL default of 75.
+
+Every path runs in its own process. The peak RSS is reset after the first frame (which creates
+the synthetic image when picamera2 is not installed), and the growth of the peak over the resident
+memory at that point is reported, so it only covers the memory used by the capture loop.
+Every capture copies the synthetic frame, the same way the sensor hands out a new buffer for every frame.
+
+Usage:
+    python -m benchmarks.capture_jpeg [--frames 10] [--quality 75]
+"""
+import argparse
+import io
+import json
+import subprocess
+import sys
+import time
+from PIL import Image
+from sentinel_mrhat_cam.camera import Camera
+
+PATHS = ["rgb-pil", "jpeg"]
+RESOLUTIONS = ["HD", "3K", "4K"]
+
+
+def reset_peak_rss() -> None:
+    # Writing 5 to clear_refs resets the peak resident set size (VmHWM) of the process
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def memory_status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def run_path(path: str, resolution: str, frames: int, quality: int) -> dict:
+    camera = Camera({"quality": resolution})
+    camera.quality = quality
+    if path == "rgb-pil":
+        camera.format = "BGR888"
+    camera.start()
+
+    def capture_rgb_pil() -> bytes:
+        buffer = io.BytesIO()
+        Image.fromarray(camera.capture().copy()).save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+    def capture_jpeg() -> bytes:
+        return camera.encode_jpeg(camera.capture().copy())
+
+    capture = capture_rgb_pil if path == "rgb-pil" else capture_jpeg
+    # The first frame creates the synthetic image, it is not part of the measurement
+    capture()
+    reset_peak_rss()
+    baseline_rss = memory_status_mb("VmRSS")
+
+    timings = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        size = len(capture())
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "path": path,
+        "resolution": resolution,
+        "format": camera.format,
+        "jpeg_bytes": size,
+        "ms_per_frame": 1000 * sum(timings) / len(timings),
+        "peak_rss_mb": memory_status_mb("VmHWM") - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "RESOLUTION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_path(args.child[0], args.child[1], args.frames, args.quality)))
+        return
+
+    print(f"{'':4} {'path':8} {'format':7} {'jpeg bytes':>11} {'ms/frame':>9} {'peak RSS growth MB':>19}")
+    for resolution in RESOLUTIONS:
+        for path in PATHS:
+            command = [sys.executable, "-m", "benchmarks.capture_jpeg", "--frames", str(args.frames),
+                       "--quality", str(args.quality), "--child", path, resolution]
+            output = subprocess.run(command, check=True, capture_output=True, text=True)
+            result = json.loads(output.stdout.splitlines()[-1])
+            print(f"{resolution:4} {path:8} {result['format']:7} {result['jpeg_bytes']:>11} "
+                  f"{result['ms_per_frame']:>9.1f} {result['peak_rss_mb']:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Measures the always-on mode of the app end to end: the `Pipeline` of `Transmit` captures with the emulated camera,
+builds the messages with the telemetry read from a fake sysfs, and publishes them through the real `MQTT` client
+to the broker stand-in of `benchmarks.broker` on localhost.
+
+For every resolution it reports:
+
+- ``fps``: the image messages arriving at the broker per second,
+- ``latency_ms``: the percentiles of the time from the start of the capture to the arrival at the broker,
+- ``bytes_per_frame``: the mean size of the image messages on the wire,
+- ``stages``: the CPU time (`time.thread_time` of the stage thread) and the wall time per frame of the capture,
+  encode and publish stages. The network thread of the client and the broker are not part of any stage,
+  the CPU time of the whole process is in ``process_cpu_ms``.
+
+The first `--warmup` frames (connecting, the first synthetic frame) are not part of the measurement.
+Every resolution runs in its own process. The results are saved as JSON with the commit they were measured at,
+`--baseline` compares them with an earlier result file.
+
+Usage:
+    python -m benchmarks.end_to_end [--frames 20] [--format binary] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.connection import ConnectionManager
+from sentinel_mrhat_cam.energy import EnergyMeter
+from sentinel_mrhat_cam.logger import Logger
+from sentinel_mrhat_cam.mqtt import MQTT
+from sentinel_mrhat_cam.pipeline import Pipeline
+from sentinel_mrhat_cam.power import PowerSampler
+from sentinel_mrhat_cam.static_config import IMAGETOPIC, CONNECT_TIMEOUT
+from sentinel_mrhat_cam.telemetry import Telemetry
+from sentinel_mrhat_cam.transmit import Transmit
+from benchmarks.broker import Broker
+
+RESOLUTIONS = ["HD", "3K", "4K"]
+PERCENTILES = [50, 90, 99]
+STAGES = ["capture", "encode", "publish"]
+
+BATTERY_UEVENT = {
+    "POWER_SUPPLY_VOLTAGE_NOW": 3950000,
+    "POWER_SUPPLY_VOLTAGE_AVG": 3960000,
+    "POWER_SUPPLY_CURRENT_NOW": -420000,
+    "POWER_SUPPLY_CURRENT_AVG": -410000,
+    "POWER_SUPPLY_CAPACITY": 87,
+    "POWER_SUPPLY_TEMP": 285,
+}
+CHARGER_UEVENT = {"POWER_SUPPLY_VOLTAGE_NOW": 5020000, "POWER_SUPPLY_CURRENT_NOW": 510000}
+
+
+def fake_sysfs(directory: str) -> Dict[str, str]:
+    """Write the battery, charger and thermal files the telemetry reads, return their paths."""
+    paths = {name: os.path.join(directory, name) for name in ("battery_path", "charger_path", "thermal_path")}
+    for name, values in (("battery_path", BATTERY_UEVENT), ("charger_path", CHARGER_UEVENT)):
+        with open(paths[name], "w") as f:
+            f.writelines(f"{key}={value}\n" for key, value in values.items())
+    with open(paths["thermal_path"], "w") as f:
+        f.write("41250\n")
+    return paths
+
+
+class MeasuredPipeline(Pipeline):
+    """
+    The pipeline of the always-on mode, which records the capture times and the CPU time of every stage,
+    and stops after `frames` published messages.
+    """
+
+    def __init__(self, transmit: Transmit, frames: int) -> None:
+        super().__init__(transmit)
+        self.frames = frames
+        self.published = 0
+        self.captured: List[float] = []
+        self.cpu = {stage: 0.0 for stage in STAGES}
+
+    def measure(self, stage: str, work: Callable[[Any], Any], item: Any) -> Any:
+        start = time.thread_time()
+        try:
+            return work(item)
+        finally:
+            self.cpu[stage] += time.thread_time() - start
+
+    def capture(self, item: None) -> tuple:
+        self.captured.append(time.monotonic())
+        return self.measure("capture", super().capture, item)
+
+    def encode(self, item: tuple) -> Any:
+        return self.measure("encode", super().encode, item)
+
+    def publish(self, message: Any) -> None:
+        self.measure("publish", super().publish, message)
+        self.published += 1
+        if self.published >= self.frames:
+            self.stop()
+
+
+def run_resolution(resolution: str, frames: int, warmup: int, message_format: str) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory, Broker() as broker:
+        sysfs = fake_sysfs(directory)
+        mqtt = MQTT()
+        mqtt.broker, mqtt.port = broker.host, broker.port
+        connection = ConnectionManager(mqtt)
+        # The logger shares the connection, the same way as in the app
+        ConnectionManager._shared = connection
+
+        camera = Camera({"quality": resolution})
+        camera.start()
+        transmit = Transmit(camera, Logger(os.path.join(directory, "log_config.yaml")), None, mqtt,
+                            message_format=message_format, telemetry=Telemetry(**sysfs), connection=connection)
+        if transmit.power is not None:
+            transmit.power = PowerSampler(sysfs["battery_path"], sysfs["charger_path"])
+            transmit.power.start()
+        transmit.energy = EnergyMeter(transmit.power, os.path.join(directory, "energy_log.csv"))
+        transmit.connect_mqtt()
+        if not transmit.ensure_connected(CONNECT_TIMEOUT):
+            raise ConnectionError(f"The broker stand-in did not accept the connection on port {broker.port}")
+
+        pipeline = MeasuredPipeline(transmit, warmup + frames)
+        process_start = time.process_time()
+        pipeline.run()
+        process_cpu = time.process_time() - process_start
+
+        if transmit.power is not None:
+            transmit.power.stop()
+        connection.disconnect()
+        images = broker.messages(IMAGETOPIC)
+
+    # Every frame is published in the order of the capture, one at a time
+    arrivals = [message.at for message in images]
+    latencies = [arrival - captured for arrival, captured in zip(arrivals, pipeline.captured)][warmup:]
+    measured = len(arrivals) - warmup
+    summaries = {summary["stage"]: summary for summary in (stats.summary() for stats in pipeline.stats)}
+    latency_ms = {f"p{percentile}": 1000 * float(np.percentile(latencies, percentile)) for percentile in PERCENTILES}
+    latency_ms["max"] = 1000 * max(latencies)
+    return {
+        "resolution": resolution,
+        "width": camera.width,
+        "height": camera.height,
+        "frames": measured,
+        "fps": measured / (arrivals[-1] - arrivals[warmup - 1]) if measured > 0 else 0.0,
+        "latency_ms": latency_ms,
+        "bytes_per_frame": float(np.mean([message.size for message in images[warmup:]])),
+        "stages": {stage: {"cpu_ms": 1000 * pipeline.cpu[stage] / max(summaries[stage]["items"], 1),
+                           "wall_ms": summaries[stage]["avg_ms"]} for stage in STAGES},
+        "process_cpu_ms": 1000 * process_cpu / len(arrivals),
+    }
+
+
+def commit() -> Optional[str]:
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result["resolution"]: result for result in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for result in results:
+        before = previous.get(result["resolution"])
+        if before is None:
+            continue
+        print(f"{result['resolution']:4} fps {100 * (result['fps'] / before['fps'] - 1):+6.1f}%  "
+              f"p50 latency {100 * (result['latency_ms']['p50'] / before['latency_ms']['p50'] - 1):+6.1f}%  "
+              f"bytes/frame {100 * (result['bytes_per_frame'] / before['bytes_per_frame'] - 1):+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--format", default="binary", choices=["json", "binary", "tiles"])
+    parser.add_argument("--resolutions", nargs="+", default=RESOLUTIONS, choices=RESOLUTIONS)
+    parser.add_argument("--output", help="The JSON file of the results, end_to_end_<commit>.json by default")
+    parser.add_argument("--baseline", help="An earlier result file to compare with")
+    parser.add_argument("--child", metavar="RESOLUTION", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.warmup = max(args.warmup, 1)
+
+    if args.child:
+        print(json.dumps(run_resolution(args.child, args.frames, args.warmup, args.format)))
+        return
+
+    results = []
+    print(f"{'':4} {'fps':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'bytes/frame':>12} "
+          + " ".join(f"{stage + ' cpu ms':>16}" for stage in STAGES))
+    for resolution in args.resolutions:
+        command = [sys.executable, "-m", "benchmarks.end_to_end", "--frames", str(args.frames),
+                   "--warmup", str(args.warmup), "--format", args.format, "--child", resolution]
+        output = subprocess.run(command, check=True, capture_output=True, text=True)
+        result = json.loads(output.stdout.splitlines()[-1])
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"{resolution:4} {result['fps']:>6.2f} {latency['p50']:>8.1f} {latency['p90']:>8.1f} "
+              f"{latency['p99']:>8.1f} {result['bytes_per_frame']:>12.0f} "
+              + " ".join(f"{result['stages'][stage]['cpu_ms']:>16.1f}" for stage in STAGES))
+
+    revision = commit()
+    report = {
+        "commit": revision,
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {"frames": args.frames, "warmup": args.warmup, "format": args.format},
+        "results": results,
+    }
+    output_path = args.output or f"end_to_end_{revision or 'unknown'}.json"
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output_path}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the JSON (base64) and the binary image message formats.
+
+For every resolution the same JPEG image is wrapped into both message formats,
+and the size of the payload on the wire and the time of building the message is measured.
+
+Usage:
+    python -m benchmarks.message_format [--repeat 20]
+"""
+import argparse
+import io
+import json
+import time
+import numpy as np
+import pybase64
+from PIL import Image
+from sentinel_mrhat_cam import BinaryMessage
+
+RESOLUTIONS = {
+    "HD": (1920, 1080),
+    "3K": (2560, 1440),
+    "4K": (3840, 2160),
+}
+
+TELEMETRY = {
+    "timestamp": "2024-07-11T18:52:05.179690+00:00",
+    "cpuTemp": 35.6,
+    "batteryTemp": 48.5,
+    "batteryCharge": 95
+}
+
+
+def make_frame(width: int, height: int) -> np.ndarray:
+    """A smooth gradient with sensor-like noise, so the JPEG size is close to a real outdoor frame."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(frame: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def json_message(jpeg: bytes) -> bytes:
+    message = dict(TELEMETRY)
+    message["image"] = pybase64.b64encode(jpeg).decode("utf-8")
+    # paho encodes str payloads to UTF-8 before sending, so this copy is part of the cost
+    return json.dumps(message).encode("utf-8")
+
+
+def binary_message(jpeg: bytes) -> bytes:
+    return BinaryMessage.pack(TELEMETRY, jpeg)
+
+
+def measure(function, jpeg: bytes, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = function(jpeg)
+        timings.append(time.perf_counter() - start)
+    return len(payload), float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'':4} {'jpeg':>10} {'json bytes':>12} {'binary bytes':>13} {'saved':>7} "
+          f"{'json ms':>9} {'binary ms':>10}")
+    for name, (width, height) in RESOLUTIONS.items():
+        jpeg = encode_jpeg(make_frame(width, height))
+        json_size, json_time = measure(json_message, jpeg, args.repeat)
+        binary_size, binary_time = measure(binary_message, jpeg, args.repeat)
+        saved = 100 * (1 - binary_size / json_size)
+        print(f"{name:4} {len(jpeg):>10} {json_size:>12} {binary_size:>13} {saved:>6.1f}% "
+              f"{json_time * 1000:>9.2f} {binary_time * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 
 from paho.mqtt import client as mqtt_client
 import logging
-from sentinel_mrhat_cam import BROKER, PORT, USERNAME, PASSWORD, LOGGING_TOPIC, QOS
+from sentinel_mrhat_cam import BROKER, PORT, USERNAME, PASSWORD, LOGGING_TOPIC, QOS, MQTT_V5
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -27,7 +27,8 @@ def on_message(client, userdata, msg):
 
 
 def connect_mqtt() -> mqtt_client.Client:
-    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2)
+    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                protocol=mqtt_client.MQTTv5 if MQTT_V5 else mqtt_client.MQTTv311)
     client.username_pw_set(USERNAME, PASSWORD)
     client.on_connect = on_connect
     client.on_message = on_message
@@ -0,0 +1,48 @@
+import io
+import json
+import sys
+from datetime import datetime
+import numpy as np
+from paho.mqtt import client as mqtt_client
+from sentinel_mrhat_cam import BROKER, PORT, USERNAME, PASSWORD, POWERREQUESTTOPIC, POWERDATATOPIC, PowerSampler
+from sentinel_mrhat_cam import MQTT_V5
+
+broker = BROKER
+port = PORT
+
+# The length of the requested window in seconds, all the samples of the device if not given
+seconds = float(sys.argv[1]) if len(sys.argv) > 1 else None
+
+
+def connect_mqtt() -> mqtt_client.Client:
+    def on_connect(client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            print("Connected to MQTT Broker!")
+            client.subscribe(POWERDATATOPIC)
+            message = json.dumps({"seconds": seconds}) if seconds else ""
+            client.publish(POWERREQUESTTOPIC, message, qos=1)
+        else:
+            print(f"Failed to connect, return code {rc}")
+
+    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                protocol=mqtt_client.MQTTv5 if MQTT_V5 else mqtt_client.MQTTv311)
+    client.username_pw_set(USERNAME, PASSWORD)
+    client.on_connect = on_connect
+    client.connect(broker, port)
+    return client
+
+
+def on_message(client, userdata, msg):
+    samples = np.load(io.BytesIO(msg.payload))
+    columns = ("time",) + PowerSampler.COLUMNS
+    filename = f"power_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    np.savetxt(filename, np.column_stack([samples[column] for column in columns]), delimiter=",",
+               header=",".join(columns), comments="", fmt="%.6f")
+    print(f"Saved {len(samples['time'])} samples to {filename}")
+    client.disconnect()
+
+
+if __name__ == '__main__':
+    client = connect_mqtt()
+    client.on_message = on_message
+    client.loop_forever()
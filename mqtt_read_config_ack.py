@@ -1,5 +1,5 @@
 from paho.mqtt import client as mqtt_client
-from sentinel_mrhat_cam import BROKER, CONFIGACKTOPIC, PORT
+from sentinel_mrhat_cam import BROKER, CONFIGACKTOPIC, PORT, MQTT_V5
 import logging
 
 broker = BROKER
@@ -19,7 +19,8 @@ def connect_mqtt() -> mqtt_client.Client:
         else:
             print(f"Failed to connect, return code {rc}")
 
-    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2)
+    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                protocol=mqtt_client.MQTTv5 if MQTT_V5 else mqtt_client.MQTTv311)
     client.username_pw_set("er-edge", "admin")
     client.enable_logger()
     client.on_connect = on_connect
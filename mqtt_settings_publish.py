@@ -1,6 +1,8 @@
 import json
 from paho.mqtt import client as mqtt_client
-from sentinel_mrhat_cam import BROKER
+from sentinel_mrhat_cam import BROKER, MQTT_V5, SESSION_EXPIRY
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
 broker = BROKER
 port = 1883
@@ -17,7 +19,8 @@ def connect_mqtt():
         else:
             print(f"Failed to connect, return code {rc}")
 
-    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2)
+    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                protocol=mqtt_client.MQTTv5 if MQTT_V5 else mqtt_client.MQTTv311)
     client.on_connect = on_connect
     client.connect(broker, port)
     return client
@@ -31,7 +34,12 @@ def publish(client):
         # Convert the JSON object to a string
         message = json.dumps(config_data)
 
-        result = client.publish(topic, message, qos=2)
+        properties = None
+        if MQTT_V5:
+            # The config waits in the session of a shut down device, until the session expires
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.MessageExpiryInterval = SESSION_EXPIRY
+        result = client.publish(topic, message, qos=2, properties=properties)
         result.wait_for_publish()
         status = result[0]
         if status == 0:
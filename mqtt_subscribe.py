@@ -8,7 +8,8 @@ import io
 from datetime import datetime
 from dateutil import parser
 import pytz
-from sentinel_mrhat_cam import BROKER
+from sentinel_mrhat_cam import BROKER, BinaryMessage, ChunkedMessage, ChunkAssembler, TileCompositor
+from sentinel_mrhat_cam import FRAMEREQUESTTOPIC, FULLFRAMETOPIC, MQTT_V5, V5Transport
 
 start_time = None
 
@@ -30,7 +31,8 @@ def connect_mqtt() -> mqtt_client.Client:
         else:
             print(f"Failed to connect, return code {rc}")
 
-    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2)
+    client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2,
+                                protocol=mqtt_client.MQTTv5 if MQTT_V5 else mqtt_client.MQTTv311)
     client.username_pw_set("er-edge-3c547181", "admin")
     client.enable_logger()
     client.on_connect = on_connect
@@ -41,6 +43,51 @@ def connect_mqtt() -> mqtt_client.Client:
 # Variable to store the time when the image is received
 start_time = None
 
+# Collects the chunks of the chunked image transfers
+assembler = ChunkAssembler()
+
+# Rebuilds the frames of the tile-based messages
+compositor = TileCompositor()
+
+
+def decode(message, properties=None):
+    """
+    Decode any message format of the image topic into the metadata and the JPEG image.
+    Returns None if there is no image to process (yet).
+    """
+    if ChunkedMessage.is_chunk(message):
+        # Chunks can arrive out of order, the image is only processed once all of them arrived
+        message = assembler.add(message)
+        if message is None:
+            return None
+
+    # MQTT v5 message: the metadata is in the user properties, the payload is the raw image
+    unpacked = V5Transport.unpack(message, properties)
+    if unpacked is not None or BinaryMessage.is_binary(message):
+        # Binary message: metadata header followed by the raw JPEG bytes
+        payload, image_data = unpacked if unpacked is not None else BinaryMessage.unpack(message)
+        if 'keyframe' in payload:
+            # Tile-based message: paste the changed tiles onto the last keyframe
+            image_data = compositor.add(payload, image_data)
+            if image_data is None:
+                return None
+    else:
+        # Parse the JSON message and decode the Base64 image data
+        payload = json.loads(message)
+        if 'error' in payload:
+            logging.error(f"Full resolution frame {payload['timestamp']}: {payload['error']}")
+            return None
+        if 'image' not in payload:
+            # Heartbeat: the frame did not change enough, only the telemetry was sent
+            logging.info(f"Heartbeat at {payload['timestamp']}: frame unchanged "
+                         f"(sent: {payload.get('framesSent')}, suppressed: {payload.get('framesSuppressed')})")
+            logging.info(f"The cpu temperature is: {payload['cpuTemp']} °C")
+            logging.info(f"The battery percentage is: {payload['batteryCharge']} %")
+            return None
+        image_data = base64.b64decode(payload['image'])
+
+    return payload, image_data
+
 
 def subscribe(client: mqtt_client.Client):
     def on_message(client, userdata, msg):
@@ -50,12 +97,22 @@ def subscribe(client: mqtt_client.Client):
         logging.info(f"Time taken to receive: {time_difference.total_seconds():.2f} seconds")
 
         try:
-            # Parse the JSON message
-            payload = json.loads(msg.payload)
-
-            # Extract timestamp and image data
+            decoded = decode(msg.payload, getattr(msg, "properties", None))
+            if decoded is None:
+                return
+            payload, image_data = decoded
+
+            if payload.get('fullResolution'):
+                # Answer to a frame request, it has no telemetry
+                timestamp = parser.isoparse(payload['timestamp'])
+                output_image_path = f"images/image_{timestamp.strftime('%Y%m%d_%H%M%S')}_full.jpg"
+                with open(output_image_path, "wb") as f:
+                    f.write(image_data)
+                logging.info(f"Received and saved the full resolution frame as {output_image_path}")
+                return
+
+            # Extract timestamp and telemetry
             timestamp_str = payload['timestamp']
-            image_base64 = payload['image']
             cpu_temp = payload['cpuTemp']
             battery_temp = payload['batteryTemp']
             battery_percentage = payload['batteryCharge']
@@ -63,9 +120,6 @@ def subscribe(client: mqtt_client.Client):
             # Parse the timestamp string
             timestamp = parser.isoparse(timestamp_str)
 
-            # Decode the Base64 image data
-            image_data = base64.b64decode(image_base64)
-
             # Create a timestamp string for filenames
             time_string = timestamp.strftime("%Y%m%d_%H%M%S")
 
@@ -93,9 +147,18 @@ def subscribe(client: mqtt_client.Client):
             logging.error(f"Payload: {msg.payload[:100]}...")
 
     client.subscribe(topic)
+    client.subscribe(FULLFRAMETOPIC)
     client.on_message = on_message
 
 
+def request_full_frame(client: mqtt_client.Client, timestamp: str):
+    """
+    Request the full resolution version of a preview image. The request is retained,
+    so a device which is shut down serves it after its next boot.
+    """
+    client.publish(FRAMEREQUESTTOPIC, json.dumps({"timestamp": timestamp}), qos=2, retain=True)
+
+
 def run():
     global start_time
     client = connect_mqtt()
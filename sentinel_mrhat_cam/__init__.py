@@ -24,6 +24,7 @@ How often the images will be taken.
 
 #### Mode
 Either **one-shot** (take one picture, send it, then shut down), **always-on** (taking and sending them as fast as it can without break), and **periodic** (taking and sending pictures with a given period).
+In **always-on** mode the capture, the encoding and the publishing run concurrently, connected by bounded queues. The depth of the queues can be set in [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html), and the throughput of each stage is logged every `PIPELINE_STATS_INTERVAL` seconds.
 In production only the **periodic** mode will be used.
 
 About where to send the config, see the [Messaging](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam.html#messaging) section.
@@ -195,12 +196,35 @@ python3 -m sentinel_mrhat_cam.main
 
 Be aware, that this way you will miss out on the bash_log and the hardware_log, it will also not handle the cases where the script exits with an exit code.
 
+To see where the startup time goes, add `--startup-report`. Once the app is started, it prints the time spent loading every module (like `python -X importtime`) and the initialization steps to the standard error.
+```bash
+python3 -m sentinel_mrhat_cam.main --startup-report
+```
+
 <br><br><br><br>
 
 ## Messaging 💬
 
 You can edit the ip address of the broker, the port and the QoS level in the [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html) file. The names of the mqtt topics can also be found here, along with other constants.
 
+If `MQTT_V5` is enabled, the device and the receiver scripts speak MQTT v5
+(see `V5Transport` in [mqtt5.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/mqtt5.html)):
+
+- The image and the log topics are sent as topic aliases, if the broker accepts them. Only the QoS 0 messages
+use them, the client resends the others with their topic after a reconnect.
+- The binary image messages (`messageFormat` `binary` or `tiles`) carry their metadata as user properties
+(every value as JSON), and the payload is the raw image. `mqtt_subscribe.py` rebuilds the metadata.
+- The image messages expire after `IMAGE_EXPIRY` seconds.
+- The broker keeps the session of the device (`CLIENT_ID`) for `SESSION_EXPIRY` seconds. The config topic is
+subscribed with `QOS`, so a config sent while the device is shut down is delivered as soon as it connects.
+
+The outbound messages are of four classes: `config-ack`, `image`, `telemetry` and `log`, in the order of priority
+(see `OutboundScheduler` in [outbound.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/outbound.html)).
+Every class has its QoS level in `OUTBOUND_QOS`, and the topics are mapped to their class by `OUTBOUND_CLASSES`.
+A waiting message of a higher class goes first, the logs wait while an image is in flight, and if `OUTBOUND_RATE`
+is set, the messages are shaped to that many bytes per second. The time the messages of each class waited
+is sent in the `outbound` field of the telemetry.
+
 Each device will have a unique name and topic for receiving the config. E.g: for one device the topic where the config is sent may look like this: **settings/er-edge-16b9ac84**, for another it may look like this: **settings/er-edge-1169bc8a**. In the examples below we will simply use **er-edge** as the username.
 
 **Subscribe topic:** `config/er-edge`
@@ -213,12 +237,32 @@ The defaul config.json message:
      "mode": "periodic",
      "period": 15,
      "wakeUpTime": "06:59:31",
-     "shutDownTime": "22:00:00"
+     "shutDownTime": "22:00:00",
+     "messageFormat": "json",
+     "powerPolicy": {
+          "enabled": false,
+          "lowBattery": 40,
+          "criticalBattery": 15,
+          "lowBatteryPeriodFactor": 4,
+          "surplusCurrent": 300,
+          "burstMinBattery": 60,
+          "fallingRate": 5
+     }
 }
 ```
 
 - In case there is something wrong with the received config, the default will be used.
 - If the `period` in the config is smaller than the `SHUTDOWN_THRESHOLD` in the [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html) file, then the device will never shut down, it will just wait inside the script when necessary. If its bigger, it will shut down for the appropriate amount of time between taking and sending pictures.
+- The shutdown is shortened by the time the device needs to shut down, boot and get ready, which is measured
+on every cycle and kept in `state_file.json`. The device usually wakes up a little early, and waits for the planned
+time of the next image, so the period is kept accurately
+(see `BootOverhead` in [schedule.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/schedule.html)).
+- If `powerPolicy` is enabled, the period and the resolution are adapted to the battery in periodic mode:
+the period is stretched by `lowBatteryPeriodFactor` below `lowBattery` percent (twice if the charge falls faster
+than `fallingRate` percent per hour), HD images are taken below `criticalBattery` percent, and while the charger
+delivers at least `surplusCurrent` mA above `burstMinBattery` percent, the device stays awake and takes the images
+as often as possible. The decisions are logged with their reasons
+(see `PowerPolicy` in [schedule.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/schedule.html)).
 
 **Publish topic:** `er-edge/confirm`
 
@@ -238,11 +282,129 @@ Example message:
      "image":"/9j/4AAQSkZJRgABAQAAAQAB...."
      "cpuTemp":35.6,
      "batteryTemp":48.5,
-     "batteryCharge": 95
+     "batteryCharge": 95,
+     "connection": {"clients": 1, "connects": 1, "reconnects": 0, "disconnects": 0, "attempts": 1, "failures": 0,
+                    "state": "connected", "uptime": 12.3}
 }
 ```
 
 - Along with the image we also send a timestamp (ISO8601), and a few hardware values.
+The hardware values are read straight from sysfs by the `Telemetry` service, and reused for a few seconds
+(`TELEMETRY_TTL`), so building a message does not start any processes
+(see [telemetry.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/telemetry.html)).
+The timestamp comes from the shared `Clock` in [system.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/system.html),
+which reads `timedatectl` once per boot and counts the time on the monotonic clock from then on.
+- `connection` is the statistics of the MQTT connection. The app, the logger and the config handling share
+a single connection to the broker, `clients` is the number of MQTT clients created by the process, so it should
+stay 1. `uptime` is the seconds since the broker last accepted the connection
+(see `ConnectionManager` in [connection.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/connection.html)).
+The connection is made in the background, and made again when the link drops, with a delay doubling from
+`RECONNECT_MIN_DELAY` up to `RECONNECT_MAX_DELAY` seconds after every failed attempt, shortened by a random jitter.
+`attempts` and `failures` count the connection attempts, `state` is the state of the reconnecting
+(see `Reconnector` in [reconnect.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/reconnect.html)).
+- `outbound` has the `messages`, `bytes`, the `meanWait` and `maxWait` seconds and the number of `yields`
+of every message class which sent messages (see the [Messaging](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam.html#messaging) section).
+- If `POWER_SAMPLING` is enabled, the messages also carry a `power` summary of the samples taken since
+the previous message: the number of samples, the duration, the `[min, mean, max]` of the battery and charger
+voltages and currents and of the battery power, and the battery energy in joules. The raw samples can be
+downloaded with `mqtt_power_dump.py`
+(see `PowerSampler` in [power.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/power.html)).
+- If `messageFormat` is set to `binary` in the config, the image is sent as raw JPEG bytes instead of
+a base64 string inside the JSON, which makes the messages about 25% smaller.
+The binary message starts with a 12 byte header, followed by the compact JSON metadata (same keys as above,
+without `image`), followed by the JPEG image:
+
+| Offset | Size | Field |
+|--------|------|-------|
+| 0      | 4    | Magic bytes `SMCI` |
+| 4      | 1    | Format version, currently `1` |
+| 5      | 1    | Flags, reserved |
+| 6      | 2    | Length of the metadata in bytes, big-endian |
+| 8      | 4    | Length of the image in bytes, big-endian |
+
+- If `messageFormat` is set to `tiles`, the frame is split into a grid of `TILE_SIZE` pixel tiles.
+A full keyframe is sent every `TILE_KEYFRAME_INTERVAL` frames, and in between only the tiles which have changed,
+each as a small JPEG. The messages are binary messages with these extra metadata keys: `keyframe`, `keyframeId`,
+`tileSize`, and for delta frames `tiles`, the `[row, column, length]` of every tile in the image block.
+This is meant for the always-on mode, where only a small part of the scene changes between the frames
+(see `TileEncoder` in [tiles.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/tiles.html)).
+- `mqtt_subscribe.py` decodes every format, see `BinaryMessage` in
+[message.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/message.html).
+The tiles are pasted onto the last keyframe by `TileCompositor`.
+- If `IMAGE_CHUNK_SIZE` is set in [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html),
+the message is split into chunks of that size, each with a sequence number and a CRC-32 checksum
+(see `ChunkedMessage` in [chunking.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/chunking.html)).
+If the link drops during the transfer, only the chunks which were not acknowledged are sent again after reconnecting.
+`mqtt_subscribe.py` reassembles the chunks in any order, and saves the image once every chunk has arrived.
+- If `ADAPTIVE_BITRATE` is enabled in [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html),
+the device measures the throughput and latency of its publishes, and lowers the JPEG quality and the resolution
+of the images when sending one would take longer than `BITRATE_TARGET_FRACTION` of the period.
+When the link improves, the quality rises again step by step.
+- If `CHANGE_DETECTION` is enabled in [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html),
+every frame is compared with the last sent one on a small luminance thumbnail (see `ChangeDetector` in
+[change_detection.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/change_detection.html)).
+If the difference is below `CHANGE_THRESHOLD`, only a heartbeat is sent: the JSON message without the `"image"` key,
+with the `framesSent` and `framesSuppressed` counters. Every `KEYFRAME_INTERVAL`-th frame is sent anyway.
+- If `PREVIEW_FIRST` is enabled in [static_config.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/static_config.html),
+the image in the message is only a preview of `PREVIEW_WIDTH` pixels width, and the message has a `"preview": true` key.
+The full resolution frames are kept on the device in a fixed-size ring (see `FrameStore` in
+[frame_store.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/frame_store.html)),
+the oldest frames are overwritten when it is full.
+
+- If the broker is not reachable, or a message is not acknowledged, the message is stored in the outbox on the SD card
+(see `Outbox` in [outbox.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/outbox.html)), and the capturing goes on
+without waiting for the broker.
+After the next successful publish, the stored messages are sent oldest first, in batches of `OUTBOX_BATCH_SIZE`,
+limited to `OUTBOX_DRAIN_RATE` bytes per second. The outbox holds at most `OUTBOX_MAX_BYTES`, above that the oldest
+messages are dropped. The `outboxDepth` and `outboxBytes` values of the telemetry tell how many messages are waiting.
+
+**Subscribe topic:** `cam4/request`
+
+`{"timestamp": "2024-07-11T18:52:05.179690+00:00"}`
+
+- Requests the full resolution frame of a preview, by the timestamp of the preview.
+- The frame is sent to `sentinel/cam4/full` as a binary message, with the `timestamp` and `"fullResolution": true`
+in the metadata. If the frame is not stored anymore, a JSON message with an `error` key is sent instead.
+- The requests are served after the next image is sent. If the request is retained, the device serves it when it
+wakes up next time, and clears it.
+
+**Subscribe topic:** `cam4/power-request`
+
+`{"seconds": 60}`
+
+- Requests the raw power samples of the last `seconds` (or all of them, if the message is empty).
+- The samples are sent to `sentinel/cam4/power` as a NumPy `.npz` archive, with the UNIX timestamps in `time`,
+and the `batteryVoltage`, `batteryCurrent`, `chargerVoltage` and `chargerCurrent` arrays.
+`mqtt_power_dump.py` sends the request, and saves the samples as CSV.
+
+**Publish topic:** `cam4/energy`
+
+```json
+{
+     "timestamp": "2024-07-11T18:57:05.179690+00:00",
+     "phases": {
+          "capture": {"count": 12, "seconds": 9.84, "joules": 21.3, "mAh": 1.51},
+          "publish": {"count": 12, "seconds": 14.2, "joules": 27.9, "mAh": 1.98}
+     },
+     "images": 12,
+     "joulesPerImage": 4.1,
+     "mAhPerImage": 0.29,
+     "boot": {"warmStart": true, "timeToFirstPublish": 21.4, "init": {"camera": 0.41, "connection": 0.01,
+              "schedule": 0.02, "time": 0.35, "connect": 0.62}}
+}
+```
+
+- The battery energy spent in the phases of the application (`boot`, `camera_start`, `capture`, `encode`,
+`connect`, `publish`, `idle`, `shutdown`), sent every `ENERGY_REPORT_INTERVAL` seconds, and before shutting down.
+- Every phase is also appended to the `ENERGY_LOG_PATH` CSV file on the device
+(see `EnergyMeter` in [energy.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/energy.html)).
+- `boot` tells if the app resumed from the snapshot of the previous boot, and how many seconds after the boot
+the first image was published. Before a shutdown the device saves the parsed configs, the broker which accepted
+the connection and whether the time was synchronized, so the next boot can skip the parsing and the time check
+(see `ResumeState` in [resume.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/resume.html)).
+- `init` is the duration of the initialization tasks in seconds. The camera start, the connection to the broker
+and the time check run in parallel
+(see `InitTasks` in [startup.py](https://leventenyiri.github.io/AitiA/sentinel_mrhat_cam/startup.html)).
 
 **Publish topic:** `er-edge/logging`
 
@@ -250,7 +412,7 @@ Example log messages:
 ```bash
 2024-08-12 16:27:55 - root - INFO - Image capture time: (capture) took 0.118763 seconds
 2024-08-12 16:27:55 - root - INFO - Battery temp: 23.4°C, battery percentage: 90 %, CPU temp: 54.768°C
-2024-08-12 16:27:56 - root - INFO - Creating the json message (create_message) took 0.386625 seconds
+2024-08-12 16:27:56 - root - INFO - Creating the message (create_message) took 0.386625 seconds
 2024-08-12 16:27:56 - root - INFO - Taking a picture and sending it (transmit_message) took 0.734755 seconds
 2024-08-12 16:27:56 - root - INFO - Sleeping for 9.0 seconds
 ```
@@ -309,13 +471,52 @@ If you measure the data while the device does not receive any power through the
 """
 
 from .static_config import *
-from .utils import *
-from .logger import *
-from .system import *
-from .mqtt import *
-from .schedule import *
-from .app_config import *
-from .camera import *
-from .transmit import *
-from .app import *
-from .main import *
+
+# The public names of the submodules. They are imported when first used, so importing the package
+# (e.g. for `BROKER` in the helper scripts) does not load numpy, paho, PIL and the camera stack.
+_EXPORTS = {
+    "utils": ("log_execution_time",),
+    "logger": ("Logger",),
+    "system": ("System", "RTC", "Clock", "clock"),
+    "publish_window": ("PublishWindow", "PublishHandle"),
+    "reconnect": ("Reconnector",),
+    "mqtt5": ("V5Transport",),
+    "mqtt": ("MQTT",),
+    "outbound": ("OutboundScheduler", "ClassStats"),
+    "connection": ("ConnectionManager", "Publisher"),
+    "schedule": ("Schedule", "PowerPolicy", "PolicyDecision", "BootOverhead"),
+    "app_config": ("Config",),
+    "camera": ("Camera",),
+    "message": ("BinaryMessage",),
+    "chunking": ("ChunkedMessage", "ChunkedTransfer", "ChunkAssembler"),
+    "bitrate": ("BitrateController", "LinkEstimator"),
+    "change_detection": ("ChangeDetector",),
+    "tiles": ("TileEncoder", "TileCompositor"),
+    "frame_store": ("FrameStore",),
+    "outbox": ("Outbox", "OutboxMessage"),
+    "telemetry": ("Telemetry", "TelemetrySnapshot"),
+    "power": ("PowerSampler",),
+    "energy": ("EnergyMeter", "PhaseTotals"),
+    "resume": ("ResumeState",),
+    "startup": ("StartupReport", "ImportRecord", "StepRecord", "InitTasks", "TaskTiming"),
+    "transmit": ("Transmit",),
+    "pipeline": ("Pipeline", "StageStats"),
+    "app": ("App",),
+    "main": ("main",),
+}
+_LAZY_NAMES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cached, the next lookup does not call __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
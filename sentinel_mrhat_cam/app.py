@@ -1,13 +1,19 @@
 import logging
+import time
+from typing import Optional
 from .mqtt import MQTT
+from .connection import ConnectionManager
 from .camera import Camera
 from .app_config import Config
 from .utils import log_execution_time
-from .static_config import CONFIGACKTOPIC
-from .schedule import Schedule
+from .static_config import CONFIGACKTOPIC, CONNECT_TIMEOUT
+from .schedule import Schedule, PowerPolicy, BootOverhead
 from .logger import Logger
 from .transmit import Transmit
-from .system import System
+from .pipeline import Pipeline
+from .system import System, clock
+from .resume import ResumeState
+from .startup import InitTasks
 
 
 class App:
@@ -24,6 +30,8 @@ class App:
         Path to the configuration file.
     logger : Logger
         Logger instance for handling log messages.
+    resume : ResumeState, optional
+        The snapshot of the previous boot.
 
     Attributes
     ----------
@@ -31,17 +39,23 @@ class App:
         Configuration object containing application settings.
     camera : Camera
         Camera object for capturing images.
+    connection : ConnectionManager
+        The MQTT connection of the process, shared with the logger.
     mqtt : MQTT
-        MQTT client for message publishing and receiving.
+        MQTT client for message publishing and receiving, the client of `connection`.
     schedule : Schedule
         Schedule the running of the application, and handle the shut down timing.
     logger : Logger
         Logger instance for handling log messages.
     transmit : Transmit
         Transmitter object for creating and sending messages.
+    resume : Optional[ResumeState]
+        The snapshot the app resumed from, and which is written before shutting down.
+    init_timings : List[TaskTiming]
+        The timings of the initialization tasks run by `InitTasks`.
     """
 
-    def __init__(self, config_path: str, logger: Logger) -> None:
+    def __init__(self, config_path: str, logger: Logger, resume: Optional[ResumeState] = None) -> None:
         """
         Initialize the App with configuration and logger.
 
@@ -51,22 +65,76 @@ class App:
             Path to the configuration file.
         logger : Logger
             Logger instance for handling log messages.
+        resume : ResumeState, optional
+            The snapshot of the previous boot. If given, the unchanged config is not loaded again,
+            and a new snapshot is written before shutting down.
         """
-        self.config = Config(config_path)
-        self.camera = Camera(self.config.data)
-        self.mqtt = MQTT()
-        self.schedule = Schedule(period=self.config.data["period"])
+        self.resume = resume
+        self.config = Config(config_path, resume.cached(config_path) if resume is not None else None)
+
+        # Constructing the camera opens the camera stack, the others load their state meanwhile
+        tasks = InitTasks()
+        tasks.add("camera", lambda: Camera(self.config.data))
+        tasks.add("connection", ConnectionManager.shared)
+        tasks.add("schedule", lambda: Schedule(period=self.config.data["period"],
+                                               policy=PowerPolicy(self.config.data["powerPolicy"]),
+                                               boot_overhead=BootOverhead()))
+        results = tasks.run()
+        self.init_timings = tasks.timings
+        self.camera = results["camera"]
+        self.connection: ConnectionManager = results["connection"]
+        self.mqtt: MQTT = self.connection.mqtt
+        self.schedule = results["schedule"]
         self.logger = logger
-        self.transmit = Transmit(self.camera, self.logger, self.schedule, self.mqtt)
+        self.transmit = Transmit(self.camera, self.logger, self.schedule, self.mqtt,
+                                 message_format=self.config.data["messageFormat"], connection=self.connection)
+        self.transmit.warm_start = resume is not None and resume.warm
 
     @log_execution_time("Starting the app")
     def start(self) -> None:
         """
         Check if the current time is in the range of the working hours specified in the
         config file and start the camera.
+
+        The independent parts run in parallel as `InitTasks`:
+
+        - "time": the working time check, which anchors the shared `clock`, then the drift check of the clock.
+        - "camera": the camera start, then bringing the lens into focus (see `Camera.focus`).
+        - "connect": the connection to the broker, the subscriptions and the MQTT logging.
+          It waits at most `CONNECT_TIMEOUT` seconds, the `Reconnector` goes on connecting in the background.
+
+        The time since the kernel booted is accounted as the "boot" phase of the `EnergyMeter`.
+        """
+        booted = time.monotonic()
+        if self.transmit.power is not None:
+            self.transmit.power.start()
+
+        tasks = InitTasks()
+        tasks.add("time", self.check_time)
+        tasks.add("camera", self.start_camera)
+        tasks.add("connect", lambda: self.transmit.ensure_connected(CONNECT_TIMEOUT))
+        tasks.run()
+        self.init_timings += tasks.timings
+        self.transmit.init_timings = {timing.name: round(timing.duration, 3) for timing in self.init_timings}
+
+        # Recorded after the camera start, so the boot energy can be estimated from the first power samples
+        self.transmit.energy.record("boot", 0.0, booted)
+
+    def check_time(self) -> None:
+        """
+        Shut down if the device is out of its working hours, and start the drift check of the `clock`.
         """
         self.schedule.working_time_check(self.config.data["wakeUpTime"], self.config.data["shutDownTime"])
-        self.camera.start()
+        clock.start()
+
+    def start_camera(self) -> None:
+        """
+        Start the camera, and bring the lens into focus.
+        """
+        with self.transmit.energy.phase("camera_start"):
+            self.camera.start()
+        with self.transmit.energy.phase("autofocus"):
+            self.camera.focus()
 
     @log_execution_time("Taking a picture and sending it")
     def run(self) -> None:
@@ -78,9 +146,11 @@ class App:
     def run_always(self) -> None:
         """
         Taking pictures and sending them over MQTT ASAP and forever.
+
+        The capture, the encoding and the publishing run as a `Pipeline`, so the camera
+        does not sit idle while the previous image is being sent.
         """
-        while True:
-            self.run()
+        Pipeline(self.transmit).run()
 
     def run_periodically(self) -> None:
         """
@@ -115,6 +185,9 @@ class App:
                 # Check if a new configuration has been received
                 config_received = self.mqtt.config_received_event.is_set()
                 self.check_config_received_event(config_received)
+                self.adapt_to_power()
+                # Only measures and waits in the first cycle after a shutdown
+                self.schedule.boot_overhead.woke_up()
 
                 # Send an image and measure how long it took to send
                 waiting_time = self.transmit.transmit_message_with_time_measure()
@@ -123,21 +196,38 @@ class App:
                 if self.schedule.should_shutdown(waiting_time):
                     shutdown_duration = self.schedule.calculate_shutdown_duration(waiting_time)
                     logging.info(f"Shutdown duration is: {shutdown_duration} seconds")
-                    System.schedule_wakeup(int(shutdown_duration))
+                    # The energy spent after this point can not be reported anymore
+                    self.transmit.report_energy()
+                    with self.transmit.energy.phase("shutdown"):
+                        self.schedule.boot_overhead.shutting_down(int(shutdown_duration), waiting_time)
+                        self.save_resume_state()
+                        System.schedule_wakeup(int(shutdown_duration))
                 else:
                     logging.info(f"Sleeping for {waiting_time} seconds")
-                    config_received = self.mqtt.config_received_event.wait(timeout=waiting_time)
+                    with self.transmit.energy.phase("idle"):
+                        config_received = self.mqtt.config_received_event.wait(timeout=waiting_time)
 
         except Exception as e:
             logging.error(f"An error occurred while running the periodic loop: {e}")
             exit(1)
 
+    def save_resume_state(self) -> None:
+        """
+        Write the snapshot the next boot resumes from, see `ResumeState`.
+        """
+        if self.resume is None:
+            return
+        self.resume.save({
+            self.config.path: (self.config.signature, self.config.data),
+            self.logger.filepath: (self.logger.signature, self.logger.config),
+        })
+
     def acknowledge_config(self) -> None:
         """
         Acknowledge the receipt of a new configuration by publishing a confirmation message.
         """
         message = self.mqtt.config_confirm_message
-        self.mqtt.publish(message, CONFIGACKTOPIC)
+        self.connection.publisher(CONFIGACKTOPIC).publish(message)
         self.mqtt.reset_config_received_event()
 
     def update_values(self) -> None:
@@ -148,10 +238,23 @@ class App:
         ------------------------
         - `wakeUpTime` and `shutDownTime`: Define the working hours during which the application is active.
         - `period`: Determines the interval between consecutive image captures and transmissions.
-        - `quality`: Sets the quality of images captured by the camera.
+        - `quality`: Sets the resolution of images captured by the camera.
+        - `messageFormat`: Selects the JSON, the binary or the tile-based image message.
+        - `powerPolicy`: Adapts the period and the resolution to the battery, see `PowerPolicy`.
         """
         self.schedule.period = self.config.data["period"]
-        self.camera.quality = self.config.data["quality"]
+        self.camera.set_resolution(self.config.data["quality"])
+        self.transmit.message_format = self.config.data["messageFormat"]
+        self.schedule.policy.config = self.config.data["powerPolicy"]
+
+    def adapt_to_power(self) -> None:
+        """
+        Let the power policy of the schedule decide the period and the resolution of the next image,
+        from the current battery and charger values.
+        """
+        decision = self.schedule.adapt(self.transmit.telemetry.snapshot())
+        if decision is not None:
+            self.camera.set_resolution(decision.quality or self.config.data["quality"])
 
     def check_config_received_event(self, config_received: bool) -> None:
         """
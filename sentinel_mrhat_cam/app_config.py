@@ -1,7 +1,9 @@
 import logging
 import json
 import re
-from .mqtt import MQTT
+from typing import Optional
+from .connection import ConnectionManager
+from .resume import ResumeState
 from .static_config import CONFIGACKTOPIC, MINIMUM_WAIT_TIME, MAXIMUM_WAIT_TIME
 
 
@@ -20,9 +22,11 @@ class Config:
         Path to the configuration file.
     data : dict
         Dictionary to store the configuration data.
+    signature : Optional[List[int]]
+        The `ResumeState.signature` of the file when it was loaded.
     """
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, validated: Optional[dict] = None) -> None:
         """
         Initializes the Config class with the given file path.
 
@@ -34,19 +38,28 @@ class Config:
         ----------
         path : str
             Path to the configuration file.
+        validated : dict, optional
+            The configuration which was already loaded from the unchanged file, e.g. from the `ResumeState`.
+            If given, the file is not read again.
         """
         self.path = path
         self.data = dict()  # Empty dictionary to store the config data
+        self.signature = ResumeState.signature(path)
+        if validated is not None:
+            self.data.update(validated)
+            return
         try:
             # Load the config file with validation
             self.load()
         except Exception as e:
             # If there is an error during loading, publish an error message to the MQTT broker
             logging.error(e)
-            mqtt = MQTT()
-            mqtt.connect()
-            mqtt.publish(f"config-nok|{str(e)}", CONFIGACKTOPIC)
-            mqtt.disconnect()
+            connection = ConnectionManager.shared()
+            try:
+                connection.connect()
+                connection.publisher(CONFIGACKTOPIC).publish(f"config-nok|{str(e)}")
+            except ConnectionError as connection_error:
+                logging.error(f"Failed to report the config error: {connection_error}")
 
             # Load the default config
             self.data.update(Config.get_default_config())
@@ -76,12 +89,11 @@ class Config:
             If any other error occurs during the loading process.
         """
         try:
+            self.signature = ResumeState.signature(self.path)
             with open(self.path, "r") as file:
                 new_config = json.load(file)
 
-            Config.validate_config(new_config)
-
-            self.data.update(new_config)
+            self.data.update(Config.validate_config(new_config))
 
         except json.JSONDecodeError as e:
             logging.error(f"Invalid JSON in the config file: {str(e)}")
@@ -108,41 +120,59 @@ class Config:
             "mode": "periodic",
             "period": 15,
             "wakeUpTime": "06:59:31",
-            "shutDownTime": "22:00:00"
+            "shutDownTime": "22:00:00",
+            "messageFormat": "json",
+            "powerPolicy": {
+                "enabled": False,
+                "lowBattery": 40,
+                "criticalBattery": 15,
+                "lowBatteryPeriodFactor": 4,
+                "surplusCurrent": 300,
+                "burstMinBattery": 60,
+                "fallingRate": 5
+            }
         }
         return default_config
 
     @staticmethod
-    def validate_config(new_config) -> None:
+    def validate_config(new_config) -> dict:
         """
         Validates the new configuration dictionary against the default configuration
         and checks if specific rules are fulfilled.
 
-        This function checks if the provided configuration dictionary matches the expected structure
-        and values. It raises appropriate exceptions if any validation checks fail.
+        The keys missing from the new configuration are taken from the default configuration,
+        so the configs written before a key was added (e.g. without ``messageFormat``) are still valid.
+        It raises appropriate exceptions if any validation checks fail.
 
         Parameters
         ----------
         new_config : any
             The configuration dictionary to be validated.
 
+        Returns
+        -------
+        dict
+            The validated configuration, completed with the default values.
+
         Raises
         ------
         TypeError
             If the configuration is not a dictionary, or if the period is not an integer,
-            or if the wake-up or shut-down time formats are invalid.
+            or if the wake-up or shut-down time formats are invalid, or if a power policy value is not a number.
         ValueError
-            If the configuration keys do not match the default configuration keys,
-            or if the quality or mode values are invalid,
-            or if the period is outside the allowed range.
+            If the configuration has a key which is not in the default configuration,
+            or if the quality, mode or message format values are invalid,
+            or if the period is outside the allowed range, or if the power policy has an unknown key.
         """
         default_config = Config.get_default_config()
 
         if not isinstance(new_config, dict):
             raise TypeError("Config loaded from file is not a dictionary.")
 
-        if default_config.keys() != new_config.keys():
-            raise ValueError("Config keys do not match.")
+        unknown_keys = new_config.keys() - default_config.keys()
+        if unknown_keys:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown_keys))}.")
+        new_config = {**default_config, **new_config}
 
         if new_config["quality"] not in ["4K", "3K", "HD"]:
             raise ValueError("Invalid quality specified in the config.")
@@ -150,10 +180,15 @@ class Config:
         if new_config["mode"] not in ["periodic", "single-shot", "always-on"]:
             raise ValueError("Invalid mode specified in the config.")
 
+        if new_config["messageFormat"] not in ["json", "binary", "tiles"]:
+            raise ValueError("Invalid message format specified in the config.")
+
         if new_config["mode"] == "periodic":
             Config.validate_period(new_config["period"])
 
         Config.validate_time_format(new_config)
+        new_config["powerPolicy"] = Config.validate_power_policy(new_config["powerPolicy"])
+        return new_config
 
     @staticmethod
     def validate_period(period) -> None:
@@ -180,6 +215,44 @@ class Config:
         if period > MAXIMUM_WAIT_TIME:
             raise ValueError("Period specified in the config is more than the maximum allowed wait time.")
 
+    @staticmethod
+    def validate_power_policy(policy) -> dict:
+        """
+        Validates the power policy in the new configuration dictionary, see `PowerPolicy`.
+        The keys missing from the policy are taken from the default power policy.
+
+        Parameters
+        ----------
+        policy : any
+            The power policy to be validated.
+
+        Returns
+        -------
+        dict
+            The validated power policy, completed with the default values.
+
+        Raises
+        ------
+        TypeError
+            If the power policy is not a dictionary, or if `enabled` is not a boolean,
+            or if a threshold is not a non-negative number.
+        ValueError
+            If the power policy has a key which is not in the default power policy.
+        """
+        default_policy = Config.get_default_config()["powerPolicy"]
+        if not isinstance(policy, dict):
+            raise TypeError("Power policy specified in the config is not a dictionary.")
+        unknown_keys = policy.keys() - default_policy.keys()
+        if unknown_keys:
+            raise ValueError(f"Unknown power policy keys: {', '.join(sorted(unknown_keys))}.")
+        policy = {**default_policy, **policy}
+        if not isinstance(policy["enabled"], bool):
+            raise TypeError("Power policy enabled flag is not a boolean.")
+        for key, value in policy.items():
+            if key != "enabled" and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+                raise TypeError(f"Power policy {key} is not a non-negative number.")
+        return policy
+
     @staticmethod
     def validate_time_format(new_config: dict) -> None:
         """
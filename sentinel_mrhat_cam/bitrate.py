@@ -0,0 +1,154 @@
+import logging
+from collections import deque
+from typing import Optional, Tuple
+import numpy as np
+from .static_config import BITRATE_TARGET_FRACTION
+
+
+class LinkEstimator:
+    """
+    Estimates the throughput and the latency of the MQTT link from the completed publishes.
+
+    Every publish is modelled as ``seconds = latency + bytes / throughput``. When the recent
+    messages have different sizes (images, config acks), both values are fitted with least squares.
+    Otherwise the latency is unknown, and the throughput is the total bytes over the total time,
+    which is a conservative estimate.
+
+    Parameters
+    ----------
+    window : int, optional
+        The number of recent publishes the estimate is based on. A short window lets the
+        estimate follow the changes of the link quickly.
+    """
+
+    def __init__(self, window: int = 8) -> None:
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, size: int, seconds: float) -> None:
+        """
+        Record a completed publish.
+
+        Parameters
+        ----------
+        size : int
+            The size of the payload in bytes.
+        seconds : float
+            The time from handing the message to the client until the broker acknowledged it.
+        """
+        self.samples.append((size, max(seconds, 1e-6)))
+
+    def estimate(self) -> Optional[Tuple[float, float]]:
+        """
+        Returns the estimated throughput (bytes per second) and latency (seconds),
+        or None if nothing was published yet.
+        """
+        if not self.samples:
+            return None
+
+        sizes, times = (np.array(values, dtype=np.float64) for values in zip(*self.samples))
+        if len(sizes) >= 3 and sizes.max() > 2 * sizes.min():
+            slope, intercept = np.polyfit(sizes, times, 1)
+            if slope > 0:
+                return 1 / slope, max(float(intercept), 0.0)
+        return float(sizes.sum() / times.sum()), 0.0
+
+
+class BitrateController:
+    """
+    Picks the JPEG quality and the downscale factor of the next image, so its transmission
+    fits into a given fraction of the period on the measured link.
+
+    The settings form a ladder from the largest image (full resolution, quality 95) down to the
+    smallest. The size of every rung is predicted from the size of the last message and the
+    relative size of the rungs. The controller steps down as many rungs as needed at once,
+    but only steps up one rung at a time, and only if the upper rung fits with some headroom,
+    so it does not oscillate around the limit of the link.
+
+    Parameters
+    ----------
+    link : LinkEstimator
+        The throughput and latency estimate of the MQTT link.
+    target_fraction : float, optional
+        The fraction of the period the transmission of an image should fit into.
+    headroom : float, optional
+        Stepping up is allowed only if the upper rung fits into this fraction of the budget.
+
+    Attributes
+    ----------
+    level : int
+        The index of the current rung in `LADDER`.
+    """
+
+    # (downscale factor, JPEG quality), from the largest to the smallest image
+    LADDER = ((1, 95), (1, 85), (1, 75), (1, 60), (2, 85), (2, 75), (2, 60), (4, 75), (4, 50))
+
+    # JPEG size of a quality setting relative to quality 75 at the same resolution
+    QUALITY_SIZE = {95: 2.4, 85: 1.45, 75: 1.0, 60: 0.78, 50: 0.68}
+
+    def __init__(self, link: LinkEstimator, target_fraction: float = BITRATE_TARGET_FRACTION,
+                 headroom: float = 0.8) -> None:
+        self.link = link
+        self.target_fraction = target_fraction
+        self.headroom = headroom
+        self.level = 0
+        self.unit_size: Optional[float] = None
+
+    @staticmethod
+    def relative_size(level: int) -> float:
+        """
+        The size of an image with the settings of a rung, relative to full resolution at quality 75.
+        """
+        scale, quality = BitrateController.LADDER[level]
+        return BitrateController.QUALITY_SIZE[quality] / scale ** 2
+
+    def record_message(self, size: int) -> None:
+        """
+        Record the size of a message created with the current settings.
+
+        Parameters
+        ----------
+        size : int
+            The size of the message in bytes.
+        """
+        self.unit_size = size / self.relative_size(self.level)
+
+    def predicted_time(self, level: int, throughput: float, latency: float) -> float:
+        """
+        Predict how long the transmission of an image would take with the settings of a rung.
+        """
+        return latency + self.unit_size * self.relative_size(level) / throughput
+
+    def apply(self, camera, period: float) -> None:
+        """
+        Choose the settings for the next image, and set them on the camera.
+
+        Parameters
+        ----------
+        camera : Camera
+            Its `quality` and `scale` are set.
+        period : float
+            The period of the image sending in seconds.
+        """
+        estimate = self.link.estimate()
+        if estimate is not None and self.unit_size is not None:
+            throughput, latency = estimate
+            budget = self.target_fraction * period
+            fitting = [level for level in range(len(self.LADDER))
+                       if self.predicted_time(level, throughput, latency) <= budget]
+            best = fitting[0] if fitting else len(self.LADDER) - 1
+
+            level = self.level
+            if best > self.level:
+                level = best
+            elif best < self.level and \
+                    self.predicted_time(self.level - 1, throughput, latency) <= self.headroom * budget:
+                level = self.level - 1
+
+            if level != self.level:
+                logging.info(
+                    f"Link: {throughput / 1000:.1f} kB/s, latency {latency:.2f} s, budget {budget:.1f} s. "
+                    f"Image settings: scale 1/{self.LADDER[level][0]}, quality {self.LADDER[level][1]} "
+                    f"(was 1/{self.LADDER[self.level][0]}, {self.LADDER[self.level][1]})")
+                self.level = level
+
+        camera.scale, camera.quality = self.LADDER[self.level]
@@ -1,12 +1,26 @@
-from unittest.mock import MagicMock
 try:
     from libcamera import controls
     from picamera2 import Picamera2
+    EMULATED = False
 except ImportError:
+    # unittest.mock is slow to import, it is only loaded off the Pi
+    from unittest.mock import MagicMock
     Picamera2 = MagicMock()
     controls = MagicMock()
+    EMULATED = True
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
 from .utils import log_execution_time
+from .static_config import AF_SETTLE_TIMEOUT, FOCUS_CACHE, FOCUS_STATE_PATH, FOCUS_LORES_SIZE, FOCUS_SHARPNESS_RATIO
+from .static_config import FOCUS_SETTLE_FRAMES
+from typing import Optional, Tuple
+import io
+import json
 import logging
+import os
+import time
 import numpy as np
 
 
@@ -30,6 +44,24 @@ class Camera:
         The width of the captured image based on the quality setting.
     height : int
         The height of the captured image based on the quality setting.
+    scale : int
+        The images are downscaled by this factor before JPEG encoding, 1 means full resolution.
+    emulated : bool
+        True if the picamera2 stack is not installed, and the frames are synthesized.
+    format : str
+        The pixel format of the captured frames. "YUV420" if the libjpeg-turbo based
+        `simplejpeg` encoder is available, otherwise "BGR888" (which is RGB byte order in picamera2).
+    focus_cache : bool
+        If True, the lens is moved to the cached position instead of using the continuous autofocus, see `focus`.
+    focus_state_path : str
+        The file the lens position and its sharpness are saved to.
+    lens_position : Optional[float]
+        The lens position set by `focus`, in dioptres.
+
+    Notes
+    -----
+    - With the "YUV420" format the frame is half the size of the RGB array, and it is encoded to JPEG
+    straight from its planes, without converting it to RGB and without going through PIL.
     """
 
     def __init__(self, config):
@@ -47,23 +79,51 @@ class Camera:
             Configuration dictionary specifying the camera settings.
         """
         self.quality = 95
+        self.scale = 1
         self.cam = Picamera2()
+        self.emulated = EMULATED
+        self.format = "YUV420" if simplejpeg is not None else "BGR888"
+        self._jpeg_buffer = io.BytesIO()
+        self._emulated_frame = None
+        self.started = False
+        self.focus_cache = FOCUS_CACHE
+        self.focus_state_path = FOCUS_STATE_PATH
+        self.lens_position: Optional[float] = None
+        self.set_resolution(config["quality"])
+
+    def set_resolution(self, quality: str) -> None:
+        """
+        Sets the width and the height of the image based on the premade quality settings.
+
+        If the camera is already running and the resolution changes, the camera is restarted
+        with the new size, so the captured frames always match `width` and `height`.
+
+        Parameters
+        ----------
+        quality : str
+            Either "4K", "3K" or "HD". If the quality is not found, it defaults to 3K quality.
+        """
+        previous_size = (getattr(self, "width", None), getattr(self, "height", None))
 
         # Set the premade settings
-        if config["quality"] == "4K":
+        if quality == "4K":
             self.width = 3840
             self.height = 2160
-        elif config["quality"] == "3K":
+        elif quality == "3K":
             self.width = 2560
             self.height = 1440
-        elif config["quality"] == "HD":
+        elif quality == "HD":
             self.width = 1920
             self.height = 1080
         # If the specified quality is not found, default to 3K quality
         else:
             self.width = 2560
             self.height = 1440
-            logging.error(f"Invalid quality specified: {config['quality']}. Defaulting to 3K quality.")
+            logging.error(f"Invalid quality specified: {quality}. Defaulting to 3K quality.")
+
+        if self.started and previous_size != (self.width, self.height):
+            self.cam.stop()
+            self.start()
 
     def start(self) -> None:
         """
@@ -73,29 +133,365 @@ class Camera:
         attributes, applies the quality setting, and sets the autofocus mode to continuous.
         Finally, it starts the camera.
 
+        With `focus_cache` a low resolution stream is configured too, to measure the sharpness on,
+        and the lens stays where `focus` put it.
+
         Parameters
         ----------
         None
         """
-        config = self.cam.create_still_configuration({"size": (self.width, self.height)})
+        if self.focus_cache:
+            config = self.cam.create_still_configuration({"size": (self.width, self.height), "format": self.format},
+                                                         lores={"size": FOCUS_LORES_SIZE, "format": "YUV420"})
+        else:
+            config = self.cam.create_still_configuration({"size": (self.width, self.height), "format": self.format})
         self.cam.configure(config)
         self.cam.options["quality"] = self.quality
-        self.cam.set_controls({"AfMode": controls.AfModeEnum.Continuous})
+        if not self.focus_cache:
+            self.cam.set_controls({"AfMode": controls.AfModeEnum.Continuous})
+        elif self.lens_position is not None:
+            self.cam.set_controls({"AfMode": controls.AfModeEnum.Manual, "LensPosition": self.lens_position})
         self.cam.start(show_preview=False)
+        self.started = True
+
+    def focus(self) -> bool:
+        """
+        Brings the lens into focus, after the camera is started.
+
+        With the continuous autofocus, it waits until the autofocus has settled. With `focus_cache`, the lens
+        is moved to the saved position, and the sharpness of the low resolution stream is compared to the
+        sharpness saved with the position. An autofocus cycle is only run if there is no saved position,
+        or the sharpness dropped below `FOCUS_SHARPNESS_RATIO` times the saved one. The position found
+        by the cycle is saved for the next boot.
+
+        Returns
+        -------
+        bool
+            True if the lens is focused.
+        """
+        if self.emulated:
+            return True
+        if not self.focus_cache:
+            return self.wait_for_focus()
+
+        cached = self.load_focus()
+        if cached is not None:
+            self.lens_position = cached["lensPosition"]
+            self.cam.set_controls({"AfMode": controls.AfModeEnum.Manual, "LensPosition": self.lens_position})
+            # Waiting until the lens has moved
+            for _ in range(FOCUS_SETTLE_FRAMES):
+                self.cam.capture_metadata()
+            sharpness = self.measure_sharpness()
+            if sharpness >= FOCUS_SHARPNESS_RATIO * cached["sharpness"]:
+                logging.info(f"Lens moved to the cached position {self.lens_position:.2f}, "
+                             f"sharpness {sharpness:.1f} (saved {cached['sharpness']:.1f})")
+                return True
+            logging.info(f"Sharpness dropped to {sharpness:.1f} from {cached['sharpness']:.1f}, running the autofocus")
+        return self.autofocus()
+
+    def autofocus(self) -> bool:
+        """
+        Runs an autofocus cycle, and saves the lens position it found with the sharpness of the image.
+
+        Returns
+        -------
+        bool
+            True if the autofocus succeeded.
+        """
+        self.cam.set_controls({"AfMode": controls.AfModeEnum.Auto})
+        if not self.cam.autofocus_cycle():
+            logging.warning("Autofocus cycle failed")
+            return False
+        self.lens_position = self.cam.capture_metadata().get("LensPosition")
+        if self.lens_position is None:
+            return True
+        sharpness = self.measure_sharpness()
+        logging.info(f"Autofocus found lens position {self.lens_position:.2f}, sharpness {sharpness:.1f}")
+        self.save_focus(sharpness)
+        return True
+
+    def measure_sharpness(self) -> float:
+        """
+        The `sharpness` of the luma plane of the low resolution stream.
+        """
+        width, height = FOCUS_LORES_SIZE
+        return self.sharpness(self.cam.capture_array("lores")[:height, :width])
+
+    @staticmethod
+    def sharpness(plane: np.ndarray) -> float:
+        """
+        The variance of the Laplacian of a grayscale image, higher is sharper.
+
+        Parameters
+        ----------
+        plane : ndarray
+            A 2D array, e.g. the Y plane of a YUV420 frame.
+
+        Returns
+        -------
+        float
+            The variance of the 4-neighbour Laplacian.
+        """
+        # The Laplacian of 8-bit values fits in 16 bits
+        image = plane.astype(np.int16)
+        laplacian = (image[:-2, 1:-1] + image[2:, 1:-1] + image[1:-1, :-2] + image[1:-1, 2:]
+                     - 4 * image[1:-1, 1:-1])
+        return float(laplacian.var())
+
+    def load_focus(self) -> Optional[dict]:
+        """
+        The lens position and its sharpness saved by `autofocus`, None if there is none.
+        """
+        if not os.path.exists(self.focus_state_path):
+            return None
+        try:
+            with open(self.focus_state_path) as f:
+                state = json.load(f)
+            return {"lensPosition": float(state["lensPosition"]), "sharpness": float(state["sharpness"])}
+        except Exception as e:
+            logging.error(f"Failed to load the focus state: {e}")
+            return None
+
+    def save_focus(self, sharpness: float) -> None:
+        try:
+            with open(self.focus_state_path, "w") as f:
+                json.dump({"lensPosition": self.lens_position, "sharpness": sharpness}, f)
+        except Exception as e:
+            logging.error(f"Failed to save the focus state: {e}")
+
+    def wait_for_focus(self, timeout: float = AF_SETTLE_TIMEOUT) -> bool:
+        """
+        Waits until the continuous autofocus has settled, so the first image is not taken out of focus.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in seconds.
+
+        Returns
+        -------
+        bool
+            True if the lens is focused, False if the focus failed or the timeout was reached.
+        """
+        if self.emulated:
+            return True
+        deadline = time.monotonic() + timeout
+        state = None
+        while time.monotonic() < deadline:
+            # Every call waits for the metadata of the next frame
+            state = self.cam.capture_metadata().get("AfState")
+            if state == controls.AfStateEnum.Focused:
+                return True
+            if state == controls.AfStateEnum.Failed:
+                break
+        logging.warning(f"Autofocus did not settle, its state is {state}")
+        return False
 
     @log_execution_time("Image capture time:")
     def capture(self) -> np.ndarray:
         """
         Captures an image from the camera and returns it as numpy array.
 
+        The layout of the array depends on `format`, use `encode_jpeg` to turn it into a JPEG image.
+
         Returns
         -------
         ndarray
             The captured image as a numpy array.
         """
         try:
+            if self.emulated:
+                return self.emulated_frame()
             image = self.cam.capture_array()
         except Exception as e:
             logging.error(f"Error during image capture: {e}")
             return None
         return image
+
+    @log_execution_time("JPEG image capture time:")
+    def capture_jpeg(self) -> Optional[bytes]:
+        """
+        Captures an image from the camera and returns it as JPEG encoded bytes.
+
+        Returns
+        -------
+        Optional[bytes]
+            The JPEG image, or None if the capture failed.
+        """
+        image = self.capture()
+        if image is None:
+            return None
+        return self.encode_jpeg(image)
+
+    def encode_jpeg(self, image: np.ndarray, region: Optional[Tuple[int, int, int, int]] = None,
+                    scale: Optional[int] = None) -> bytes:
+        """
+        Encodes an image captured by `capture` into JPEG using `quality` and `scale`.
+
+        YUV420 frames are encoded from their planes by libjpeg-turbo (`simplejpeg`).
+        RGB frames are encoded by PIL into a reused buffer.
+
+        Parameters
+        ----------
+        image : ndarray
+            The captured image, in the layout given by `format`.
+        region : Tuple[int, int, int, int], optional
+            Only encode this ``(left, top, width, height)`` part of the image, in full resolution pixels.
+            The values must be multiples of ``2 * scale``, so the chroma planes and the downscaling line up.
+        scale : int, optional
+            Downscale by this factor instead of `scale`.
+
+        Returns
+        -------
+        bytes
+            The JPEG encoded image.
+        """
+        scale = self.scale if scale is None else scale
+        if self.format == "YUV420":
+            y, u, v = self.split_planes(image, self.width, self.height)
+            if region is not None:
+                left, top, width, height = region
+                y = y[top:top + height, left:left + width]
+                u, v = (plane[top // 2:(top + height) // 2, left // 2:(left + width) // 2] for plane in (u, v))
+            y, u, v = (Camera.downscale(plane, scale) for plane in (y, u, v))
+            return simplejpeg.encode_jpeg_yuv_planes(y, u, v, quality=self.quality)
+
+        if region is not None:
+            left, top, width, height = region
+            image = image[top:top + height, left:left + width]
+        image = Camera.downscale(image, scale)
+        self._jpeg_buffer.seek(0)
+        self._jpeg_buffer.truncate()
+        # PIL is only loaded if there is no simplejpeg
+        from PIL import Image
+        Image.fromarray(image).save(self._jpeg_buffer, format="JPEG", quality=self.quality)
+        return self._jpeg_buffer.getvalue()
+
+    @staticmethod
+    def downscale(image: np.ndarray, factor: int) -> np.ndarray:
+        """
+        Shrinks an image or a plane by an integer factor, averaging every ``factor x factor`` block.
+
+        Parameters
+        ----------
+        image : ndarray
+            A ``(height, width)`` plane or a ``(height, width, channels)`` image.
+        factor : int
+            The downscale factor, 1 returns the image untouched.
+
+        Returns
+        -------
+        ndarray
+            The downscaled uint8 image. Rows and columns which do not fill a whole block are dropped.
+        """
+        if factor == 1:
+            return image
+        height, width = image.shape[0] // factor, image.shape[1] // factor
+        blocks = image[:height * factor, :width * factor].reshape(
+            (height, factor, width, factor) + image.shape[2:])
+        return blocks.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+
+    @staticmethod
+    def split_planes(image: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Splits a YUV420 frame into its Y, U and V planes without copying.
+
+        picamera2 returns YUV420 frames as a single ``(height * 3 / 2, stride)`` array: the full
+        resolution Y plane, followed by the quarter resolution U and V planes, where every row
+        of the array holds two rows of the chroma planes.
+
+        Parameters
+        ----------
+        image : ndarray
+            The YUV420 frame.
+        width : int
+            The width of the image in pixels, the stride of the rows can be larger.
+        height : int
+            The height of the image in pixels.
+
+        Returns
+        -------
+        Tuple[ndarray, ndarray, ndarray]
+            The Y, U and V planes.
+        """
+        y = image[:height, :width]
+        chroma = image[height:].reshape((-1, image.shape[1] // 2))
+        u = chroma[:height // 2, :width // 2]
+        v = chroma[height // 2:height, :width // 2]
+        return y, u, v
+
+    def emulated_frame(self) -> np.ndarray:
+        """
+        Returns a synthetic frame in the current `format` and resolution, used instead of the sensor
+        when the picamera2 stack is not installed, so the whole capture path can run on any Linux box.
+
+        The frame is a gradient with sensor-like noise, so the JPEG size is close to a real outdoor image.
+        It is created once per resolution and reused.
+
+        Returns
+        -------
+        ndarray
+            The synthetic frame.
+        """
+        frame = self._emulated_frame
+        if frame is None or frame.shape[1] != self.width or frame.shape[0] not in (self.height, self.height * 3 // 2):
+            rgb = Camera.synthetic_rgb(self.width, self.height)
+            frame = Camera.rgb_to_yuv420(rgb) if self.format == "YUV420" else rgb
+            self._emulated_frame = frame
+        return frame
+
+    @staticmethod
+    def synthetic_rgb(width: int, height: int) -> np.ndarray:
+        """
+        Creates an RGB gradient image with gaussian noise.
+
+        Parameters
+        ----------
+        width : int
+            The width of the image.
+        height : int
+            The height of the image.
+
+        Returns
+        -------
+        ndarray
+            A ``(height, width, 3)`` uint8 array.
+        """
+        rng = np.random.default_rng(0)
+        x = np.linspace(0, 255, width).astype(np.int16)
+        y = np.linspace(0, 255, height).astype(np.int16)[:, None]
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        # One channel at a time, to keep the temporary arrays small on the Pi
+        for channel, gradient in enumerate(((x + y) // 2, x + 0 * y, y + 0 * x)):
+            noise = rng.normal(0, 12, size=(height, width)).astype(np.int16)
+            image[..., channel] = np.clip(gradient + noise, 0, 255)
+        return image
+
+    @staticmethod
+    def rgb_to_yuv420(rgb: np.ndarray) -> np.ndarray:
+        """
+        Converts an RGB image into the picamera2 YUV420 layout (BT.601, full range).
+
+        Parameters
+        ----------
+        rgb : ndarray
+            A ``(height, width, 3)`` uint8 array, width and height must be even.
+
+        Returns
+        -------
+        ndarray
+            A ``(height * 3 / 2, width)`` uint8 array, see `split_planes`.
+        """
+        height, width = rgb.shape[:2]
+        r, g, b = (rgb[..., i].astype(np.float32) for i in range(3))
+        y = 0.299 * r + 0.587 * g + 0.114 * b
+        u = (b - y) * 0.564 + 128
+        v = (r - y) * 0.713 + 128
+
+        frame = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        frame[:height] = np.clip(y, 0, 255)
+        # Subsample the chroma planes by averaging every 2x2 block
+        for plane, start in ((u, height), (v, height + height // 4)):
+            sub = plane.reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3))
+            frame[start:start + height // 4] = np.clip(sub, 0, 255).reshape(height // 4, width)
+        return frame
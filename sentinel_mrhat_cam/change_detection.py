@@ -0,0 +1,166 @@
+import logging
+import os
+from typing import Dict, Optional
+import numpy as np
+from .camera import Camera
+from .static_config import CHANGE_THRESHOLD, CHANGE_METRIC, KEYFRAME_INTERVAL, CHANGE_STATE_PATH
+
+
+class ChangeDetector:
+    """
+    Decides if a new frame differs enough from the last transmitted one to be worth sending.
+
+    Every frame is reduced to a small luminance thumbnail (about 64 pixels wide), which is compared
+    with the thumbnail of the last transmitted frame. Every `keyframe_interval`-th frame is sent
+    regardless of the difference, so the receiver gets a fresh image from time to time.
+
+    The last thumbnail and the counters are saved to a file, because in periodic mode the device
+    shuts down, and the script starts from scratch between two frames.
+
+    Parameters
+    ----------
+    threshold : float, optional
+        The frame is sent if the distance is at least this much. The distance is between 0 and 1.
+    metric : str, optional
+        "mad": the mean absolute difference of the thumbnails, relative to the full scale.
+        "histogram": the total variation distance of the luminance histograms, which ignores
+        small movements (e.g. leaves in the wind), but detects new objects.
+    keyframe_interval : int, optional
+        Every this many frames one is sent regardless of the difference. 1 sends every frame.
+    state_path : str or None, optional
+        Where to persist the state between the runs, None disables the persistence.
+
+    Attributes
+    ----------
+    sent : int
+        The number of frames which were sent.
+    suppressed : int
+        The number of frames which were not sent.
+    since_keyframe : int
+        The number of frames since the last sent frame.
+    last_distance : float or None
+        The distance of the last checked frame.
+    """
+
+    THUMBNAIL_WIDTH = 64
+
+    def __init__(self, threshold: float = CHANGE_THRESHOLD, metric: str = CHANGE_METRIC,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, state_path: Optional[str] = CHANGE_STATE_PATH) -> None:
+        if metric not in ("mad", "histogram"):
+            raise ValueError(f"Invalid change detection metric: {metric}")
+        self.threshold = threshold
+        self.metric = metric
+        self.keyframe_interval = keyframe_interval
+        self.state_path = state_path
+        self.reference: Optional[np.ndarray] = None
+        self.sent = 0
+        self.suppressed = 0
+        self.since_keyframe = 0
+        self.last_distance: Optional[float] = None
+        self.load()
+
+    @staticmethod
+    def thumbnail(image: np.ndarray, camera: Camera) -> np.ndarray:
+        """
+        Create a small luminance thumbnail of a captured frame.
+
+        The frame is first subsampled by 4, then averaged in blocks, which removes most of the sensor noise.
+
+        Parameters
+        ----------
+        image : ndarray
+            The frame, as returned by `Camera.capture`.
+        camera : Camera
+            The camera which captured the frame, it tells the layout of the frame.
+
+        Returns
+        -------
+        ndarray
+            The uint8 luminance thumbnail.
+        """
+        if camera.format == "YUV420":
+            luma = Camera.split_planes(image, camera.width, camera.height)[0][::4, ::4]
+        else:
+            # BT.601 luma of the subsampled RGB image
+            rgb = image[::4, ::4].astype(np.float32)
+            luma = (rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).astype(np.uint8)
+        factor = max(1, luma.shape[1] // ChangeDetector.THUMBNAIL_WIDTH)
+        return Camera.downscale(luma, factor)
+
+    def distance(self, thumbnail: np.ndarray) -> float:
+        """
+        The distance of a thumbnail from the thumbnail of the last transmitted frame, between 0 and 1.
+        """
+        if self.metric == "histogram":
+            bins = 32
+            histograms = [np.bincount(t.ravel() // (256 // bins), minlength=bins) / t.size
+                          for t in (thumbnail, self.reference)]
+            return float(0.5 * np.abs(histograms[0] - histograms[1]).sum())
+
+        return float(np.abs(thumbnail.astype(np.int16) - self.reference).mean() / 255)
+
+    def should_send(self, thumbnail: np.ndarray) -> bool:
+        """
+        Decide if the frame should be sent, and update the counters.
+
+        Parameters
+        ----------
+        thumbnail : ndarray
+            The thumbnail of the new frame, created by `thumbnail`.
+
+        Returns
+        -------
+        bool
+            True if the frame changed enough, or a keyframe is due.
+        """
+        if self.reference is None or self.reference.shape != thumbnail.shape:
+            self.last_distance = None
+            send = True
+        else:
+            self.last_distance = self.distance(thumbnail)
+            send = self.last_distance >= self.threshold or self.since_keyframe + 1 >= self.keyframe_interval
+
+        if send:
+            self.reference = thumbnail
+            self.sent += 1
+            self.since_keyframe = 0
+        else:
+            self.suppressed += 1
+            self.since_keyframe += 1
+        logging.info(f"Frame difference: {self.last_distance}, sending: {send} "
+                     f"(sent: {self.sent}, suppressed: {self.suppressed})")
+
+        self.save()
+        return send
+
+    def counters(self) -> Dict[str, int]:
+        """
+        The counters which are sent along with the telemetry.
+        """
+        return {"framesSent": self.sent, "framesSuppressed": self.suppressed}
+
+    def load(self) -> None:
+        """
+        Load the state saved by the previous run, if there is one.
+        """
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return
+        try:
+            with np.load(self.state_path) as state:
+                self.reference = state["reference"]
+                self.sent, self.suppressed, self.since_keyframe = (int(value) for value in state["counters"])
+        except Exception as e:
+            logging.error(f"Failed to load the change detection state: {e}")
+
+    def save(self) -> None:
+        """
+        Save the state, so the next run can compare its frame with the last transmitted one.
+        """
+        if self.state_path is None:
+            return
+        try:
+            with open(self.state_path, "wb") as f:
+                np.savez(f, reference=self.reference,
+                         counters=np.array([self.sent, self.suppressed, self.since_keyframe]))
+        except Exception as e:
+            logging.error(f"Failed to save the change detection state: {e}")
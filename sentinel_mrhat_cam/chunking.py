@@ -0,0 +1,265 @@
+import logging
+import random
+import struct
+import zlib
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from .publish_window import PublishHandle
+
+
+class ChunkedMessage:
+    """
+    Splits a message into fixed-size chunks and packs them for transmission.
+
+    Every chunk can be verified and placed on its own, so the chunks can arrive out of order,
+    more than once, or in several connection sessions.
+
+    Layout of a chunk (all integers are big-endian):
+
+    ========  ======  =====================================================
+    Offset    Size    Field
+    ========  ======  =====================================================
+    0         4       Magic bytes, ``b"SMCC"``
+    4         1       Format version, currently ``1``
+    5         1       Flags, reserved, always ``0``
+    6         4       Transfer ID, the same for every chunk of a message
+    10        4       Sequence number of the chunk, starting from 0
+    14        4       Number of chunks in the transfer
+    18        4       CRC-32 of the chunk payload
+    22        ...     The chunk payload
+    ========  ======  =====================================================
+
+    Joining the payloads in sequence order gives back the original message, which is
+    either a JSON message or a `BinaryMessage`.
+    """
+
+    MAGIC = b"SMCC"
+    VERSION = 1
+    HEADER = struct.Struct(">4sBBIIII")
+
+    @staticmethod
+    def split(message: Union[str, bytes], chunk_size: int, transfer_id: Optional[int] = None) -> List[bytes]:
+        """
+        Split a message into packed chunks.
+
+        Parameters
+        ----------
+        message : Union[str, bytes]
+            The whole message, a str is encoded to UTF-8.
+        chunk_size : int
+            The maximum size of the payload of one chunk in bytes.
+        transfer_id : int, optional
+            Identifies the message at the receiver. A random ID is used if not given.
+
+        Returns
+        -------
+        List[bytes]
+            The packed chunks, in sequence order.
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        if transfer_id is None:
+            transfer_id = random.getrandbits(32)
+
+        view = memoryview(message)
+        total = max(1, -(-len(message) // chunk_size))
+        chunks = []
+        for seq in range(total):
+            payload = view[seq * chunk_size:(seq + 1) * chunk_size]
+            header = ChunkedMessage.HEADER.pack(ChunkedMessage.MAGIC, ChunkedMessage.VERSION, 0,
+                                                transfer_id, seq, total, zlib.crc32(payload))
+            chunks.append(b"".join((header, payload)))
+        return chunks
+
+    @staticmethod
+    def is_chunk(payload: bytes) -> bool:
+        """
+        Check if the payload is a chunk of a message.
+
+        Parameters
+        ----------
+        payload : bytes
+            The received MQTT payload.
+
+        Returns
+        -------
+        bool
+            True if the payload starts with the chunk magic bytes.
+        """
+        return bytes(payload[:len(ChunkedMessage.MAGIC)]) == ChunkedMessage.MAGIC
+
+    @staticmethod
+    def unpack(chunk: bytes) -> tuple:
+        """
+        Unpack and verify a chunk.
+
+        Parameters
+        ----------
+        chunk : bytes
+            The packed chunk.
+
+        Returns
+        -------
+        tuple
+            The transfer ID, the sequence number, the number of chunks and the payload.
+
+        Raises
+        ------
+        ValueError
+            If the chunk is not valid, or its checksum does not match.
+        """
+        if len(chunk) < ChunkedMessage.HEADER.size:
+            raise ValueError("Payload is shorter than the chunk header")
+
+        magic, version, _, transfer_id, seq, total, crc = ChunkedMessage.HEADER.unpack_from(chunk)
+        if magic != ChunkedMessage.MAGIC:
+            raise ValueError("Payload is not a chunk")
+        if version != ChunkedMessage.VERSION:
+            raise ValueError(f"Unsupported chunk version: {version}")
+        if seq >= total:
+            raise ValueError(f"Chunk sequence number {seq} is out of range (total: {total})")
+
+        payload = bytes(memoryview(chunk)[ChunkedMessage.HEADER.size:])
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"Checksum mismatch in chunk {seq} of transfer {transfer_id:08x}")
+        return transfer_id, seq, total, payload
+
+
+class ChunkedTransfer:
+    """
+    Keeps track of which chunks of a message were acknowledged by the broker.
+
+    Parameters
+    ----------
+    message : Union[str, bytes]
+        The whole message.
+    chunk_size : int
+        The maximum size of the payload of one chunk in bytes.
+
+    Attributes
+    ----------
+    chunks : List[bytes]
+        The packed chunks.
+    acknowledged : set
+        The sequence numbers of the acknowledged chunks.
+    """
+
+    def __init__(self, message: Union[str, bytes], chunk_size: int) -> None:
+        self.chunks = ChunkedMessage.split(message, chunk_size)
+        self.acknowledged: set = set()
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if every chunk was acknowledged.
+        """
+        return len(self.acknowledged) == len(self.chunks)
+
+    @property
+    def size(self) -> int:
+        """
+        The bytes of the packed chunks, the encoded message and the chunk headers.
+        """
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def pending(self) -> List[int]:
+        """
+        Returns the sequence numbers of the chunks which were not acknowledged yet.
+        """
+        return [seq for seq in range(len(self.chunks)) if seq not in self.acknowledged]
+
+    def acknowledge(self, seq: int) -> None:
+        """
+        Mark a chunk as acknowledged by the broker.
+        """
+        self.acknowledged.add(seq)
+
+    def send(self, publish: Callable[[bytes], PublishHandle], ack_timeout: float) -> None:
+        """
+        Publish every pending chunk, and wait for their acknowledgements.
+
+        Returns when every chunk is acknowledged, or when a chunk is not acknowledged within `ack_timeout`
+        seconds (e.g. the link dropped or stalled, or the chunk failed). The chunks which were not acknowledged
+        stay pending, so the next call only re-sends those.
+
+        Parameters
+        ----------
+        publish : Callable[[bytes], PublishHandle]
+            Publishes one chunk without waiting for it, e.g. `MQTT.publish_async`, which keeps the number
+            of chunks in flight within the `PublishWindow`. The QoS must be at least 1 to get acknowledgements.
+        ack_timeout : float
+            Seconds to wait for the next acknowledgement before giving up the round.
+        """
+        handles = {seq: publish(self.chunks[seq]) for seq in self.pending()}
+        for seq, handle in handles.items():
+            if not handle.wait(ack_timeout):
+                break
+            self.acknowledge(seq)
+
+        # Acknowledgements of the later chunks which arrived in the meantime
+        for seq, handle in handles.items():
+            if handle.delivered:
+                self.acknowledge(seq)
+
+
+class ChunkAssembler:
+    """
+    Reassembles chunked messages at the receiver.
+
+    Chunks can arrive in any order and more than once. A message is returned only
+    when all of its chunks have arrived.
+
+    Parameters
+    ----------
+    max_transfers : int, optional
+        The number of incomplete transfers to keep, the oldest one is dropped above this.
+    """
+
+    def __init__(self, max_transfers: int = 8) -> None:
+        self.max_transfers = max_transfers
+        # The number of chunks, from the first chunk of the transfer, and the payloads by sequence number
+        self.transfers: "OrderedDict[int, Tuple[int, Dict[int, bytes]]]" = OrderedDict()
+        # Chunks re-sent after a reconnect can arrive after their transfer was completed
+        self.completed: deque = deque(maxlen=max_transfers)
+
+    def add(self, chunk: bytes) -> Optional[bytes]:
+        """
+        Add a chunk to its transfer.
+
+        Parameters
+        ----------
+        chunk : bytes
+            The packed chunk.
+
+        Returns
+        -------
+        Optional[bytes]
+            The whole message if this chunk completed it, None otherwise.
+
+        Raises
+        ------
+        ValueError
+            If the chunk is not valid, its checksum does not match, or its number of chunks differs
+            from the earlier chunks of its transfer.
+        """
+        transfer_id, seq, total, payload = ChunkedMessage.unpack(chunk)
+        if transfer_id in self.completed:
+            return None
+
+        if transfer_id not in self.transfers:
+            self.transfers[transfer_id] = (total, {})
+            if len(self.transfers) > self.max_transfers:
+                dropped, (_, parts) = self.transfers.popitem(last=False)
+                logging.warning(f"Dropping incomplete transfer {dropped:08x} ({len(parts)} chunks received)")
+
+        expected, parts = self.transfers[transfer_id]
+        if total != expected:
+            raise ValueError(f"Chunk {seq} of transfer {transfer_id:08x} has {total} chunks, "
+                             f"the earlier chunks have {expected}")
+        parts[seq] = payload
+        if len(parts) < total:
+            return None
+
+        del self.transfers[transfer_id]
+        self.completed.append(transfer_id)
+        return b"".join(parts[i] for i in range(total))
@@ -0,0 +1,279 @@
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+from .static_config import CONNECT_TIMEOUT
+from .mqtt import MQTT
+from .outbound import OutboundScheduler
+from .publish_window import PublishHandle
+
+
+class Publisher:
+    """
+    Publishes to one topic over the shared connection of a `ConnectionManager`.
+
+    Every message takes a slot of the message class of the topic from the `OutboundScheduler` of the connection,
+    and holds it until it is delivered, or handed to the client by `publish_nowait`.
+
+    Parameters
+    ----------
+    connection : ConnectionManager
+        The connection the messages are sent over.
+    topic : str
+        The topic of the messages.
+    qos : int, optional
+        The QoS level of the messages, the QoS of the message class of the topic if not given.
+
+    Attributes
+    ----------
+    message_class : str
+        The message class of the topic, see `OutboundScheduler.classify`.
+    messages : int
+        The number of messages published.
+    bytes : int
+        The number of bytes published.
+    failures : int
+        The number of messages which were not delivered by `publish`, or not accepted by `publish_nowait`.
+    """
+
+    def __init__(self, connection: "ConnectionManager", topic: str, qos: Optional[int] = None) -> None:
+        self.connection = connection
+        self.topic = topic
+        self.message_class = connection.scheduler.classify(topic)
+        self.qos = qos if qos is not None else connection.scheduler.qos(self.message_class)
+        self.messages = 0
+        self.bytes = 0
+        self.failures = 0
+
+    def count(self, message: Union[str, bytes], failed: bool) -> None:
+        self.messages += 1
+        self.bytes += len(message)
+        self.failures += failed
+
+    def publish(self, message: Union[str, bytes]) -> Optional[float]:
+        """
+        Publish a message, and wait for its acknowledgement, see `MQTT.publish`.
+
+        Returns
+        -------
+        Optional[float]
+            The seconds it took to publish the message, None if it was not delivered.
+        """
+        with self.connection.scheduler.slot(self.message_class, len(message)):
+            elapsed = self.connection.mqtt.publish(message, self.topic, self.qos)
+        self.count(message, elapsed is None)
+        return elapsed
+
+    def publish_chunked(self, message: Union[str, bytes], chunk_size: int) -> bool:
+        """
+        Publish a message in resumable chunks, and wait for every chunk, see `MQTT.publish_chunked`.
+        Every chunk takes its own slot, so the higher classes do not wait for the whole message.
+
+        Returns
+        -------
+        bool
+            True if every chunk was acknowledged.
+        """
+        publish = functools.partial(self.submit, measured=False)
+        delivered = self.connection.mqtt.publish_chunked(message, self.topic, chunk_size, publish)
+        self.count(message, not delivered)
+        return delivered
+
+    def publish_async(self, message: Union[str, bytes], retain: bool = False) -> PublishHandle:
+        """
+        Publish a message without waiting for its acknowledgement, see `MQTT.publish_async`.
+        """
+        handle = self.submit(message, retain)
+        self.count(message, handle.status == PublishHandle.FAILED)
+        return handle
+
+    def submit(self, message: Union[str, bytes], retain: bool = False, measured: bool = True) -> PublishHandle:
+        """
+        Publish a message through the scheduler, the slot is held until the result of the message is known.
+        The message is not counted.
+        """
+        scheduler = self.connection.scheduler
+        scheduler.acquire(self.message_class, len(message))
+        try:
+            handle = self.connection.mqtt.publish_async(message, self.topic, retain, self.qos, measured=measured)
+        except Exception:
+            scheduler.release(self.message_class)
+            raise
+        handle.add_done_callback(lambda _: scheduler.release(self.message_class))
+        return handle
+
+    def publish_nowait(self, message: Union[str, bytes], retain: bool = False) -> bool:
+        """
+        Hand a message to the client without tracking its delivery, e.g. the log messages.
+
+        Returns
+        -------
+        bool
+            True if the client accepted the message.
+        """
+        with self.connection.scheduler.slot(self.message_class, len(message)):
+            accepted = self.connection.mqtt.publish_nowait(message, self.topic, self.qos, retain)
+        self.count(message, not accepted)
+        return accepted
+
+
+class ConnectionManager:
+    """
+    Owns the single MQTT connection of the process, and shares it between `Transmit`, `Logger` and `Config`.
+
+    Every broker connection costs a TCP handshake, a CONNECT/CONNACK exchange and a network thread,
+    so the process keeps one. The users get topic-scoped `Publisher`-s from `publisher`, and subscribe
+    their callbacks with `subscribe`. The client is connected in the background by its `Reconnector`,
+    which `start` starts. `connect` starts it and waits for the link, so every user can call it before sending.
+    The changes of the link are passed to the listeners added with `add_listener`.
+    The messages of the publishers are ordered by the `scheduler`.
+
+    The process-wide instance is returned by `shared`.
+
+    Parameters
+    ----------
+    mqtt : MQTT, optional
+        The client to share, a new one is created if not given.
+    scheduler : OutboundScheduler, optional
+        Orders the messages of the publishers, one with the `static_config` settings is created if not given.
+
+    Attributes
+    ----------
+    mqtt : MQTT
+        The shared client.
+    publishers : Dict[str, Publisher]
+        The publishers handed out, by topic.
+    scheduler : OutboundScheduler
+        The priority, the QoS and the shaping of the message classes.
+    connects : int
+        The number of times the broker accepted the connection, including the automatic reconnects of the client.
+    disconnects : int
+        The number of times the connection was lost or closed.
+    """
+
+    _shared: Optional["ConnectionManager"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, mqtt: Optional[MQTT] = None, scheduler: Optional[OutboundScheduler] = None) -> None:
+        self.mqtt = mqtt if mqtt is not None else MQTT()
+        self.scheduler = scheduler if scheduler is not None else OutboundScheduler()
+        self.publishers: Dict[str, Publisher] = {}
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.disconnects = 0
+        self.connected_at: Optional[float] = None
+        self.mqtt.connection_listeners.append(self.on_connection_change)
+
+    @classmethod
+    def shared(cls) -> "ConnectionManager":
+        """
+        The connection manager of the process, created on the first call.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def start(self) -> None:
+        """
+        Start connecting in the background, and keep the client connected, see `Reconnector`.
+        """
+        self.mqtt.reconnector.start()
+
+    def wait(self, timeout: float = 0) -> bool:
+        """
+        Wait at most `timeout` seconds for the link, without blocking by default.
+
+        Returns
+        -------
+        bool
+            True if the broker accepted the connection.
+        """
+        return self.mqtt.wait_for_connection(timeout)
+
+    def connect(self, timeout: float = CONNECT_TIMEOUT) -> None:
+        """
+        Start connecting in the background if it is not started yet, and wait for the link.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the broker to accept the connection.
+
+        Raises
+        ------
+        ConnectionError
+            If the broker did not accept the connection in time.
+        """
+        self.start()
+        if not self.wait(timeout):
+            raise ConnectionError(f"Broker {self.mqtt.broker} is not connected after {timeout} seconds")
+
+    def add_listener(self, listener: Callable[[bool], None]) -> None:
+        """
+        Call `listener` with True when the link comes up, and with False when it drops, on the network thread.
+        """
+        self.mqtt.connection_listeners.append(listener)
+
+    def on_connection_change(self, connected: bool) -> None:
+        if connected:
+            self.connects += 1
+            self.connected_at = time.monotonic()
+        else:
+            self.disconnects += 1
+
+    def publisher(self, topic: str, qos: Optional[int] = None) -> Publisher:
+        """
+        The publisher of a topic, the same one for every call with the same topic.
+        """
+        with self.lock:
+            if topic not in self.publishers:
+                self.publishers[topic] = Publisher(self, topic, qos)
+            return self.publishers[topic]
+
+    def subscribe(self, topic: str, callback: Callable) -> None:
+        """
+        Subscribe a callback to a topic, see `MQTT.subscribe`.
+        """
+        self.mqtt.subscribe(topic, callback)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        The connection statistics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of MQTT ``clients`` created by the process, the ``connects``, ``reconnects``,
+            ``disconnects``, the connection ``attempts`` and ``failures`` of the `Reconnector`, its ``state``,
+            and the ``uptime`` of the current connection in seconds.
+        """
+        reconnector = self.mqtt.reconnector
+        connected = self.mqtt.is_connected() and self.connected_at is not None
+        return {
+            "clients": MQTT.clients,
+            "connects": self.connects,
+            "reconnects": max(self.connects - 1, 0),
+            "disconnects": self.disconnects,
+            "attempts": reconnector.attempts,
+            "failures": reconnector.failed_attempts,
+            "state": reconnector.state,
+            "uptime": round(time.monotonic() - self.connected_at, 1) if connected else None,
+        }
+
+    def publisher_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        The ``messages``, ``bytes`` and ``failures`` of every publisher, by topic.
+        """
+        with self.lock:
+            return {topic: {"messages": publisher.messages, "bytes": publisher.bytes, "failures": publisher.failures}
+                    for topic, publisher in self.publishers.items()}
+
+    def disconnect(self) -> None:
+        """
+        Close the shared connection, and log its statistics.
+        """
+        logging.info(f"MQTT connection: {self.stats()}, publishers: {self.publisher_stats()}, "
+                     f"outbound: {self.scheduler.report()}")
+        self.mqtt.disconnect()
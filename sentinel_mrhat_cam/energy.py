@@ -0,0 +1,158 @@
+import csv
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+from .static_config import ENERGY_LOG_PATH
+from .power import PowerSampler
+from .system import clock
+
+
+@dataclass
+class PhaseTotals:
+    """
+    The accumulated duration and energy of a phase.
+    """
+    count: int = 0
+    seconds: float = 0.0
+    joules: float = 0.0
+    coulombs: float = 0.0
+
+
+class EnergyMeter:
+    """
+    Accounts the battery energy spent in the phases of the application.
+
+    A phase is tagged with the `phase` context manager. When it ends, the battery power measured by
+    the `PowerSampler` during the phase is integrated, and added to the totals of the phase.
+    Every measured phase is also written as a row of the `log_path` CSV file, for offline analysis.
+
+    The energy of a phase is the mean battery power of the samples taken during it, widened by one
+    sample period on both sides, times its duration. This way the phases shorter than the sampling
+    period are accounted too. The energy and the charge are absolute values, whichever sign the driver uses.
+    In always-on mode the phases of the `Pipeline` overlap, each of them is accounted the energy spent
+    while it ran.
+
+    Parameters
+    ----------
+    sampler : Optional[PowerSampler]
+        The source of the power samples. If None, only the durations are accounted.
+    log_path : Optional[str]
+        The CSV file the phases are appended to, nothing is written if None.
+
+    Examples
+    --------
+    >>> meter = EnergyMeter(sampler)
+    >>> with meter.phase("capture"):
+    ...     image = camera.capture()
+    >>> meter.report()["phases"]["capture"]["joules"]
+    """
+
+    PHASES = ("boot", "camera_start", "autofocus", "capture", "encode", "connect", "publish", "idle", "shutdown")
+    CSV_HEADER = ("timestamp", "phase", "seconds", "joules", "mAh", "batteryVoltage")
+
+    def __init__(self, sampler: Optional[PowerSampler], log_path: Optional[str] = ENERGY_LOG_PATH) -> None:
+        self.sampler = sampler
+        self.log_path = log_path
+        self.totals: Dict[str, PhaseTotals] = {}
+        self.images = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Account the code run inside the ``with`` block as the phase `name`.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.monotonic())
+
+    def measure(self, start: float, end: float) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        Integrate the battery power and current over a time window on the `time.monotonic()` clock.
+
+        If there are no samples in the window (e.g. the boot, before the sampler was started),
+        the samples of the first second after the window are used as an estimate.
+
+        Returns
+        -------
+        Tuple[Optional[float], Optional[float], Optional[float]]
+            The energy in joules, the charge in coulombs and the mean battery voltage,
+            None if there are no samples.
+        """
+        if self.sampler is None:
+            return None, None, None
+        pad = 1 / self.sampler.rate
+        stats = self.sampler.stats(start - pad, end + pad)
+        if "batteryPower" not in stats:
+            stats = self.sampler.stats(end, end + 1)
+        if "batteryPower" not in stats:
+            return None, None, None
+        duration = end - start
+        return (abs(stats["batteryPower"]["mean"]) * duration, abs(stats["batteryCurrent"]["mean"]) * duration,
+                stats["batteryVoltage"]["mean"])
+
+    def record(self, name: str, start: float, end: float) -> None:
+        """
+        Account a phase which ran between two points in time on the `time.monotonic()` clock.
+        """
+        joules, coulombs, voltage = self.measure(start, end)
+        with self.lock:
+            totals = self.totals.setdefault(name, PhaseTotals())
+            totals.count += 1
+            totals.seconds += end - start
+            totals.joules += joules or 0.0
+            totals.coulombs += coulombs or 0.0
+        if joules is not None:
+            self.write_row(name, end - start, joules, coulombs, voltage)
+
+    def write_row(self, name: str, seconds: float, joules: float, coulombs: float, voltage: float) -> None:
+        if self.log_path is None:
+            return
+        try:
+            new_file = not os.path.exists(self.log_path)
+            with open(self.log_path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.CSV_HEADER)
+                writer.writerow([clock.get_time(), name, f"{seconds:.3f}", f"{joules:.4f}",
+                                 f"{coulombs / 3.6:.4f}", f"{voltage:.3f}"])
+        except OSError as e:
+            logging.error(f"Failed to write the energy log: {e}")
+
+    def delivered(self) -> None:
+        """
+        Count a delivered image.
+        """
+        with self.lock:
+            self.images += 1
+
+    def report(self) -> Dict[str, Any]:
+        """
+        The energy report which is sent to `ENERGYTOPIC`.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The ``count``, ``seconds``, ``joules`` and ``mAh`` of every phase, the number of delivered
+            ``images``, and the ``joulesPerImage`` and ``mAhPerImage`` (None before the first image).
+        """
+        with self.lock:
+            phases = {name: {"count": totals.count, "seconds": round(totals.seconds, 3),
+                             "joules": round(totals.joules, 4), "mAh": round(totals.coulombs / 3.6, 4)}
+                      for name, totals in self.totals.items()}
+            joules = sum(totals.joules for totals in self.totals.values())
+            coulombs = sum(totals.coulombs for totals in self.totals.values())
+            images = self.images
+        return {
+            "timestamp": clock.get_time(),
+            "phases": phases,
+            "images": images,
+            "joulesPerImage": round(joules / images, 4) if images else None,
+            "mAhPerImage": round(coulombs / 3.6 / images, 4) if images else None,
+        }
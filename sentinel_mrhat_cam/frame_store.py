@@ -0,0 +1,174 @@
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
+from .static_config import FRAME_STORE_PATH, FRAME_STORE_CAPACITY, FRAME_STORE_SLOTS
+
+
+class FrameStore:
+    """
+    A bounded on-device store of full resolution JPEG frames, indexed by their timestamp.
+
+    The frames are written one after the other into a segment file of fixed size, which is used as
+    a ring: when the next frame does not fit before the end, writing continues from the start,
+    and the frames which are overwritten drop out of the index. The disk usage never grows,
+    and the oldest frames are always the first to go.
+
+    The index is a separate, memory-mapped file of fixed-size records, so looking up a frame does
+    not read anything from the segment file, and the index survives the shutdowns of periodic mode.
+
+    Layout of the index file (little-endian):
+
+    ========  ======  =====================================================
+    Offset    Size    Field
+    ========  ======  =====================================================
+    0         4       Magic bytes, ``b"SMCF"``
+    4         4       Number of slots
+    8         8       Capacity of the segment file in bytes
+    16        8       Offset of the next write in the segment file
+    24        4       The next slot to use
+    28        4       Reserved
+    32        24      Slot 0: timestamp (microseconds, int64), offset (uint64),
+                      length (uint32), CRC-32 (uint32)
+    ...
+    ========  ======  =====================================================
+
+    A slot with zero length is empty.
+
+    Parameters
+    ----------
+    path : str, optional
+        The directory of the segment and index files, created if it does not exist.
+    capacity : int, optional
+        The size of the segment file in bytes.
+    slots : int, optional
+        The maximum number of frames in the index.
+    """
+
+    MAGIC = b"SMCF"
+    HEADER_DTYPE = np.dtype([("magic", "S4"), ("slots", "<u4"), ("capacity", "<u8"),
+                             ("head", "<u8"), ("next_slot", "<u4"), ("reserved", "<u4")])
+    ENTRY_DTYPE = np.dtype([("timestamp", "<i8"), ("offset", "<u8"), ("length", "<u4"), ("crc", "<u4")])
+
+    def __init__(self, path: str = FRAME_STORE_PATH, capacity: int = FRAME_STORE_CAPACITY,
+                 slots: int = FRAME_STORE_SLOTS) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.segment_path = os.path.join(path, "frames.seg")
+        self.index_path = os.path.join(path, "frames.idx")
+        index_size = self.HEADER_DTYPE.itemsize + slots * self.ENTRY_DTYPE.itemsize
+
+        fresh = not self.valid_index(index_size, slots, capacity)
+        if fresh:
+            if os.path.exists(self.index_path):
+                logging.warning("Frame store settings have changed, starting an empty store")
+            with open(self.index_path, "wb") as f:
+                f.truncate(index_size)
+        with open(self.segment_path, "ab") as f:
+            f.truncate(capacity)
+
+        self.header = np.memmap(self.index_path, dtype=self.HEADER_DTYPE, mode="r+", shape=(1,))
+        self.entries = np.memmap(self.index_path, dtype=self.ENTRY_DTYPE, mode="r+",
+                                 offset=self.HEADER_DTYPE.itemsize, shape=(slots,))
+        if fresh:
+            self.header[0] = (self.MAGIC, slots, capacity, 0, 0, 0)
+            self.header.flush()
+        self.fd = os.open(self.segment_path, os.O_RDWR)
+
+    def valid_index(self, index_size: int, slots: int, capacity: int) -> bool:
+        """
+        Check if the index file exists, and it was created with the same settings.
+        """
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) != index_size:
+            return False
+        header = np.fromfile(self.index_path, dtype=self.HEADER_DTYPE, count=1)[0]
+        return header["magic"] == self.MAGIC and header["slots"] == slots and header["capacity"] == capacity
+
+    @staticmethod
+    def key(timestamp: str) -> int:
+        """
+        Convert an ISO 8601 timestamp into the key of the index, microseconds since the epoch.
+        """
+        return round(datetime.fromisoformat(timestamp).timestamp() * 1_000_000)
+
+    def put(self, timestamp: str, jpeg: bytes) -> None:
+        """
+        Store a frame, overwriting the oldest frames if there is not enough space.
+
+        Parameters
+        ----------
+        timestamp : str
+            The time the frame was taken at, in ISO 8601 format.
+        jpeg : bytes
+            The JPEG encoded frame.
+
+        Raises
+        ------
+        ValueError
+            If the frame is larger than the whole segment file.
+        """
+        header = self.header[0]
+        capacity = int(header["capacity"])
+        if len(jpeg) > capacity:
+            raise ValueError(f"Frame of {len(jpeg)} bytes does not fit into the frame store of {capacity} bytes")
+
+        offset = int(header["head"])
+        if offset + len(jpeg) > capacity:
+            offset = 0
+
+        # Drop the frames which are about to be overwritten, before the data is touched
+        end = offset + len(jpeg)
+        overlapping = (self.entries["length"] > 0) & (self.entries["offset"] < end) & \
+            (self.entries["offset"] + self.entries["length"] > offset)
+        self.entries["length"][overlapping] = 0
+        slot = int(header["next_slot"])
+        self.entries["length"][slot] = 0
+        self.entries.flush()
+
+        os.pwrite(self.fd, jpeg, offset)
+        self.entries[slot] = (self.key(timestamp), offset, len(jpeg), zlib.crc32(jpeg))
+        self.entries.flush()
+        self.header["head"] = end
+        self.header["next_slot"] = (slot + 1) % len(self.entries)
+        self.header.flush()
+
+    def get(self, timestamp: str) -> Optional[bytes]:
+        """
+        Read a stored frame.
+
+        Parameters
+        ----------
+        timestamp : str
+            The time the frame was taken at, as sent in the preview message.
+
+        Returns
+        -------
+        Optional[bytes]
+            The JPEG encoded frame, or None if the frame is not in the store (anymore).
+        """
+        matches = np.flatnonzero((self.entries["timestamp"] == self.key(timestamp)) & (self.entries["length"] > 0))
+        if matches.size == 0:
+            return None
+
+        entry = self.entries[matches[-1]]
+        jpeg = os.pread(self.fd, int(entry["length"]), int(entry["offset"]))
+        if zlib.crc32(jpeg) != entry["crc"]:
+            logging.error(f"Stored frame {timestamp} is corrupted")
+            return None
+        return jpeg
+
+    def timestamps(self) -> List[int]:
+        """
+        Returns the keys of the stored frames, in microseconds since the epoch, oldest first.
+        """
+        stored = self.entries[self.entries["length"] > 0]
+        return sorted(int(key) for key in stored["timestamp"])
+
+    def close(self) -> None:
+        """
+        Close the segment file, and flush the index.
+        """
+        self.entries.flush()
+        self.header.flush()
+        os.close(self.fd)
@@ -1,9 +1,10 @@
 import logging
 import logging.config
-import yaml
 import os
 import threading
+import copy
 from queue import Queue, Empty
+from typing import Optional
 from multiprocessing.pool import ThreadPool
 from .static_config import LOGGING_TOPIC, LOG_LEVEL
 
@@ -32,6 +33,14 @@ class Logger(logging.Handler):
         An event to signal the start of MQTT logging.
     pool : ThreadPool
         A thread pool for asynchronous publishing of log messages.
+    mqtt : Optional[MQTT]
+        The client of the shared `ConnectionManager`, once the MQTT logging is started.
+    publisher : Optional[Publisher]
+        Publishes the log messages to `LOGGING_TOPIC`.
+    config : Optional[dict]
+        The logging configuration, once the logging is started.
+    signature : Optional[List[int]]
+        The `ResumeState.signature` of the configuration file when it was read.
 
     Raises
     ------
@@ -52,26 +61,42 @@ class Logger(logging.Handler):
         self.filepath = filepath
         self.log_queue = Queue()
         self.mqtt = None
+        self.publisher = None
         self.start_event = threading.Event()
         self.pool = ThreadPool(processes=5)
+        self.config = None
+        self.signature = None
 
-    def start_logging(self) -> None:
+    def start_logging(self, config: Optional[dict] = None) -> None:
         """
         Start the logging process.
 
         This method loads the logging configuration from the `log_config.yaml` file,
         sets up the logging system, and adds the MQTT handler to the root logger.
 
+        Parameters
+        ----------
+        config : dict, optional
+            The already parsed logging configuration, e.g. from the `ResumeState`.
+            If given, the file is not read.
+
         Raises
         ------
         Exception
             For any unexpected errors during the logging setup.
         """
         try:
-            if not os.path.exists(self.filepath):
-                raise FileNotFoundError(f"Log configuration file not found: {self.filepath}")
-            with open(self.filepath, 'r') as f:
-                config = yaml.safe_load(f)
+            from .resume import ResumeState
+            self.signature = ResumeState.signature(self.filepath)
+            if config is None:
+                if not os.path.exists(self.filepath):
+                    raise FileNotFoundError(f"Log configuration file not found: {self.filepath}")
+                # yaml is only loaded if the parsed configuration is not given
+                import yaml
+                with open(self.filepath, 'r') as f:
+                    config = yaml.safe_load(f)
+            # dictConfig changes the dictionary, the original is kept for the resume state
+            self.config = copy.deepcopy(config)
             logging.config.dictConfig(config)
             # Add the MQTT handler to the root logger
             self.create_mqtt_handler()
@@ -99,14 +124,32 @@ class Logger(logging.Handler):
         """
         Initialize MQTT connection and start MQTT logging.
 
-        This method creates an instance of the MQTT class, connects to the MQTT
-        broker, and signals that MQTT logging has started.
+        This method connects the shared `ConnectionManager` if it is not connected yet,
+        and signals that MQTT logging has started. If the broker is not reachable,
+        the logs are not sent, and the next call tries again. The logs queued while the link is down
+        are sent when it comes back, see `on_link_change`.
         """
-        from .mqtt import MQTT
-        self.mqtt = MQTT()
-        self.mqtt.connect()
+        from .connection import ConnectionManager
+        connection = ConnectionManager.shared()
+        try:
+            connection.connect()
+        except ConnectionError as e:
+            # Logging through the root logger would come back to this handler
+            print(f"MQTT logging could not be started: {e}")
+            return
+        # The QoS of the logs, and their yielding to the images, is set by the message class of the topic
+        self.publisher = connection.publisher(LOGGING_TOPIC)
+        self.mqtt = connection.mqtt
+        connection.add_listener(self.on_link_change)
         self.start_event.set()
 
+    def on_link_change(self, connected: bool) -> None:
+        """
+        Send the queued log messages when the link to the broker comes back.
+        """
+        if connected and self.start_event.is_set() and not self.log_queue.empty():
+            self.pool.apply_async(self.publish_loop, args=("", LOGGING_TOPIC))
+
     def emit(self, record: logging.LogRecord) -> None:
         """
         Process a log record, format it, and queue it for publishing.
@@ -163,7 +206,7 @@ class Logger(logging.Handler):
                 msg = self.log_queue.get(timeout=1)
                 # Do not publish if not connected
                 if self.mqtt.is_connected():
-                    self.mqtt.client.publish(topic, msg)
+                    self.publisher.publish_nowait(msg)
                 else:
                     return
             except Empty:
@@ -173,14 +216,12 @@ class Logger(logging.Handler):
 
     def disconnect_mqtt(self) -> None:
         """
-        Close the logger, disconnect MQTT, and clean up resources.
+        Close the logger, and clean up resources.
 
-        This method stops the thread pool, disconnects from the MQTT broker
-        if connected, and closes the logging handler.
+        This method stops the thread pool, and closes the logging handler.
+        The shared MQTT connection is closed by the `App`.
         """
         self.start_event.clear()
         self.pool.close()
         self.pool.join()
-        if self.mqtt is not None and self.mqtt.is_connected():
-            self.mqtt.disconnect()
         super().close()
@@ -1,11 +1,12 @@
-from .app import App
-from .logger import Logger
 from .static_config import LOG_CONFIG_PATH, CONFIG_PATH
+from .startup import StartupReport
+from typing import List, Optional
+import argparse
 import logging
 import sys
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Main entry point for the application.
 
@@ -23,6 +24,14 @@ def main():
     In case of a SystemExit exception, it logs the exit reason, disconnects
     from MQTT, and exits the application with the provided exit code.
 
+    With the ``--startup-report`` argument, the time spent loading every module and the initialization
+    steps are printed to the standard error once the app is started, see `StartupReport`.
+
+    Parameters
+    ----------
+    argv : List[str], optional
+        The command line arguments, `sys.argv` by default.
+
     Raises
     ------
     SystemExit
@@ -33,14 +42,40 @@ def main():
     This function is the entry point of the application when run as a script.
     It sets up all necessary components and manages the main execution flow.
     """
+    parser = argparse.ArgumentParser(prog="sentinel_mrhat_cam")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the module import and initialization timeline to stderr")
+    args = parser.parse_args(argv)
+
+    # The modules are imported here, so the report covers them
+    report = StartupReport()
+    if args.startup_report:
+        report.install()
+
+    # The snapshot of the previous boot, if the device was shut down between two images
+    with report.step("resume"):
+        from .resume import ResumeState
+        resume = ResumeState()
 
     # Configuring and starting the logging
-    logger = Logger(LOG_CONFIG_PATH)
-    logger.start_logging()
+    with report.step("logging"):
+        from .logger import Logger
+        logger = Logger(LOG_CONFIG_PATH)
+        logger.start_logging(resume.cached(LOG_CONFIG_PATH))
+        resume.apply()
 
     # Instantiating the Camera and MQTT objects with the provided configuration file
-    app = App(CONFIG_PATH, logger)
-    app.start()
+    with report.step("import app"):
+        from .app import App
+    with report.step("App()"):
+        app = App(CONFIG_PATH, logger, resume)
+    with report.step("App.start()"):
+        app.start()
+
+    if args.startup_report:
+        report.uninstall()
+        report.add_tasks(app.init_timings)
+        report.print()
 
     try:
         # The app is taking pictures nonstop
@@ -57,7 +92,7 @@ def main():
         logging.info(f"Exit code in main: {e.code}\n Exiting the application because: {e}")
         sys.exit(e.code)
     finally:
-        app.mqtt.disconnect()
+        app.connection.disconnect()
         logger.disconnect_mqtt()
 
 
@@ -0,0 +1,123 @@
+import json
+import struct
+from typing import Dict, Any, Tuple
+
+
+class BinaryMessage:
+    """
+    Packs and unpacks the versioned binary image message.
+
+    The binary format carries the JPEG bytes as they are, instead of wrapping them
+    into a base64 string inside a JSON document. This saves the ~33% base64 overhead
+    and the extra full-size string copies on the device.
+
+    Layout (all integers are big-endian):
+
+    ========  ======  =====================================================
+    Offset    Size    Field
+    ========  ======  =====================================================
+    0         4       Magic bytes, ``b"SMCI"``
+    4         1       Format version, currently ``1``
+    5         1       Flags, reserved, always ``0``
+    6         2       Length of the metadata block in bytes (``M``)
+    8         4       Length of the image block in bytes (``N``)
+    12        M       Metadata, compact UTF-8 JSON (timestamp and telemetry)
+    12 + M    N       The JPEG image
+    ========  ======  =====================================================
+
+    The metadata block contains the same keys as the JSON message, except ``image``.
+
+    Examples
+    --------
+    >>> payload = BinaryMessage.pack({"timestamp": "2024-07-11T18:52:05+00:00"}, jpeg_bytes)
+    >>> metadata, image = BinaryMessage.unpack(payload)
+    """
+
+    MAGIC = b"SMCI"
+    VERSION = 1
+    HEADER = struct.Struct(">4sBBHI")
+
+    @staticmethod
+    def pack(metadata: Dict[str, Any], image: bytes) -> bytes:
+        """
+        Create a binary message from the metadata and the JPEG image.
+
+        Parameters
+        ----------
+        metadata : Dict[str, Any]
+            The timestamp and the telemetry values, must be JSON serializable.
+        image : bytes
+            The JPEG encoded image.
+
+        Returns
+        -------
+        bytes
+            The whole binary message.
+
+        Raises
+        ------
+        ValueError
+            If the metadata block is too large to fit into the header.
+        """
+        meta: bytes = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+        if len(meta) > 0xFFFF:
+            raise ValueError(f"Metadata block is too large: {len(meta)} bytes")
+
+        header = BinaryMessage.HEADER.pack(BinaryMessage.MAGIC, BinaryMessage.VERSION, 0, len(meta), len(image))
+        return b"".join((header, meta, image))
+
+    @staticmethod
+    def is_binary(payload: bytes) -> bool:
+        """
+        Check if the payload is a binary message, so receivers can accept both formats.
+
+        Parameters
+        ----------
+        payload : bytes
+            The received MQTT payload.
+
+        Returns
+        -------
+        bool
+            True if the payload starts with the binary message magic bytes.
+        """
+        return bytes(payload[:len(BinaryMessage.MAGIC)]) == BinaryMessage.MAGIC
+
+    @staticmethod
+    def unpack(payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+        """
+        Split a binary message into its metadata and the JPEG image.
+
+        Parameters
+        ----------
+        payload : bytes
+            The whole binary message.
+
+        Returns
+        -------
+        Tuple[Dict[str, Any], bytes]
+            - Dict[str, Any]: The decoded metadata.
+            - bytes: The JPEG image.
+
+        Raises
+        ------
+        ValueError
+            If the payload is not a binary message, the version is not supported,
+            or the payload is truncated.
+        """
+        header_size = BinaryMessage.HEADER.size
+        if len(payload) < header_size:
+            raise ValueError("Payload is shorter than the binary message header")
+
+        magic, version, _, meta_length, image_length = BinaryMessage.HEADER.unpack_from(payload)
+        if magic != BinaryMessage.MAGIC:
+            raise ValueError("Payload is not a binary message")
+        if version != BinaryMessage.VERSION:
+            raise ValueError(f"Unsupported binary message version: {version}")
+        if len(payload) != header_size + meta_length + image_length:
+            raise ValueError("Binary message length does not match its header")
+
+        view = memoryview(payload)
+        metadata = json.loads(bytes(view[header_size:header_size + meta_length]))
+        image = bytes(view[header_size + meta_length:])
+        return metadata, image
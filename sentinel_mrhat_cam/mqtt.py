@@ -1,14 +1,21 @@
+import functools
 import logging
 import time
 import shutil
 from .static_config import BROKER, CONFIGSUBTOPIC, PORT, QOS, TEMP_CONFIG_PATH, CONFIG_PATH, USERNAME, PASSWORD
+from .static_config import CHUNK_ACK_TIMEOUT, CHUNK_MAX_ROUNDS, CONNECT_TIMEOUT, MQTT_V5, CLIENT_ID
+from .chunking import ChunkedTransfer
+from .bitrate import LinkEstimator
+from .publish_window import PublishHandle, PublishWindow
+from .reconnect import Reconnector
+from .mqtt5 import V5Transport
 try:
     from paho.mqtt import client as mqtt_client
 except ImportError:
     mqtt_client = None
 import json
-import socket
 import threading
+from typing import Callable, Dict, List, Optional
 
 
 class MQTT:
@@ -30,29 +37,65 @@ class MQTT:
         The Quality of Service level for MQTT messages.
     client : mqtt_client.Client
         The MQTT client instance.
-    reconnect_counter : int
-        A counter to track reconnection attempts.
+    reconnector : Reconnector
+        Connects the client in the background, and again when the link drops.
+    v5 : Optional[V5Transport]
+        The MQTT v5 features (topic aliases, user properties, message expiry, persistent session),
+        if `MQTT_V5` is enabled, None for an MQTT 3.1.1 client with a clean session.
     config_received_event : threading.Event
         An event to signal when a new configuration is received.
     config_confirm_message : str
         A message to confirm the receipt of a new configuration.
+    link : LinkEstimator
+        Throughput and latency estimate of the link, based on the completed publishes.
+    subscriptions : Dict[str, Callable]
+        The topics subscribed with `subscribe`, and their callbacks.
+    window : PublishWindow
+        Publishes the messages with several of them in flight, and collects their acknowledgements.
+    connection_listeners : List[Callable[[bool], None]]
+        Called with True when the broker accepted the connection, and with False when the connection is lost
+        or closed, on the network thread.
+    clients : int
+        Class attribute, the number of clients created by the process, see `ConnectionManager`.
+    verified_broker : Optional[str]
+        Class attribute, the broker which accepted the last connection of any client.
+        It is restored from the `ResumeState` after a shutdown.
 
     Notes
     ------
-    - The MQTT broker connection is retried up to 20 times upon failure.
+    - `connect` makes a single attempt, the `reconnector` retries it with a backoff. The client does not
+      reconnect on its own, its network thread ends when the link drops.
+    - The subscriptions are renewed on every connection, see `on_connect`.
     - This class requires the `paho-mqtt` library to be installed.
     - The class uses configuration values from a `static_config` module, which should be present in the same package.
     """
 
+    verified_broker: Optional[str] = None
+    clients = 0
+
     def __init__(self):
+        MQTT.clients += 1
         self.broker = BROKER
         self.subtopic = CONFIGSUBTOPIC
         self.port = PORT
         self.qos = QOS
-        self.client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2)
-        self.broker_connect_counter = 0
+        self.v5 = V5Transport() if MQTT_V5 else None
+        if self.v5 is not None:
+            self.client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID,
+                                             protocol=mqtt_client.MQTTv5, reconnect_on_failure=False)
+        else:
+            self.client = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2, reconnect_on_failure=False)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.username_pw_set(USERNAME, PASSWORD)
+        self.client.disable_logger()
         self.config_received_event = threading.Event()
         self.config_confirm_message = "config-nok|Confirm message uninitialized"
+        self.link = LinkEstimator()
+        self.subscriptions: Dict[str, Callable] = {}
+        self.window = PublishWindow(self.client, self.qos, on_result=self.on_publish_result)
+        self.connection_listeners: List[Callable[[bool], None]] = []
+        self.reconnector = Reconnector(self)
 
     def is_connected(self) -> bool:
         return self.client.is_connected() if self.client else False
@@ -74,8 +117,7 @@ class MQTT:
             from .app_config import Config
             try:
                 # Parse the JSON message
-                config_data = json.loads(msg.payload)
-                Config.validate_config(config_data)
+                config_data = Config.validate_config(json.loads(msg.payload))
 
                 # Write the validated JSON to the temp file
                 with open(TEMP_CONFIG_PATH, "w") as temp_config:
@@ -96,133 +138,180 @@ class MQTT:
                 self.config_received_event.set()
 
         self.client.on_message = on_message
-        self.client.subscribe(self.subtopic)
+        self.subscribe_config()
+
+    def subscribe_config(self) -> None:
+        """
+        Subscribe to the config topic. With a persistent session (see `V5Transport`) the subscription
+        has the QoS of the client, so the broker queues the configs sent while the device is shut down.
+        """
+        self.client.subscribe(self.subtopic, qos=self.qos if self.v5 is not None else 0)
+
+    def subscribe(self, topic: str, callback: Callable) -> None:
+        """
+        Subscribe to a topic with its own message callback, next to the config topic.
+        The subscription is renewed on every connection.
+
+        Parameters
+        ----------
+        topic : str
+            The topic to subscribe to.
+        callback : Callable
+            Called with ``(client, userdata, msg)`` for the messages of the topic, on the network thread.
+        """
+        self.subscriptions[topic] = callback
+        self.client.message_callback_add(topic, callback)
+        self.client.subscribe(topic, qos=self.qos)
 
     def connect(self):
         """
-        Connect to the MQTT broker.
+        Connect to the MQTT broker, a single attempt.
 
-        This method sets up various callbacks for connection events and
-        attempts to establish a connection to the MQTT broker.
+        The first connection opens the connection to the broker, the later ones use the reconnect of the client,
+        after the network thread of the previous connection has ended. The client connects in the background,
+        the `connection_listeners` are called once the broker accepted the connection.
+        Use `reconnector` to keep the client connected.
 
         Returns
         -------
         mqtt_client.Client
-            The connected MQTT client instance.
+            The MQTT client instance.
+
+        Raises
+        ------
+        ConnectionError
+            If the broker is not reachable, or the connection fails.
         """
         try:
-            def on_connect(client, userdata, flags, rc, properties=None):
-                if rc == 0:
-                    logging.info("Connected to MQTT Broker!")
-                else:
-                    logging.error(f"Failed to connect, return code {rc}")
-
-            # Making sure we can reach the broker before trying to connect
-            self.broker_check()
-
-            self.client.on_connect = on_connect
-            self.client.username_pw_set(USERNAME, PASSWORD)
-            self.client.disable_logger()
-
-            self.client.connect(self.broker, self.port)
-            # Resetting the counter after a successful connection
-            self.broker_connect_counter = 0
+            self.client.loop_stop()
+            if self.client.host:
+                self.client.reconnect()
+            elif self.v5 is not None:
+                self.client.connect(self.broker, self.port, clean_start=False,
+                                    properties=self.v5.connect_properties())
+            else:
+                self.client.connect(self.broker, self.port)
             self.client.loop_start()
             return self.client
 
         except Exception as e:
+            MQTT.verified_broker = None
             logging.error(f"Error connecting to MQTT broker: {e}")
-            exit(1)
+            raise ConnectionError(f"Error connecting to MQTT broker: {e}") from e
 
-    def broker_check(self) -> None:
+    def on_connect(self, client, userdata, flags, rc, properties=None) -> None:
         """
-        Continuously checks the connection to the MQTT broker until it becomes available.
-
-        This method repeatedly checks the availability of the MQTT broker by calling the
-        `is_broker_available` method. It uses a counter to track the number of connection attempts.
+        The ``on_connect`` callback of the client. Renews the subscriptions, which the broker does not keep
+        between the connections (unless it resumed the session), and calls the `connection_listeners`.
+        """
+        if rc != 0:
+            logging.error(f"Failed to connect, return code {rc}")
+            return
+        logging.info("Connected to MQTT Broker!")
+        MQTT.verified_broker = self.broker
+        if self.v5 is not None:
+            self.v5.on_connect(flags, properties)
+            logging.info(f"Session present: {self.v5.session_present}, topic aliases: {self.v5.aliases}")
+        if self.client.on_message is not None:
+            self.subscribe_config()
+        for topic in self.subscriptions:
+            self.client.subscribe(topic, qos=self.qos)
+        self.notify(True)
+
+    def on_disconnect(self, client, userdata, flags, rc, properties=None) -> None:
+        logging.info(f"Disconnected from the MQTT Broker, reason: {rc}")
+        if self.v5 is not None:
+            self.v5.on_disconnect()
+        self.notify(False)
+
+    def notify(self, connected: bool) -> None:
+        """
+        Call the `connection_listeners`.
+        """
+        for listener in self.connection_listeners:
+            try:
+                listener(connected)
+            except Exception as e:
+                logging.error(f"Error in a connection listener: {e}")
 
-        The process flow is as follows:
-        - Wait for 0.5 seconds between each connection attempt.
-        - Increment the connection attempt counter after each wait period.
-        - If the connection is not established within 20 attempts, log an error and terminate the program.
+    def publish_async(self, message, topic, retain: bool = False, qos: Optional[int] = None,
+                      measured: bool = True) -> PublishHandle:
+        """
+        Publishes a message without waiting for its acknowledgement, through the `window`.
 
-        Attributes:
+        Parameters
         ----------
-        broker_connect_counter : int
-            A counter that tracks the number of attempts made to connect to the broker.
-            It is incremented with each failed attempt.
-
-        Methods:
-        -------
-        is_broker_available() -> bool:
-            Checks if the MQTT broker is available by attempting a socket connection.
-
-        Logs:
-        -----
-        Logs the following messages:
-        - INFO: Indicates that the connection attempt is in progress.
-        - ERROR: If the broker is not available after 20 attempts, it logs an error before exiting.
+        message : Union[str, bytes]
+            The payload to be published to the MQTT topic.
+        topic : str
+            The topic string to which the message should be published.
+        retain : bool, optional
+            If True, the broker keeps the message as the last one of the topic.
+        qos : int, optional
+            The QoS level, the QoS of the client if not given.
+        measured : bool, optional
+            If False, the delivery is not recorded in `link`, e.g. a chunk of a larger message.
 
-        Raises:
+        Returns
         -------
-        SystemExit:
-            Terminates the script if the broker connection fails 20 times.
-        """
-        while not self.is_broker_available():
-            logging.info("Waiting for broker to become available...")
-            time.sleep(1)
-            self.broker_connect_counter += 1
-            if self.broker_connect_counter == 20:
-                logging.error("Connecting to network failed 20 times, restarting script...")
-                exit(1)
-
-    def is_broker_available(self) -> bool:
+        PublishHandle
+            The delivery of the message, `PublishHandle.wait` returns True once the broker acknowledged it.
         """
-        Checks if the MQTT broker is reachable by attempting to establish a socket connection.
+        if self.v5 is None:
+            return self.window.submit(message, topic, qos, retain, measured=measured)
+        publish_topic, payload, properties = self.v5.prepare(topic, message, self.qos if qos is None else qos)
+        return self.window.submit(payload, topic, qos, retain, properties=properties, publish_topic=publish_topic,
+                                  measured=measured)
 
-        This method tries to create a TCP connection to the MQTT broker using the `socket` module.
-        If the connection is successful, it returns `True`, indicating that the broker is available.
-        If an `OSError` is raised (typically due to network issues or the broker being down),
-        the method returns `False`. Any other unexpected exception results in logging the error
-        and exiting the script.
-
-        Methods:
-        -------
-        socket.create_connection((host, port), timeout) -> socket:
-            Attempts to create a connection to the broker.
-
-        Logs:
-        -----
-        Logs the following message:
-        - ERROR: Logs any unexpected error during the connection attempt before terminating the script.
+    def publish_nowait(self, message, topic, qos: Optional[int] = None, retain: bool = False) -> bool:
+        """
+        Hands a message to the client without tracking its delivery, e.g. the log messages.
 
-        Returns:
-        -------
-        bool:
-            `True` if the broker is available, `False` otherwise.
+        Parameters
+        ----------
+        message : Union[str, bytes]
+            The payload to be published to the MQTT topic.
+        topic : str
+            The topic string to which the message should be published.
+        qos : int, optional
+            The QoS level, the QoS of the client if not given.
+        retain : bool, optional
+            If True, the broker keeps the message as the last one of the topic.
 
-        Raises:
+        Returns
         -------
-        SystemExit:
-            Exits the script if an unexpected error occurs during the connection attempt.
+        bool
+            True if the client accepted the message.
         """
+        qos = self.qos if qos is None else qos
+        properties = None
+        if self.v5 is not None:
+            topic, message, properties = self.v5.prepare(topic, message, qos)
         try:
-            socket.create_connection((BROKER, PORT), timeout=5)
-            return True
-        except OSError:
-            return False
+            info = self.client.publish(topic, message, qos=qos, retain=retain, properties=properties)
+            return info.rc == 0
         except Exception as e:
-            logging.error(f"Error during creating connection: {e}")
-            exit(1)
+            logging.error(f"Error publishing to {topic}: {e}")
+            return False
 
-    def publish(self, message, topic) -> None:
+    def on_publish_result(self, handle: PublishHandle) -> None:
+        """
+        Records the delivered messages in `link`, and logs the failed and the timed out ones.
+        """
+        if handle.delivered:
+            if handle.measured:
+                self.link.record(handle.size, handle.latency)
+        else:
+            logging.error(f"Message to {handle.topic} was not delivered ({handle.status}): {handle.error}")
+
+    def publish(self, message, topic, qos: Optional[int] = None) -> Optional[float]:
         """
         Publishes a message to a specified MQTT topic.
 
         This method sends a message to the MQTT broker to be published on a specified topic.
-        It uses the MQTT client to publish the message with QoS = 2.
-        The method waits for the message (max 5 seconds) to be published and handles any errors that might occur during
-        the publishing process.
+        It uses the MQTT client to publish the message with the given QoS, QoS = 2 by default.
+        The method waits for the message (max `PUBLISH_TIMEOUT` seconds) to be published. The errors are
+        reported by `on_publish_result`. Use `publish_async` to have several messages in flight.
 
         Parameters:
         ----------
@@ -232,31 +321,128 @@ class MQTT:
         topic : str
             The topic string to which the message should be published.
 
+        qos : int, optional
+            The QoS level, the QoS of the client if not given.
+
         Methods:
         -------
-        client.publish(topic, message, qos) -> MQTTMessageInfo:
+        publish_async(message, topic) -> PublishHandle:
             Sends a message to the broker on the specified topic.
 
-        msg_info.wait_for_publish(timeout) -> None:
-            Blocks until the message publishing is acknowledged or the 5 second time limit is met.
+        handle.wait() -> bool:
+            Blocks until the message publishing is acknowledged or the time limit is met.
 
-        Raises:
+        Returns:
         -------
-        SystemExit:
-            Exits the script if an error occurs during the publishing process.
+        Optional[float]:
+            The seconds it took to publish the message, which is also recorded in `link`,
+            or None if the broker did not acknowledge the message, or the publishing failed.
         """
-        try:
-            msg_info = self.client.publish(topic, message, qos=self.qos)
-            msg_info.wait_for_publish(timeout=5)
-        except Exception:
-            exit(1)
+        handle = self.publish_async(message, topic, qos=qos)
+        return handle.latency if handle.wait() else None
+
+    def publish_chunked(self, message, topic, chunk_size,
+                        publish: Optional[Callable[[bytes], PublishHandle]] = None) -> bool:
+        """
+        Publishes a message to a specified MQTT topic, split into fixed-size chunks.
+
+        Every chunk carries a sequence number and a checksum (see `ChunkedMessage`). If the link stalls
+        or drops in the middle of the transfer, the client reconnects, and only the chunks which were
+        not acknowledged by the broker are sent again. The receiver reassembles the message
+        with `ChunkAssembler`. Every chunk goes through the `window` (and the `Publisher`, if given),
+        the transfer as a whole is recorded in `link`.
+
+        Parameters:
+        ----------
+        message : Union[str, bytes]
+            The payload to be published to the MQTT topic.
+
+        topic : str
+            The topic string to which the chunks should be published.
+
+        chunk_size : int
+            The maximum size of the payload of one chunk in bytes.
+
+        publish : Callable[[bytes], PublishHandle], optional
+            Publishes one chunk, `publish_async` to `topic` if not given.
+
+        Returns:
+        -------
+        bool:
+            `True` if every chunk was acknowledged, `False` if the transfer is not complete
+            after `CHUNK_MAX_ROUNDS` rounds, or the broker is not reachable.
+        """
+        if publish is None:
+            publish = functools.partial(self.publish_async, topic=topic, measured=False)
+        transfer = ChunkedTransfer(message, chunk_size)
+        start_time = time.monotonic()
+        for round_number in range(1, CHUNK_MAX_ROUNDS + 1):
+            # A round which ended with pending chunks means a dropped or stalled link
+            if round_number > 1 or not self.wait_for_connection():
+                logging.warning(f"Reconnecting to resend {len(transfer.pending())} chunks")
+                try:
+                    self.reconnect()
+                except ConnectionError:
+                    return False
+
+            try:
+                transfer.send(publish, CHUNK_ACK_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Error while sending chunks: {e}")
+
+            if transfer.complete:
+                self.link.record(transfer.size, time.monotonic() - start_time)
+                logging.info(f"Chunked transfer of {len(transfer.chunks)} chunks took {round_number} round(s)")
+                return True
+
+            logging.warning(f"{len(transfer.pending())}/{len(transfer.chunks)} chunks were not acknowledged")
+
+        logging.error(f"Chunked transfer failed after {CHUNK_MAX_ROUNDS} rounds")
+        return False
+
+    def reconnect(self, timeout: float = CONNECT_TIMEOUT) -> None:
+        """
+        Drop the current connection, e.g. a stalled one, and wait until the `reconnector` connects again.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the broker to accept the new connection.
+
+        Raises
+        ------
+        ConnectionError
+            If the broker did not accept the connection in time.
+        """
+        if self.is_connected():
+            self.client.disconnect()
+        self.reconnector.start()
+        if not self.reconnector.wait(timeout):
+            raise ConnectionError(f"Broker {self.broker}:{self.port} is not connected after {timeout} seconds")
+
+    def wait_for_connection(self, timeout: float = CONNECT_TIMEOUT) -> bool:
+        """
+        Wait until the broker accepts the connection, the client connects in the background.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum number of seconds to wait.
+
+        Returns
+        -------
+        bool
+            True if the client is connected.
+        """
+        return self.is_connected() or self.reconnector.wait(timeout)
 
     def disconnect(self):
         """
         Disconnect the MQTT client from the broker.
 
-        This method stops the network loop and disconnects the client from the MQTT broker.
+        This method stops the `reconnector` and the network loop, and disconnects the client from the MQTT broker.
         """
+        self.reconnector.stop()
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
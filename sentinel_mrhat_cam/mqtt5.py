@@ -0,0 +1,143 @@
+import json
+import threading
+from typing import Any, Dict, Optional, Sequence, Set, Tuple, Union
+from .static_config import IMAGETOPIC, LOGGING_TOPIC, IMAGE_EXPIRY, SESSION_EXPIRY
+from .message import BinaryMessage
+try:
+    from paho.mqtt.packettypes import PacketTypes
+    from paho.mqtt.properties import Properties
+except ImportError:
+    PacketTypes = Properties = None
+
+
+class V5Transport:
+    """
+    The MQTT v5 features of the `MQTT` client, used if `MQTT_V5` is enabled.
+
+    - Topic aliases: the broker tells the number of aliases it accepts in the CONNACK, no alias is used before it.
+      The first QoS 0 message of an aliased topic on a connection carries the topic and its alias, the later ones
+      only the alias. The QoS 1 and 2 messages always carry their topic, because the client resends them
+      as they are after reconnecting, and the broker forgets the aliases with the connection.
+    - User properties: the metadata of a `BinaryMessage` is sent as user properties (every value as JSON),
+      and the payload is the raw image. `unpack` restores the metadata on the receiving side.
+    - Message expiry: the messages of the `expiry` topics are dropped by the broker when they get stale.
+    - Persistent session: the client connects with ``clean_start=False`` and a session expiry, so the broker keeps
+      its subscriptions and queues the messages of its QoS 1 and 2 subscriptions while it is shut down.
+
+    Parameters
+    ----------
+    alias_topics : Sequence[str], optional
+        The topics to use aliases for, in the order of priority if the broker accepts fewer aliases.
+    expiry : Dict[str, int], optional
+        The seconds after which the messages of a topic expire, by topic.
+    session_expiry : int, optional
+        The seconds the broker keeps the session after the client disconnected.
+
+    Attributes
+    ----------
+    aliases : Dict[str, int]
+        The alias of the topics, for the current connection.
+    established : Set[int]
+        The aliases the broker already knows on the current connection.
+    session_present : bool
+        True if the broker resumed the previous session on the last connection.
+    """
+
+    # The content type of the messages which carry their metadata in the user properties
+    CONTENT_TYPE = "application/x-smci"
+
+    def __init__(self, alias_topics: Sequence[str] = (IMAGETOPIC, LOGGING_TOPIC),
+                 expiry: Optional[Dict[str, int]] = None, session_expiry: int = SESSION_EXPIRY) -> None:
+        self.alias_topics = tuple(alias_topics)
+        self.expiry = expiry if expiry is not None else {IMAGETOPIC: IMAGE_EXPIRY}
+        self.session_expiry = session_expiry
+        self.aliases: Dict[str, int] = {}
+        self.established: Set[int] = set()
+        self.session_present = False
+        self.lock = threading.Lock()
+
+    def connect_properties(self) -> "Properties":
+        """
+        The properties of the CONNECT packet, with the session expiry.
+        """
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = self.session_expiry
+        return properties
+
+    def on_connect(self, flags, properties) -> None:
+        """
+        Set up the aliases for a new connection, called from the ``on_connect`` callback of the client.
+        """
+        maximum = getattr(properties, "TopicAliasMaximum", 0) if properties is not None else 0
+        with self.lock:
+            self.aliases = {topic: alias for alias, topic in enumerate(self.alias_topics[:maximum], start=1)}
+            self.established = set()
+        self.session_present = bool(getattr(flags, "session_present", False))
+
+    def on_disconnect(self) -> None:
+        """
+        Forget the aliases of the lost connection, until the next one tells the number of aliases.
+        """
+        with self.lock:
+            self.aliases = {}
+            self.established = set()
+
+    def prepare(self, topic: str, message: Union[str, bytes], qos: int) -> Tuple[str, Union[str, bytes], "Properties"]:
+        """
+        Convert a message to be published with the v5 features.
+
+        Parameters
+        ----------
+        topic : str
+            The topic of the message.
+        message : Union[str, bytes]
+            The message, a `BinaryMessage` is split into its metadata and image.
+        qos : int
+            The QoS level of the message, only QoS 0 messages are sent with an alias.
+
+        Returns
+        -------
+        Tuple[str, Union[str, bytes], Properties]
+            The topic of the PUBLISH packet (empty if the alias is known), the payload and the properties.
+        """
+        properties = Properties(PacketTypes.PUBLISH)
+        if isinstance(message, (bytes, bytearray)) and BinaryMessage.is_binary(message):
+            metadata, message = BinaryMessage.unpack(message)
+            properties.ContentType = self.CONTENT_TYPE
+            properties.UserProperty = [(key, json.dumps(value)) for key, value in metadata.items()]
+        if topic in self.expiry:
+            properties.MessageExpiryInterval = self.expiry[topic]
+
+        if qos > 0:
+            return topic, message, properties
+        with self.lock:
+            alias = self.aliases.get(topic)
+            if alias is not None:
+                properties.TopicAlias = alias
+                if alias in self.established:
+                    topic = ""
+                else:
+                    self.established.add(alias)
+        return topic, message, properties
+
+    @staticmethod
+    def unpack(payload: bytes, properties: Optional["Properties"]) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """
+        Restore the metadata of a message sent by `prepare`.
+
+        Parameters
+        ----------
+        payload : bytes
+            The payload of the received message.
+        properties : Optional[Properties]
+            The properties of the received message.
+
+        Returns
+        -------
+        Optional[Tuple[Dict[str, Any], bytes]]
+            The metadata and the image, or None if the message was not split by `prepare`.
+        """
+        if getattr(properties, "ContentType", None) != V5Transport.CONTENT_TYPE:
+            return None
+        metadata = {key: json.loads(value) for key, value in getattr(properties, "UserProperty", [])}
+        return metadata, payload
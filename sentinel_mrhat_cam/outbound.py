@@ -0,0 +1,202 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Sequence
+from .static_config import OUTBOUND_QOS, OUTBOUND_CLASSES, OUTBOUND_DEFAULT_CLASS, OUTBOUND_YIELDING
+from .static_config import OUTBOUND_RATE, OUTBOUND_BURST, OUTBOUND_YIELD_TIMEOUT
+
+
+@dataclass
+class ClassStats:
+    """
+    The messages of a message class which went through the `OutboundScheduler`, the times are in seconds.
+    """
+    messages: int = 0
+    bytes: int = 0
+    wait: float = 0.0
+    max_wait: float = 0.0
+    yields: int = 0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.wait / self.messages if self.messages else 0.0
+
+
+class OutboundScheduler:
+    """
+    Orders the messages of the shared connection by their class, before they are handed to the client.
+
+    Every topic belongs to a message class (`OUTBOUND_CLASSES`), and every class has its QoS level
+    (`OUTBOUND_QOS`, in the order of priority). A message takes a slot of its class with `acquire`
+    before it is published, and gives it back with `release` once it is delivered, or handed to the client
+    if its delivery is not tracked. A message waits while:
+
+    - a message of a higher class is waiting,
+    - it is of a yielding class (`OUTBOUND_YIELDING`, e.g. the logs), and a message of a higher class is in flight,
+      at most `yield_timeout` seconds,
+    - the token bucket is short of the message. The bucket fills with `rate` bytes per second, up to `burst` bytes,
+      and every message takes its size from it. A message larger than the bucket waits until it is full,
+      and leaves it in debt.
+
+    The time every message waited is counted by class, see `report`.
+
+    Parameters
+    ----------
+    qos : Dict[str, int], optional
+        The QoS level of the classes, the order of the keys is the priority.
+    classes : Dict[str, str], optional
+        The class of the topics, the topics not listed are of the `default` class.
+    default : str, optional
+        The class of the topics not in `classes`.
+    yielding : Sequence[str], optional
+        The classes which wait while a message of a higher class is in flight.
+    rate : float, optional
+        The bytes per second the messages are shaped to, 0 for no limit.
+    burst : int, optional
+        The size of the token bucket in bytes.
+    yield_timeout : float, optional
+        The maximum seconds a message of a yielding class waits for the higher classes in flight.
+
+    Attributes
+    ----------
+    stats : Dict[str, ClassStats]
+        The statistics of the classes.
+    waiting : Dict[str, int]
+        The number of messages waiting for a slot, by class.
+    in_flight : Dict[str, int]
+        The number of messages holding a slot, by class.
+    """
+
+    def __init__(self, qos: Optional[Dict[str, int]] = None, classes: Optional[Dict[str, str]] = None,
+                 default: str = OUTBOUND_DEFAULT_CLASS, yielding: Sequence[str] = OUTBOUND_YIELDING,
+                 rate: float = OUTBOUND_RATE, burst: int = OUTBOUND_BURST,
+                 yield_timeout: float = OUTBOUND_YIELD_TIMEOUT) -> None:
+        self.qos_levels = dict(qos if qos is not None else OUTBOUND_QOS)
+        self.classes = dict(classes if classes is not None else OUTBOUND_CLASSES)
+        self.default = default
+        self.yielding = set(yielding)
+        self.rate = rate
+        self.burst = burst
+        self.yield_timeout = yield_timeout
+        self.priority = {name: rank for rank, name in enumerate(self.qos_levels)}
+        self.stats = {name: ClassStats() for name in self.qos_levels}
+        self.waiting = {name: 0 for name in self.qos_levels}
+        self.in_flight = {name: 0 for name in self.qos_levels}
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.condition = threading.Condition()
+
+    def classify(self, topic: str) -> str:
+        """
+        The message class of a topic.
+        """
+        return self.classes.get(topic, self.default)
+
+    def qos(self, message_class: str) -> int:
+        """
+        The QoS level of a message class.
+        """
+        return self.qos_levels[message_class]
+
+    def higher(self, message_class: str) -> Sequence[str]:
+        return [name for name, rank in self.priority.items() if rank < self.priority[message_class]]
+
+    def refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def yields(self, message_class: str) -> bool:
+        """
+        True if a message of `message_class` has to give way to a higher class in flight.
+        """
+        return message_class in self.yielding and any(self.in_flight[name] for name in self.higher(message_class))
+
+    def blocked(self, message_class: str, size: int, now: float, yield_until: float) -> Optional[float]:
+        """
+        Why a message has to wait, called with the `condition` held.
+
+        Returns
+        -------
+        Optional[float]
+            None if the message can go, else the longest time to wait before checking again
+            (the changes of the other classes notify the condition).
+        """
+        if any(self.waiting[name] for name in self.higher(message_class)):
+            return float("inf")
+        if now < yield_until and self.yields(message_class):
+            return yield_until - now
+        self.refill(now)
+        needed = min(size, self.burst)
+        if self.rate and self.tokens < needed:
+            return (needed - self.tokens) / self.rate
+        return None
+
+    def acquire(self, message_class: str, size: int) -> float:
+        """
+        Wait for a slot of `message_class` for a message of `size` bytes, see the class description.
+
+        Returns
+        -------
+        float
+            The seconds the message waited.
+        """
+        start = time.monotonic()
+        yield_until = start + self.yield_timeout
+        yielded = False
+        with self.condition:
+            self.waiting[message_class] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self.blocked(message_class, size, now, yield_until)
+                    if delay is None:
+                        break
+                    yielded = yielded or self.yields(message_class)
+                    self.condition.wait(None if delay == float("inf") else delay)
+            finally:
+                self.waiting[message_class] -= 1
+            if self.rate:
+                self.tokens -= size
+            self.in_flight[message_class] += 1
+
+            waited = time.monotonic() - start
+            stats = self.stats[message_class]
+            stats.messages += 1
+            stats.bytes += size
+            stats.wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            stats.yields += yielded
+            # The lower classes may go, if this message was holding them up
+            self.condition.notify_all()
+        return waited
+
+    def release(self, message_class: str) -> None:
+        """
+        Give back the slot taken by `acquire`.
+        """
+        with self.condition:
+            self.in_flight[message_class] -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, message_class: str, size: int) -> Iterator[float]:
+        """
+        Hold a slot of `message_class` while the block runs, e.g. while a message is published and acknowledged.
+        """
+        waited = self.acquire(message_class, size)
+        try:
+            yield waited
+        finally:
+            self.release(message_class)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        The ``messages``, ``bytes``, the ``meanWait`` and ``maxWait`` seconds, and the number of ``yields``
+        to the higher classes in flight, of the classes which had messages.
+        """
+        with self.condition:
+            return {name: {"messages": stats.messages, "bytes": stats.bytes, "meanWait": round(stats.mean_wait, 3),
+                           "maxWait": round(stats.max_wait, 3), "yields": stats.yields}
+                    for name, stats in self.stats.items() if stats.messages}
@@ -0,0 +1,254 @@
+import logging
+import os
+import struct
+import zlib
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+from .static_config import OUTBOX_PATH, OUTBOX_MAX_BYTES, OUTBOX_SEGMENT_BYTES
+
+
+class OutboxMessage(NamedTuple):
+    """
+    A message read from the `Outbox`.
+    """
+    topic: str
+    message: Union[str, bytes]
+    segment: int
+    end: int
+    size: int
+
+
+class Outbox:
+    """
+    A persistent, disk-backed queue of the messages which could not be published.
+
+    The messages are appended to segment files on the SD card, and read back oldest first
+    once the broker is reachable again. When the segments grow above `max_bytes`, the oldest
+    segment is deleted, so the newest messages are kept.
+
+    Layout of a record (all integers are big-endian):
+
+    ========  ======  =====================================================
+    Offset    Size    Field
+    ========  ======  =====================================================
+    0         4       Length of the message in bytes (``N``)
+    4         4       CRC-32 of the topic and the message
+    8         2       Length of the topic in bytes (``T``)
+    10        1       1 if the message is text, 0 if it is binary
+    11        T       The topic, UTF-8
+    11 + T    N       The message
+    ========  ======  =====================================================
+
+    A record which was not written completely (e.g. the power was lost) is cut off
+    when the outbox is opened. The read position is kept in a cursor file, so a message
+    is only sent twice if the power is lost between publishing it and saving the cursor.
+
+    Parameters
+    ----------
+    path : str, optional
+        The directory of the segment files, created when the first message is added.
+    max_bytes : int, optional
+        The maximum total size of the segment files.
+    segment_bytes : int, optional
+        A new segment file is started when the current one grows above this size.
+
+    Attributes
+    ----------
+    segments : Dict[int, List[int]]
+        The number of unread records and their size in bytes, for every segment file.
+    cursor : Tuple[int, int]
+        The segment and the offset of the next unread record.
+    dropped : int
+        The number of messages evicted since the outbox was opened.
+    """
+
+    RECORD = struct.Struct(">IIHB")
+
+    def __init__(self, path: str = OUTBOX_PATH, max_bytes: int = OUTBOX_MAX_BYTES,
+                 segment_bytes: int = OUTBOX_SEGMENT_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.cursor_path = os.path.join(path, "cursor")
+        self.dropped = 0
+        self.cursor = self.load_cursor()
+        self.segments: Dict[int, List[int]] = {}
+        names = os.listdir(path) if os.path.isdir(path) else []
+        for number in sorted(int(name[:-4]) for name in names if name.endswith(".seg")):
+            self.segments[number] = self.scan(number)
+        self.drop_consumed()
+        if self.depth:
+            logging.info(f"Outbox has {self.depth} messages ({self.size} bytes) waiting")
+
+    @property
+    def depth(self) -> int:
+        """
+        The number of messages waiting in the outbox.
+        """
+        return sum(records for records, _ in self.segments.values())
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the waiting records in bytes.
+        """
+        return sum(size for _, size in self.segments.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        The outbox metrics which are sent along with the telemetry.
+        """
+        return {"outboxDepth": self.depth, "outboxBytes": self.size}
+
+    def segment_path(self, number: int) -> str:
+        return os.path.join(self.path, f"{number:08d}.seg")
+
+    def load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(self.cursor_path) as f:
+                number, offset = f.read().split()
+                return int(number), int(offset)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def save_cursor(self) -> None:
+        # Written to a temporary file first, so a power loss never leaves a half-written cursor
+        temp_path = f"{self.cursor_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(f"{self.cursor[0]} {self.cursor[1]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.cursor_path)
+
+    def scan(self, number: int) -> List[int]:
+        """
+        Count the unread records of a segment, and cut off the incomplete record at its end.
+        """
+        path = self.segment_path(number)
+        records, size = 0, 0
+        with open(path, "r+b") as f:
+            f.seek(self.cursor[1] if number == self.cursor[0] else 0)
+            while True:
+                start = f.tell()
+                record = self.read_record(f)
+                if record is None:
+                    break
+                records += 1
+                size += record[2]
+            if start < os.path.getsize(path):
+                logging.warning(f"Cutting off an incomplete record at the end of {path}")
+                f.truncate(start)
+        return [records, size]
+
+    def read_record(self, f: BinaryIO) -> Optional[Tuple[str, Union[str, bytes], int]]:
+        """
+        Read the next record of an open segment file.
+
+        Returns
+        -------
+        Optional[Tuple[str, Union[str, bytes], int]]
+            The topic, the message and the size of the record,
+            or None at the end of the file, or at an incomplete or corrupted record.
+        """
+        header = f.read(self.RECORD.size)
+        if len(header) < self.RECORD.size:
+            return None
+        length, crc, topic_length, text = self.RECORD.unpack(header)
+        body = f.read(topic_length + length)
+        if len(body) < topic_length + length or zlib.crc32(body) != crc:
+            return None
+        topic, message = body[:topic_length].decode("utf-8"), body[topic_length:]
+        return topic, message.decode("utf-8") if text else message, self.RECORD.size + len(body)
+
+    def append(self, topic: str, message: Union[str, bytes]) -> None:
+        """
+        Add a message to the end of the outbox, evicting the oldest messages if it is full.
+
+        Parameters
+        ----------
+        topic : str
+            The topic the message is published to.
+        message : Union[str, bytes]
+            The message.
+        """
+        text = isinstance(message, str)
+        topic_bytes = topic.encode("utf-8")
+        message_bytes = message.encode("utf-8") if text else message
+        body = topic_bytes + message_bytes
+        record = self.RECORD.pack(len(message_bytes), zlib.crc32(body), len(topic_bytes), text) + body
+
+        os.makedirs(self.path, exist_ok=True)
+        number = max(self.segments, default=self.cursor[0])
+        if number in self.segments and os.path.getsize(self.segment_path(number)) >= self.segment_bytes:
+            number += 1
+        with open(self.segment_path(number), "ab") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+        counters = self.segments.setdefault(number, [0, 0])
+        counters[0] += 1
+        counters[1] += len(record)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the oldest segments until the outbox fits into `max_bytes`. The newest segment is always kept.
+        """
+        while len(self.segments) > 1 and self.size > self.max_bytes:
+            oldest = min(self.segments)
+            records, _ = self.segments.pop(oldest)
+            os.remove(self.segment_path(oldest))
+            self.dropped += records
+            logging.warning(f"Outbox is full, dropped the {records} oldest messages")
+            if self.cursor[0] <= oldest:
+                self.cursor = (min(self.segments), 0)
+                self.save_cursor()
+
+    def peek(self, count: int) -> List[OutboxMessage]:
+        """
+        Read the oldest messages, without removing them.
+
+        Parameters
+        ----------
+        count : int
+            The maximum number of messages to read.
+
+        Returns
+        -------
+        List[OutboxMessage]
+            The messages, oldest first. Pass them to `commit` once they are published.
+        """
+        messages: List[OutboxMessage] = []
+        for number in sorted(self.segments):
+            if len(messages) >= count:
+                break
+            with open(self.segment_path(number), "rb") as f:
+                f.seek(self.cursor[1] if number == self.cursor[0] else 0)
+                while len(messages) < count:
+                    record = self.read_record(f)
+                    if record is None:
+                        break
+                    messages.append(OutboxMessage(record[0], record[1], number, f.tell(), record[2]))
+        return messages
+
+    def commit(self, message: OutboxMessage) -> None:
+        """
+        Remove a message returned by `peek` from the outbox, because it was published.
+        The messages must be committed in the order they were returned.
+        """
+        counters = self.segments[message.segment]
+        counters[0] -= 1
+        counters[1] -= message.size
+        self.cursor = (message.segment, message.end)
+        self.save_cursor()
+        self.drop_consumed()
+
+    def drop_consumed(self) -> None:
+        """
+        Delete the segment files which were read to their end. The newest segment is kept, it is still appended to.
+        """
+        newest = max(self.segments, default=None)
+        for number in sorted(self.segments):
+            if number != newest and (number < self.cursor[0] or self.segments[number][0] == 0):
+                del self.segments[number]
+                os.remove(self.segment_path(number))
@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Any, Callable, Dict, List, Optional
+from .static_config import CAPTURE_QUEUE_DEPTH, PUBLISH_QUEUE_DEPTH, PIPELINE_STATS_INTERVAL
+from .system import RTC
+
+
+class StageStats:
+    """
+    Throughput counters of one pipeline stage.
+
+    The lifetime of a stage is split into three buckets: the time spent doing the work (`busy`),
+    the time spent waiting for an input item (`starved`), and the time spent waiting for space in the
+    output queue (`blocked`). The stage with the highest busy ratio is the bottleneck of the pipeline.
+
+    Attributes
+    ----------
+    name : str
+        The name of the stage.
+    items : int
+        The number of items the stage has processed.
+    busy : float
+        Seconds spent processing items.
+    starved : float
+        Seconds spent waiting for the previous stage.
+    blocked : float
+        Seconds spent waiting for the next stage.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.started = time.monotonic()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the counters since the stage has started.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of items, items per second, the busy ratio in percent, and the
+            average processing time of an item in milliseconds.
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "rate": self.items / elapsed,
+            "busy": 100 * self.busy / elapsed,
+            "starved": 100 * self.starved / elapsed,
+            "blocked": 100 * self.blocked / elapsed,
+            "avg_ms": 1000 * self.busy / self.items if self.items else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    Runs the capture, encode and publish steps of the always-on mode concurrently.
+
+    Each stage runs on its own thread and the stages are connected with bounded queues,
+    so frame N+1 is captured and encoded while frame N is being published.
+    The depth of the queues limits how many frames are held in memory at once.
+
+    Parameters
+    ----------
+    transmit : Transmit
+        Provides the camera, the message creation and the publishing.
+    capture_queue_depth : int, optional
+        The number of captured frames that can wait for encoding.
+    publish_queue_depth : int, optional
+        The number of encoded messages that can wait for publishing.
+
+    Attributes
+    ----------
+    stats : List[StageStats]
+        The throughput counters of the capture, encode and publish stages.
+    stop_event : threading.Event
+        Set to stop all the stages.
+    error : BaseException or None
+        The first exception raised by any of the stages.
+
+    Notes
+    -----
+    - If any stage raises an exception (including `SystemExit`), the whole pipeline stops
+    and the exception is re-raised from `run`, so the error handling of the caller is the same
+    as in the sequential loop.
+    """
+
+    def __init__(self, transmit, capture_queue_depth: int = CAPTURE_QUEUE_DEPTH,
+                 publish_queue_depth: int = PUBLISH_QUEUE_DEPTH) -> None:
+        self.transmit = transmit
+        self.capture_queue: Queue = Queue(maxsize=capture_queue_depth)
+        self.publish_queue: Queue = Queue(maxsize=publish_queue_depth)
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.stats: List[StageStats] = [StageStats("capture"), StageStats("encode"), StageStats("publish")]
+
+    def capture(self, _: None) -> tuple:
+        """
+        Capture stage: take a picture and the time it was taken at.
+        """
+        with self.transmit.energy.phase("capture"):
+            image = self.transmit.camera.capture()
+        timestamp: str = RTC.get_time()
+        return image, timestamp
+
+    def encode(self, item: tuple) -> Any:
+        """
+        Encode stage: gather the telemetry and create the message.
+        """
+        image, timestamp = item
+        return self.transmit.build_message(image, timestamp)
+
+    def publish(self, message: Any) -> None:
+        """
+        Publish stage: send the message to the image topic.
+        """
+        self.transmit.publish_message(message)
+
+    def run(self, stats_interval: float = PIPELINE_STATS_INTERVAL) -> None:
+        """
+        Start the stages and block until the pipeline is stopped, logging the stage statistics periodically.
+
+        Parameters
+        ----------
+        stats_interval : float, optional
+            Seconds between two statistics log entries.
+
+        Raises
+        ------
+        BaseException
+            The exception which stopped one of the stages.
+        """
+        stages = [
+            (self.stats[0], self.capture, None, self.capture_queue),
+            (self.stats[1], self.encode, self.capture_queue, self.publish_queue),
+            (self.stats[2], self.publish, self.publish_queue, None),
+        ]
+        threads = [threading.Thread(target=self.run_stage, args=stage, name=f"pipeline-{stage[0].name}", daemon=True)
+                   for stage in stages]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stop_event.wait(stats_interval):
+                self.log_stats()
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            self.log_stats()
+
+        if self.error is not None:
+            raise self.error
+
+    def stop(self) -> None:
+        """
+        Stop all the stages, `run` returns after the stages have finished their current item.
+        """
+        self.stop_event.set()
+
+    def run_stage(self, stats: StageStats, work: Callable[[Any], Any],
+                  inbox: Optional[Queue], outbox: Optional[Queue]) -> None:
+        """
+        The loop of one stage: take an item from the inbox, process it, and put the result into the outbox.
+
+        Parameters
+        ----------
+        stats : StageStats
+            The counters of the stage.
+        work : Callable[[Any], Any]
+            Processes one item. The first stage gets `None` as its input.
+        inbox : Queue or None
+            The queue of the previous stage, None for the first stage.
+        outbox : Queue or None
+            The queue of the next stage, None for the last stage.
+        """
+        try:
+            while not self.stop_event.is_set():
+                item = None
+                if inbox is not None:
+                    start = time.monotonic()
+                    item = self.get(inbox)
+                    stats.starved += time.monotonic() - start
+                    if item is None:
+                        return
+
+                start = time.monotonic()
+                result = work(item)
+                stats.busy += time.monotonic() - start
+                stats.items += 1
+
+                if outbox is not None:
+                    start = time.monotonic()
+                    self.put(outbox, result)
+                    stats.blocked += time.monotonic() - start
+
+        except BaseException as e:
+            logging.error(f"Error in the {stats.name} stage of the pipeline: {e}")
+            if self.error is None:
+                self.error = e
+            self.stop_event.set()
+
+    def get(self, queue: Queue) -> Any:
+        # Poll, so the stop event is noticed even if the previous stage has died
+        while not self.stop_event.is_set():
+            try:
+                return queue.get(timeout=0.5)
+            except Empty:
+                continue
+        return None
+
+    def put(self, queue: Queue, item: Any) -> None:
+        while not self.stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.5)
+                return
+            except Full:
+                continue
+
+    def log_stats(self) -> None:
+        """
+        Log the throughput of every stage, and the stage which is the bottleneck.
+        """
+        summaries = [stats.summary() for stats in self.stats]
+        for summary in summaries:
+            logging.info(
+                f"Pipeline {summary['stage']}: {summary['items']} items, {summary['rate']:.2f} items/s, "
+                f"busy {summary['busy']:.0f}%, starved {summary['starved']:.0f}%, "
+                f"blocked {summary['blocked']:.0f}%, {summary['avg_ms']:.1f} ms/item")
+        bottleneck = max(summaries, key=lambda summary: summary["busy"])
+        logging.info(f"Pipeline bottleneck: {bottleneck['stage']} stage")
@@ -0,0 +1,217 @@
+import io
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from .static_config import BATTERY_UEVENT_PATH, CHARGER_UEVENT_PATH, POWER_SAMPLE_RATE, POWER_BUFFER_SIZE
+from .telemetry import Telemetry
+from .system import clock
+
+
+class PowerSampler:
+    """
+    Samples the battery and the charger in the background, into a fixed-size ring buffer.
+
+    A thread reads the voltage and the current from the uevent files of the bq2562x driver
+    `rate` times per second. The samples are kept in NumPy arrays of `capacity` rows, so the
+    memory use is fixed, and the statistics of a time window are computed without copying
+    Python objects. At 20 Hz, the default buffer holds about 15 minutes.
+
+    The columns are `COLUMNS`, in volts and amperes, a missing source gives NaN values.
+
+    Parameters
+    ----------
+    battery_path : str, optional
+        The uevent file of the battery.
+    charger_path : str, optional
+        The uevent file of the charger.
+    rate : float, optional
+        The number of samples per second.
+    capacity : int, optional
+        The number of samples the ring buffer holds.
+
+    Examples
+    --------
+    >>> sampler = PowerSampler()
+    >>> sampler.start()
+    >>> start = time.monotonic()
+    >>> ...
+    >>> print(sampler.stats(start)["batteryPower"]["integral"], "J")
+    """
+
+    COLUMNS = ("batteryVoltage", "batteryCurrent", "chargerVoltage", "chargerCurrent")
+
+    def __init__(self, battery_path: str = BATTERY_UEVENT_PATH, charger_path: str = CHARGER_UEVENT_PATH,
+                 rate: float = POWER_SAMPLE_RATE, capacity: int = POWER_BUFFER_SIZE) -> None:
+        self.battery_fd = Telemetry.open(battery_path)
+        self.charger_fd = Telemetry.open(charger_path)
+        self.rate = rate
+        self.times = np.zeros(capacity)
+        self.values = np.full((capacity, len(self.COLUMNS)), np.nan, dtype=np.float32)
+        self.count = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def read(fd: Optional[int]) -> Tuple[float, float]:
+        """
+        Read the voltage and the current of a power supply, NaN if it is not available.
+        """
+        if fd is None:
+            return np.nan, np.nan
+        try:
+            values = Telemetry.parse_uevent(os.pread(fd, 4096, 0).decode("utf-8"))
+        except OSError:
+            return np.nan, np.nan
+        return (values.get("POWER_SUPPLY_VOLTAGE_NOW", np.nan) / 1000000,
+                values.get("POWER_SUPPLY_CURRENT_NOW", np.nan) / 1000000)
+
+    def sample(self) -> None:
+        """
+        Take one sample, overwriting the oldest one if the buffer is full.
+        """
+        row = self.read(self.battery_fd) + self.read(self.charger_fd)
+        now = time.monotonic()
+        with self.lock:
+            index = self.count % len(self.times)
+            self.times[index] = now
+            self.values[index] = row
+            self.count += 1
+
+    def start(self) -> None:
+        """
+        Start the sampling thread, if it is not running yet.
+        """
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="power-sampler", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        # Scheduled on absolute deadlines, so the time of reading does not add up to a drift
+        interval = 1 / self.rate
+        deadline = time.monotonic()
+        while not self.stop_event.wait(max(deadline - time.monotonic(), 0)):
+            self.sample()
+            deadline = max(deadline + interval, time.monotonic() - interval)
+
+    def stop(self) -> None:
+        """
+        Stop the sampling thread.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns a copy of the samples taken in a time window, oldest first.
+
+        Parameters
+        ----------
+        start, end : float, optional
+            The bounds of the window on the `time.monotonic()` clock, the whole buffer if not given.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The times of the samples, and a row of `COLUMNS` values for every sample.
+        """
+        with self.lock:
+            capacity = len(self.times)
+            head = self.count % capacity
+            if self.count <= capacity:
+                times, values = self.times[:self.count].copy(), self.values[:self.count].copy()
+            else:
+                times = np.concatenate((self.times[head:], self.times[:head]))
+                values = np.concatenate((self.values[head:], self.values[:head]))
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        return times[mask], values[mask]
+
+    def stats(self, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        The minimum, maximum, mean and time integral of every column in a time window.
+
+        The battery power (voltage times current) is also included as ``batteryPower``,
+        its integral is the energy in joules. The integral of a current is the charge in coulombs.
+        Columns without any valid sample in the window are left out.
+
+        Parameters
+        ----------
+        start, end : float, optional
+            The bounds of the window on the `time.monotonic()` clock, the whole buffer if not given.
+        """
+        times, values = self.window(start, end)
+        columns = dict(zip(self.COLUMNS, values.T.astype(np.float64)))
+        columns["batteryPower"] = columns["batteryVoltage"] * columns["batteryCurrent"]
+
+        stats = {}
+        for name, column in columns.items():
+            valid = np.isfinite(column)
+            if not valid.any():
+                continue
+            t, v = times[valid], column[valid]
+            stats[name] = {
+                "min": float(v.min()),
+                "max": float(v.max()),
+                "mean": float(v.mean()),
+                # Trapezoidal rule
+                "integral": float(np.sum((v[1:] + v[:-1]) / 2 * np.diff(t))),
+            }
+        return stats
+
+    def summary(self, start: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        The compact summary of a time window, which is sent along with the telemetry.
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            The number of samples, the ``[min, mean, max]`` of every column and the battery
+            energy in joules, or None if there are no samples.
+        """
+        times, _ = self.window(start)
+        if len(times) == 0:
+            return None
+        summary: Dict[str, Any] = {"samples": len(times), "duration": round(float(times[-1] - times[0]), 3)}
+        stats = self.stats(start)
+        for name, column in stats.items():
+            summary[name] = [round(column["min"], 3), round(column["mean"], 3), round(column["max"], 3)]
+        if "batteryPower" in stats:
+            summary["batteryEnergy"] = round(stats["batteryPower"]["integral"], 3)
+        return summary
+
+    def dump(self, start: Optional[float] = None) -> bytes:
+        """
+        The raw samples of a time window, for offline analysis.
+
+        Returns
+        -------
+        bytes
+            A NumPy ``.npz`` archive, with the UNIX timestamps of the samples in ``time``,
+            and an array for every column.
+        """
+        times, values = self.window(start)
+        # Convert the monotonic times to wall clock time
+        offset = clock.now().timestamp() - time.monotonic()
+        buffer = io.BytesIO()
+        np.savez(buffer, time=times + offset, **dict(zip(self.COLUMNS, values.T)))
+        return buffer.getvalue()
+
+    def close(self) -> None:
+        """
+        Stop sampling, and close the uevent files.
+        """
+        self.stop()
+        for fd in (self.battery_fd, self.charger_fd):
+            if fd is not None:
+                os.close(fd)
+        self.battery_fd = self.charger_fd = None
@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+from .static_config import QOS, PUBLISH_WINDOW, PUBLISH_TIMEOUT
+
+
+class PublishHandle:
+    """
+    The delivery of a message published through a `PublishWindow`.
+
+    The handle is returned right after the message is handed to the client. Its `status` changes once,
+    when the broker acknowledges the message, when the publishing fails, or when the timeout passes.
+
+    Attributes
+    ----------
+    topic : str
+        The topic of the message.
+    size : int
+        The size of the message in bytes.
+    mid : Optional[int]
+        The message ID given by the client.
+    submitted : float
+        The `time.monotonic()` time the message was published at.
+    deadline : float
+        The `time.monotonic()` time the message times out at.
+    status : str
+        One of `PENDING`, `DELIVERED`, `FAILED` and `TIMEOUT`.
+    latency : Optional[float]
+        The seconds from publishing to the result.
+    error : Optional[str]
+        The reason of a failure.
+    measured : bool
+        False if the delivery is not a sample of the link, e.g. a chunk of a larger message.
+    """
+
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+
+    def __init__(self, window: "PublishWindow", topic: str, size: int, timeout: float,
+                 measured: bool = True) -> None:
+        self.window = window
+        self.topic = topic
+        self.size = size
+        self.mid: Optional[int] = None
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + timeout
+        self.status = self.PENDING
+        self.latency: Optional[float] = None
+        self.error: Optional[str] = None
+        self.measured = measured
+        self.event = threading.Event()
+        self.callbacks: List[Callable[["PublishHandle"], None]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status != self.PENDING
+
+    @property
+    def delivered(self) -> bool:
+        return self.status == self.DELIVERED
+
+    def finish(self, status: str, error: Optional[str] = None) -> bool:
+        """
+        Set the result, if it is not set yet.
+
+        Returns
+        -------
+        bool
+            True if this call set the result.
+        """
+        with self.window.lock:
+            if self.done:
+                return False
+            self.status = status
+            self.error = error
+            self.latency = time.monotonic() - self.submitted
+            callbacks, self.callbacks = self.callbacks, []
+        self.event.set()
+        for callback in callbacks:
+            callback(self)
+        return True
+
+    def add_done_callback(self, callback: Callable[["PublishHandle"], None]) -> None:
+        """
+        Call `callback` with the handle once its result is set, right away if it is set already.
+        """
+        with self.window.lock:
+            if not self.done:
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the result, at most until the deadline of the message.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait, the message keeps its own deadline.
+
+        Returns
+        -------
+        bool
+            True if the message was delivered.
+        """
+        remaining = self.deadline - time.monotonic()
+        self.event.wait(max(0.0, remaining if timeout is None else min(timeout, remaining)))
+        if not self.done and time.monotonic() >= self.deadline:
+            self.window.expire()
+        return self.delivered
+
+
+class PublishWindow:
+    """
+    Publishes messages without waiting for each acknowledgement, with a limited number of messages in flight.
+
+    `submit` hands the message to the paho client, and returns a `PublishHandle` right away. The
+    acknowledgements are collected by the ``on_publish`` callback of the client, in its network thread.
+    With QoS 2, a message takes a four-way handshake, so waiting for every message on its own would
+    limit the throughput to one round trip per message. When `max_inflight` messages are in flight,
+    `submit` waits until the oldest one is acknowledged or times out.
+
+    Every result (delivered, failed, timed out) is passed to the `on_result` callback, and counted in `stats`.
+
+    Parameters
+    ----------
+    client : mqtt_client.Client
+        The paho client, its ``on_publish`` callback is set by the window.
+    qos : int, optional
+        The default QoS level of the messages.
+    max_inflight : int, optional
+        The maximum number of messages waiting for their acknowledgement.
+    timeout : float, optional
+        The seconds after which an unacknowledged message is reported as timed out.
+    on_result : Callable[[PublishHandle], None], optional
+        Called with every handle once its result is known. It is called from the network thread
+        of the client, or from the thread which noticed the timeout, so it should return quickly.
+
+    Examples
+    --------
+    >>> window = PublishWindow(client)
+    >>> handles = [window.submit(message, topic) for message in messages]
+    >>> delivered = [handle.wait() for handle in handles]
+    """
+
+    # MQTT_ERR_SUCCESS, and MQTT_ERR_NO_CONN: the client keeps the message and sends it after reconnecting
+    ACCEPTED_RC = (0, 4)
+    # Acknowledgements which arrived before their message was registered are kept this long
+    EARLY_ACK_TTL = 60
+
+    def __init__(self, client, qos: int = QOS, max_inflight: int = PUBLISH_WINDOW, timeout: float = PUBLISH_TIMEOUT,
+                 on_result: Optional[Callable[[PublishHandle], None]] = None) -> None:
+        self.client = client
+        self.qos = qos
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.on_result = on_result
+        self.lock = threading.RLock()
+        self.pending: Dict[int, PublishHandle] = {}
+        self.early_acks: Dict[int, float] = {}
+        self.stats = {PublishHandle.DELIVERED: 0, PublishHandle.FAILED: 0, PublishHandle.TIMEOUT: 0}
+        client.on_publish = self.on_publish
+        client.max_inflight_messages_set(max_inflight)
+
+    @property
+    def in_flight(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def submit(self, message: Union[str, bytes], topic: str, qos: Optional[int] = None, retain: bool = False,
+               properties: Any = None, publish_topic: Optional[str] = None, measured: bool = True) -> PublishHandle:
+        """
+        Publish a message, without waiting for its acknowledgement.
+
+        Parameters
+        ----------
+        message : Union[str, bytes]
+            The payload.
+        topic : str
+            The topic to publish to.
+        qos : int, optional
+            The QoS level, the default of the window if not given.
+        retain : bool, optional
+            If True, the broker keeps the message as the last one of the topic.
+        properties : paho.mqtt.properties.Properties, optional
+            The MQTT v5 properties of the message.
+        publish_topic : str, optional
+            The topic put into the packet if it differs from `topic`, e.g. empty with a topic alias.
+        measured : bool, optional
+            Set on the handle, see `PublishHandle.measured`.
+
+        Returns
+        -------
+        PublishHandle
+            The handle of the delivery, it may already be failed.
+        """
+        self.acquire()
+        handle = PublishHandle(self, topic, len(message), self.timeout, measured)
+        try:
+            info = self.client.publish(topic if publish_topic is None else publish_topic, message,
+                                       qos=self.qos if qos is None else qos, retain=retain, properties=properties)
+        except Exception as e:
+            self.complete(handle, PublishHandle.FAILED, str(e))
+            return handle
+        if info.rc not in self.ACCEPTED_RC:
+            self.complete(handle, PublishHandle.FAILED, f"publish returned {info.rc}")
+            return handle
+
+        handle.mid = info.mid
+        with self.lock:
+            acknowledged = self.early_acks.pop(info.mid, None) is not None
+            if not acknowledged:
+                self.pending[info.mid] = handle
+        if acknowledged:
+            self.complete(handle, PublishHandle.DELIVERED)
+        return handle
+
+    def acquire(self) -> None:
+        """
+        Wait until there is room for one more message in flight.
+        """
+        self.expire()
+        while True:
+            with self.lock:
+                if len(self.pending) < self.max_inflight:
+                    return
+                oldest = min(self.pending.values(), key=lambda handle: handle.submitted)
+            oldest.wait()
+
+    def on_publish(self, client, userdata, mid, reason_code=None, properties=None) -> None:
+        """
+        The ``on_publish`` callback of the paho client, called when the broker acknowledged a message.
+        """
+        now = time.monotonic()
+        with self.lock:
+            handle = self.pending.pop(mid, None)
+            if handle is None:
+                # The acknowledgement of a message which is being registered by `submit`, or which is not ours
+                self.early_acks = {early: at for early, at in self.early_acks.items()
+                                   if now - at < self.EARLY_ACK_TTL}
+                self.early_acks[mid] = now
+                return
+        if getattr(reason_code, "is_failure", False):
+            self.complete(handle, PublishHandle.FAILED, str(reason_code))
+        else:
+            self.complete(handle, PublishHandle.DELIVERED)
+
+    def expire(self) -> None:
+        """
+        Report the messages past their deadline as timed out.
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [mid for mid, handle in self.pending.items() if now >= handle.deadline]
+            handles = [self.pending.pop(mid) for mid in expired]
+        for handle in handles:
+            self.complete(handle, PublishHandle.TIMEOUT, f"not acknowledged in {self.timeout} seconds")
+
+    def complete(self, handle: PublishHandle, status: str, error: Optional[str] = None) -> None:
+        if not handle.finish(status, error):
+            return
+        with self.lock:
+            self.stats[status] += 1
+        if self.on_result is not None:
+            try:
+                self.on_result(handle)
+            except Exception as e:
+                logging.error(f"Error in the publish result callback: {e}")
+
+    def flush(self, timeout: Optional[float] = None) -> List[PublishHandle]:
+        """
+        Wait until every message in flight has its result.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait, the messages keep their own deadlines.
+
+        Returns
+        -------
+        List[PublishHandle]
+            The handles which are still pending.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                handles = list(self.pending.values())
+            if not handles:
+                return []
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return handles
+            for handle in handles:
+                handle.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,171 @@
+import logging
+import random
+import threading
+from typing import Optional
+from .static_config import RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY, RECONNECT_JITTER, CONNECT_TIMEOUT
+
+
+class Reconnector:
+    """
+    Keeps the MQTT client connected from a background thread.
+
+    The thread is a small state machine: `CONNECTING` (an attempt is waiting for the broker), `CONNECTED`
+    (it waits for the link to drop), `WAITING` (the delay before the next attempt) and `STOPPED`.
+    An attempt is a single `MQTT.connect`, which uses the reconnect of paho after the first connection,
+    there is no probe of the broker besides it. After every failed attempt the delay doubles, from `min_delay`
+    up to `max_delay`, and a random fraction of at most `jitter` is taken off it, so the devices which lost
+    the same broker do not reconnect at the same time. A dropped link is followed by the shortest delay.
+
+    The changes of the link are events: `link_up` is set while the broker accepts the connection,
+    `link_down` while it does not. The users wait for them instead of polling the client,
+    so the publishing callers never block on the connection, unless they ask to.
+
+    Parameters
+    ----------
+    mqtt : MQTT
+        The client to keep connected, the reconnector is one of its ``connection_listeners``.
+    min_delay : float, optional
+        The seconds to wait after a dropped link, or the first failed attempt.
+    max_delay : float, optional
+        The longest delay between two attempts.
+    jitter : float, optional
+        The largest fraction taken off a delay, between 0 and 1.
+    connect_timeout : float, optional
+        The seconds an attempt waits for the broker to accept the connection.
+    rng : random.Random, optional
+        The source of the jitter.
+
+    Attributes
+    ----------
+    state : str
+        One of `STOPPED`, `CONNECTING`, `CONNECTED` and `WAITING`.
+    failures : int
+        The number of failed attempts since the last successful connection.
+    attempts : int
+        The number of connection attempts made.
+    failed_attempts : int
+        The number of failed connection attempts.
+    """
+
+    STOPPED = "stopped"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    WAITING = "waiting"
+
+    def __init__(self, mqtt, min_delay: float = RECONNECT_MIN_DELAY, max_delay: float = RECONNECT_MAX_DELAY,
+                 jitter: float = RECONNECT_JITTER, connect_timeout: float = CONNECT_TIMEOUT,
+                 rng: Optional[random.Random] = None) -> None:
+        self.mqtt = mqtt
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.connect_timeout = connect_timeout
+        self.rng = rng if rng is not None else random.Random()
+        self.state = self.STOPPED
+        self.failures = 0
+        self.attempts = 0
+        self.failed_attempts = 0
+        self.link_up = threading.Event()
+        self.link_down = threading.Event()
+        self.link_down.set()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        mqtt.connection_listeners.append(self.on_connection_change)
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Start the background thread, unless it is running.
+        """
+        with self.lock:
+            if self.running:
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="reconnect", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background thread, the current connection is left as it is.
+        """
+        self.stopping.set()
+        # Wakes the thread up if it is waiting for the link to drop
+        self.link_down.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the broker accepts the connection.
+
+        Returns
+        -------
+        bool
+            True if the link is up.
+        """
+        return self.link_up.wait(timeout)
+
+    def delay(self) -> float:
+        """
+        The seconds to wait before the next attempt, based on the number of `failures`.
+        """
+        delay = min(self.max_delay, self.min_delay * 2 ** self.failures)
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def on_connection_change(self, connected: bool) -> None:
+        if connected:
+            self.failures = 0
+            self.state = self.CONNECTED
+            self.link_down.clear()
+            self.link_up.set()
+        else:
+            self.link_up.clear()
+            self.link_down.set()
+
+    def run(self) -> None:
+        dropped = False
+        while not self.stopping.is_set():
+            if self.link_up.is_set():
+                self.link_down.wait()
+                dropped = True
+                continue
+
+            if dropped or self.failures:
+                delay = self.delay()
+                self.state = self.WAITING
+                logging.info(f"Connecting to the MQTT broker again in {delay:.1f} seconds")
+                if self.stopping.wait(delay):
+                    break
+            dropped = False
+            if not self.attempt():
+                self.failures += 1
+                self.failed_attempts += 1
+        self.state = self.STOPPED
+
+    def attempt(self) -> bool:
+        """
+        Connect once, and wait at most `connect_timeout` seconds for the broker to accept the connection.
+
+        Returns
+        -------
+        bool
+            True if the link is up.
+        """
+        self.state = self.CONNECTING
+        self.attempts += 1
+        try:
+            self.mqtt.connect()
+        except ConnectionError as e:
+            logging.warning(f"Connection attempt {self.failures + 1} failed: {e}")
+            return False
+        if self.link_up.wait(self.connect_timeout):
+            return True
+        logging.warning(f"The broker did not accept the connection in {self.connect_timeout} seconds")
+        # The next attempt starts with a new socket
+        self.mqtt.client.loop_stop()
+        self.mqtt.client.disconnect()
+        return False
@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from .static_config import RESUME_STATE_PATH, RESUME_MAX_AGE, BROKER
+from .mqtt import MQTT
+from .system import clock
+
+
+class ResumeState:
+    """
+    A snapshot of the state which the app builds up at startup, written right before a shutdown,
+    so the next boot can skip the steps it proves unnecessary.
+
+    The snapshot holds:
+
+    - The parsed configuration files (the config and the logging config), with the modification time
+      and the size of the files. A file is only parsed again if it has changed.
+    - The broker which accepted the last connection (`MQTT.verified_broker`).
+    - Whether the time was synchronized. If it was, the clock is anchored to the system clock
+      (set from the RTC by the kernel) right away, and `timedatectl` and the NTP check run in the background.
+
+    The snapshot is used once: it is deleted when it is loaded, and it is only used if it was written in an
+    earlier boot, at most `max_age` seconds ago. A failing step falls back to the normal path.
+
+    Parameters
+    ----------
+    path : str, optional
+        The JSON file of the snapshot.
+    max_age : float, optional
+        The maximum age of a usable snapshot in seconds.
+
+    Attributes
+    ----------
+    snapshot : Dict[str, Any]
+        The loaded snapshot, empty if the boot is cold.
+    """
+
+    VERSION = 1
+    BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+    def __init__(self, path: str = RESUME_STATE_PATH, max_age: float = RESUME_MAX_AGE) -> None:
+        self.path = path
+        self.max_age = max_age
+        self.cold_reason = ""
+        self.snapshot: Dict[str, Any] = self.load()
+
+    @property
+    def warm(self) -> bool:
+        """
+        True if a usable snapshot was found.
+        """
+        return bool(self.snapshot)
+
+    @classmethod
+    def boot_id(cls) -> Optional[str]:
+        try:
+            with open(cls.BOOT_ID_PATH) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    @staticmethod
+    def signature(path: str) -> Optional[List[int]]:
+        """
+        The modification time and the size of a file, None if it does not exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+            os.remove(self.path)
+        except (OSError, ValueError):
+            self.cold_reason = "there is no snapshot"
+            return {}
+
+        boot_id = self.boot_id()
+        # The system clock, the clock service would run timedatectl before the snapshot is applied
+        age = time.time() - snapshot.get("written", 0)
+        if snapshot.get("version") != self.VERSION:
+            self.cold_reason = "the snapshot has a different version"
+        elif boot_id is None or snapshot.get("bootId") == boot_id:
+            self.cold_reason = "the snapshot was written in this boot"
+        elif not 0 <= age <= self.max_age:
+            self.cold_reason = f"the snapshot is {age:.0f} seconds old"
+        else:
+            return snapshot
+        return {}
+
+    def cached(self, path: str) -> Optional[Any]:
+        """
+        The parsed content of a file, if it is in the snapshot and the file has not changed since.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        Returns
+        -------
+        Optional[Any]
+            The content, or None if the file has to be read.
+        """
+        entry = self.snapshot.get("files", {}).get(path)
+        if entry is None or entry["signature"] != self.signature(path):
+            return None
+        return entry["data"]
+
+    def apply(self) -> None:
+        """
+        Restore the broker and the clock from the snapshot. Call it once the logging is started.
+        """
+        if not self.warm:
+            logging.info(f"Cold start, because {self.cold_reason}")
+            return
+        logging.info("Warm start from the resume snapshot")
+        if self.snapshot.get("broker") == BROKER:
+            MQTT.verified_broker = BROKER
+        if self.snapshot.get("timeSynced"):
+            clock.resume()
+
+    def save(self, files: Dict[str, Tuple[Optional[List[int]], Any]]) -> None:
+        """
+        Write the snapshot, right before the shutdown.
+
+        Parameters
+        ----------
+        files : Dict[str, Tuple[Optional[List[int]], Any]]
+            The `signature` of every parsed file when it was read, and its parsed content.
+            The files without a signature are left out.
+        """
+        snapshot = {
+            "version": self.VERSION,
+            "written": time.time(),
+            "bootId": self.boot_id(),
+            "files": {path: {"signature": signature, "data": data}
+                      for path, (signature, data) in files.items() if signature is not None},
+            "broker": MQTT.verified_broker,
+            "timeSynced": clock.verified,
+        }
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError) as e:
+            logging.error(f"Failed to save the resume snapshot: {e}")
@@ -1,15 +1,307 @@
 from datetime import datetime, time
 from datetime import timedelta
+import json
 import logging
-from .static_config import TIME_TO_BOOT_AND_SHUTDOWN, SHUTDOWN_THRESHOLD
-from .system import System, RTC
+import time as timer
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from .static_config import SHUTDOWN_THRESHOLD, MINIMUM_WAIT_TIME, MAXIMUM_WAIT_TIME, STATE_FILE_PATH
+from .static_config import POWER_POLICY_STATE_PATH, DEFAULT_BOOT_SHUTDOWN_TIME, BOOT_OVERHEAD_PERCENTILE
+from .static_config import BOOT_OVERHEAD_SAMPLES, BOOT_OVERHEAD_MIN_SAMPLES, BOOT_OVERHEAD_ALPHA
+from .system import System, RTC, clock
+from .telemetry import TelemetrySnapshot
 import pytz
 
 
+class PolicyDecision(NamedTuple):
+    """
+    The schedule chosen by the `PowerPolicy`.
+    """
+    period: int
+    quality: Optional[str]
+    stay_awake: bool
+    reason: str
+
+
+class PowerPolicy:
+    """
+    Chooses the capture period, the resolution, and whether to stay awake, from the state of the battery.
+
+    The rules, in order of priority (the thresholds are the keys of the ``powerPolicy`` config):
+
+    - At or below ``criticalBattery`` percent, the period is stretched by ``lowBatteryPeriodFactor``
+      twice, and the images are taken in HD.
+    - At or below ``lowBattery`` percent, the period is stretched by ``lowBatteryPeriodFactor``, and once more
+      if the charge falls faster than ``fallingRate`` percent per hour. If the charger delivers at least
+      ``surplusCurrent`` mA (the panel is in the sun), the configured period is kept.
+    - At or above ``burstMinBattery`` percent, while the charger delivers at least ``surplusCurrent`` mA,
+      the images are taken as often as possible (`MINIMUM_WAIT_TIME`), and the device stays awake.
+    - Otherwise, the configured period is used.
+
+    The stretched periods are limited to `MAXIMUM_WAIT_TIME`. The trend of the charge is computed from
+    the readings of the last `TREND_WINDOW` seconds, which are kept in `state_path`, so the trend
+    is known after a shutdown too.
+
+    Parameters
+    ----------
+    config : Dict[str, Any]
+        The ``powerPolicy`` part of the config.
+    state_path : str, optional
+        The JSON file the battery readings are kept in.
+    """
+
+    TREND_WINDOW = 2 * 3600
+    MIN_TREND_SPAN = 600
+
+    def __init__(self, config: Dict[str, Any], state_path: str = POWER_POLICY_STATE_PATH) -> None:
+        self.config = config
+        self.state_path = state_path
+        self.history: List[List[float]] = self.load()
+
+    def load(self) -> List[List[float]]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)["history"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def save(self) -> None:
+        try:
+            with open(self.state_path, "w") as f:
+                json.dump({"history": self.history}, f)
+        except OSError as e:
+            logging.error(f"Failed to save the power policy state: {e}")
+
+    def trend(self) -> Optional[float]:
+        """
+        The change of the battery charge in percent per hour, None if the readings span less than `MIN_TREND_SPAN`.
+        """
+        if len(self.history) < 2 or self.history[-1][0] - self.history[0][0] < self.MIN_TREND_SPAN:
+            return None
+        (start, first), (end, last) = self.history[0], self.history[-1]
+        return (last - first) / (end - start) * 3600
+
+    def record(self, percentage: int) -> None:
+        """
+        Add a battery reading to the history, dropping the readings older than `TREND_WINDOW`.
+        """
+        now = clock.now().timestamp()
+        self.history = [entry for entry in self.history if now - entry[0] <= self.TREND_WINDOW]
+        self.history.append([now, percentage])
+        self.save()
+
+    def decide(self, period: int, percentage: Optional[int], charger_current: Optional[float],
+               trend: Optional[float]) -> PolicyDecision:
+        """
+        Apply the rules of the policy.
+
+        Parameters
+        ----------
+        period : int
+            The configured period in seconds.
+        percentage : Optional[int]
+            The charge of the battery in percent.
+        charger_current : Optional[float]
+            The current delivered by the charger in amperes.
+        trend : Optional[float]
+            The change of the charge in percent per hour.
+
+        Returns
+        -------
+        PolicyDecision
+            The period, the resolution (None for the configured one), whether to stay awake, and the reason.
+        """
+        config = self.config
+        if not config["enabled"]:
+            return PolicyDecision(period, None, False, "power policy is disabled")
+        if percentage is None:
+            return PolicyDecision(period, None, False, "battery charge is not known")
+
+        factor = config["lowBatteryPeriodFactor"]
+        surplus = charger_current is not None and charger_current * 1000 >= config["surplusCurrent"]
+        charger = f"charger {charger_current * 1000:.0f} mA" if charger_current is not None else "no charger data"
+
+        if percentage <= config["criticalBattery"]:
+            return PolicyDecision(min(period * factor * factor, MAXIMUM_WAIT_TIME), "HD", False,
+                                  f"battery {percentage}% is critical (<= {config['criticalBattery']}%)")
+        if percentage <= config["lowBattery"]:
+            if surplus:
+                return PolicyDecision(period, None, False, f"battery {percentage}% is low, but {charger}")
+            reason = f"battery {percentage}% is low (<= {config['lowBattery']}%)"
+            if trend is not None and trend <= -config["fallingRate"]:
+                return PolicyDecision(min(period * factor * factor, MAXIMUM_WAIT_TIME), None, False,
+                                      f"{reason} and falling {-trend:.1f}%/h")
+            return PolicyDecision(min(period * factor, MAXIMUM_WAIT_TIME), None, False, reason)
+        if surplus and percentage >= config["burstMinBattery"]:
+            return PolicyDecision(MINIMUM_WAIT_TIME, None, True, f"battery {percentage}% and {charger} surplus")
+        return PolicyDecision(period, None, False, f"battery {percentage}%, {charger}")
+
+    def update(self, period: int, snapshot: TelemetrySnapshot) -> PolicyDecision:
+        """
+        Record the current battery reading, and decide the schedule.
+
+        Parameters
+        ----------
+        period : int
+            The configured period in seconds.
+        snapshot : TelemetrySnapshot
+            The current telemetry values.
+        """
+        if self.config["enabled"] and snapshot.battery_percentage is not None:
+            self.record(snapshot.battery_percentage)
+        return self.decide(period, snapshot.battery_percentage, snapshot.charger_current_now, self.trend())
+
+
+class BootOverhead:
+    """
+    Learns how long the device takes from the shutdown to being ready for the next image.
+
+    Before shutting down, the time of the shutdown, the requested sleep duration and the planned start of
+    the next cycle are saved into `path`. After the boot, `woke_up` measures the overhead: the time which passed
+    beyond the sleep duration. The last `BOOT_OVERHEAD_SAMPLES` measurements, their moving average,
+    median and 90th percentile are kept in the state file.
+
+    The sleep is shortened by a high percentile of the measurements, so the device is usually ready
+    a little early, and then `woke_up` waits for the planned start. This keeps the period accurate to
+    the resolution of the RTC alarm, whatever the battery voltage does to the boot time.
+
+    Parameters
+    ----------
+    path : str, optional
+        The JSON state file.
+    percentile : float, optional
+        The percentile of the measurements the sleep is shortened by.
+    """
+
+    # A longer "overhead" means the device was woken up by hand, or the state is stale
+    MAX_OVERHEAD = 600
+
+    def __init__(self, path: str = STATE_FILE_PATH, percentile: float = BOOT_OVERHEAD_PERCENTILE) -> None:
+        self.path = path
+        self.percentile = percentile
+        self.state: Dict[str, Any] = self.load()
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self) -> None:
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.state, f)
+        except OSError as e:
+            logging.error(f"Failed to save the boot overhead: {e}")
+
+    @property
+    def samples(self) -> List[float]:
+        return self.state.get("bootOverhead", {}).get("samples", [])
+
+    def estimate(self) -> float:
+        """
+        The overhead the sleep is shortened by, in seconds.
+
+        Returns
+        -------
+        float
+            The `percentile` percentile of the measurements, or `DEFAULT_BOOT_SHUTDOWN_TIME`
+            if there are less than `BOOT_OVERHEAD_MIN_SAMPLES` of them.
+        """
+        if len(self.samples) < BOOT_OVERHEAD_MIN_SAMPLES:
+            return DEFAULT_BOOT_SHUTDOWN_TIME
+        return float(np.percentile(self.samples, self.percentile))
+
+    def shutting_down(self, shutdown_duration: float, waiting_time: float) -> None:
+        """
+        Save the shutdown, right before the wake-up alarm is set.
+
+        Parameters
+        ----------
+        shutdown_duration : float
+            The time the wake-up alarm is set to, in seconds from now.
+        waiting_time : float
+            The time until the next cycle should start, in seconds from now.
+        """
+        now = clock.now().timestamp()
+        self.state["shutdown"] = {"time": now, "duration": shutdown_duration, "nextCycle": now + waiting_time}
+        self.save()
+
+    def woke_up(self) -> float:
+        """
+        Measure the overhead of the last shutdown, if the device was woken up by the alarm, and wait for
+        the planned start of the cycle. It does nothing if the device did not shut down.
+
+        Returns
+        -------
+        float
+            The measured overhead in seconds, 0 if nothing was measured.
+        """
+        shutdown = self.state.pop("shutdown", None)
+        if shutdown is None:
+            return 0.0
+        now = clock.now().timestamp()
+        overhead = now - shutdown["time"] - shutdown["duration"]
+        if not 0 < overhead < self.MAX_OVERHEAD:
+            logging.info(f"Ignoring boot overhead of {overhead:.1f} seconds")
+            self.save()
+            return 0.0
+
+        learned = self.state.setdefault("bootOverhead", {"samples": [], "ewma": overhead})
+        learned["samples"] = (learned["samples"] + [round(overhead, 3)])[-BOOT_OVERHEAD_SAMPLES:]
+        learned["ewma"] = BOOT_OVERHEAD_ALPHA * overhead + (1 - BOOT_OVERHEAD_ALPHA) * learned["ewma"]
+        learned["p50"], learned["p90"] = (float(p) for p in np.percentile(learned["samples"], [50, 90]))
+        self.save()
+        logging.info(f"Boot overhead was {overhead:.1f} seconds, average {learned['ewma']:.1f}, "
+                     f"median {learned['p50']:.1f}, 90th percentile {learned['p90']:.1f}")
+
+        early = shutdown["nextCycle"] - now
+        if early > 0:
+            logging.info(f"Woke up {early:.1f} seconds early, waiting for the planned start")
+            timer.sleep(early)
+        return overhead
+
+
 class Schedule:
-    def __init__(self, period):
+    def __init__(self, period, policy: Optional[PowerPolicy] = None, boot_overhead: Optional[BootOverhead] = None):
         self.period = period
         self.time_offset = 2  # Budapest is UTC+2
+        self.policy = policy
+        self.decision: Optional[PolicyDecision] = None
+        self.boot_overhead = boot_overhead
+
+    @property
+    def effective_period(self) -> int:
+        """
+        The period chosen by the power policy, or the configured `period` if there is no policy.
+        """
+        return self.decision.period if self.decision is not None else self.period
+
+    def adapt(self, snapshot: TelemetrySnapshot) -> Optional[PolicyDecision]:
+        """
+        Let the power policy decide the schedule from the current telemetry values.
+        The decision is logged with its reason whenever it changes.
+
+        Parameters
+        ----------
+        snapshot : TelemetrySnapshot
+            The current telemetry values.
+
+        Returns
+        -------
+        Optional[PolicyDecision]
+            The decision, None if there is no policy.
+        """
+        if self.policy is None:
+            return None
+        decision = self.policy.update(self.period, snapshot)
+        if self.decision is None or decision[:3] != self.decision[:3]:
+            logging.info(f"Power policy: period {decision.period} s, quality {decision.quality or 'as configured'}, "
+                         f"{'staying awake' if decision.stay_awake else 'shutdown allowed'}, because {decision.reason}")
+        self.decision = decision
+        return decision
 
     def should_shutdown(self, waiting_time) -> bool:
         """
@@ -24,7 +316,10 @@ class Schedule:
         -------
         bool
             True if the system should shut down, False otherwise.
+            Always False if the power policy decided to stay awake.
         """
+        if self.decision is not None and self.decision.stay_awake:
+            return False
         return waiting_time > SHUTDOWN_THRESHOLD
 
     def shutdown(self, waiting_time: float, current_time: datetime) -> None:
@@ -64,8 +359,10 @@ class Schedule:
         -------
         float
             The duration for which the system should be shut down, cannot be negative.
+            The learned boot overhead is subtracted if there is a `boot_overhead`.
         """
-        shutdown_duration = waiting_time - TIME_TO_BOOT_AND_SHUTDOWN
+        overhead = self.boot_overhead.estimate() if self.boot_overhead is not None else DEFAULT_BOOT_SHUTDOWN_TIME
+        shutdown_duration = waiting_time - overhead
         return max(shutdown_duration, 0)
 
     def get_wake_time(self, shutdown_duration) -> datetime:
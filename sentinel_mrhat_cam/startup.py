@@ -0,0 +1,249 @@
+import logging
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+
+@dataclass
+class ImportRecord:
+    """
+    The loading of a module. The times are in seconds, ``start`` is relative to the start of the report.
+    The ``depth`` is the number of modules being loaded when it started, -1 until then.
+    """
+    name: str
+    depth: int
+    start: float
+    cumulative: float = 0.0
+    children: float = 0.0
+
+    @property
+    def self_time(self) -> float:
+        return self.cumulative - self.children
+
+
+@dataclass
+class StepRecord:
+    """
+    An initialization step, the times are in seconds relative to the start of the report.
+    """
+    name: str
+    start: float
+    duration: float
+
+
+@dataclass
+class TaskTiming:
+    """
+    The run of an `InitTasks` task, ``start`` is a `time.perf_counter` value, the times are in seconds.
+    """
+    name: str
+    start: float
+    duration: float
+    failed: bool = False
+
+
+class InitTasks:
+    """
+    Runs initialization tasks in parallel threads, with explicit dependencies.
+
+    A task starts as soon as the tasks it depends on have finished. If a task raises an exception, the tasks
+    depending on it are not run, and `run` raises the first exception once all the others have finished.
+    The timing of every task is logged, and kept in `timings`.
+
+    Examples
+    --------
+    >>> tasks = InitTasks()
+    >>> tasks.add("camera", camera.start)
+    >>> tasks.add("connect", transmit.ensure_connected)
+    >>> tasks.add("focus", camera.wait_for_focus, after=("camera",))
+    >>> results = tasks.run()
+    """
+
+    def __init__(self) -> None:
+        self.tasks: Dict[str, Tuple[Callable[[], Any], Tuple[str, ...]]] = {}
+        self.timings: List[TaskTiming] = []
+
+    def add(self, name: str, function: Callable[[], Any], after: Sequence[str] = ()) -> None:
+        """
+        Add a task. The tasks it depends on have to be added before it, so there can be no cycles.
+
+        Parameters
+        ----------
+        name : str
+            The name of the task.
+        function : Callable[[], Any]
+            The work of the task, its return value is in the results of `run`.
+        after : Sequence[str], optional
+            The names of the tasks which have to finish before this task starts.
+
+        Raises
+        ------
+        ValueError
+            If the name is already used, or a dependency is not added yet.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name} is already added")
+        missing = [dependency for dependency in after if dependency not in self.tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown tasks: {missing}")
+        self.tasks[name] = (function, tuple(after))
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run the tasks, and wait until all of them have finished.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The return value of every task.
+        """
+        futures: Dict[str, Future] = {}
+        # A thread for every task, so a task waiting for its dependencies can not hold up the others
+        with ThreadPoolExecutor(max_workers=max(len(self.tasks), 1), thread_name_prefix="init") as pool:
+            for name, (function, after) in self.tasks.items():
+                futures[name] = pool.submit(self.run_task, name, function, [futures[task] for task in after])
+
+        logging.info("Initialization tasks: " + ", ".join(
+            f"{timing.name} {timing.duration:.3f} s{' (failed)' if timing.failed else ''}" for timing in self.timings))
+        for future in futures.values():
+            if future.exception() is not None:
+                raise future.exception()
+        return {name: future.result() for name, future in futures.items()}
+
+    def run_task(self, name: str, function: Callable[[], Any], dependencies: List[Future]) -> Any:
+        for dependency in dependencies:
+            dependency.result()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = function()
+            failed = False
+            return result
+        finally:
+            self.timings.append(TaskTiming(name, start, time.perf_counter() - start, failed))
+
+
+class StartupReport:
+    """
+    Records the startup timeline: the time spent loading every module, and the initialization steps.
+
+    When installed, the report puts itself at the front of `sys.meta_path`. It lets the other finders
+    find the modules, and times the loading of every module imported afterwards, like ``python -X importtime``.
+    The self time of a module excludes the modules it imported, the cumulative time includes them.
+    The modules which were loaded before the report was installed are not in the report.
+
+    Parameters
+    ----------
+    stream : TextIO, optional
+        Where the report is printed, the standard error by default.
+
+    Examples
+    --------
+    >>> report = StartupReport()
+    >>> report.install()
+    >>> with report.step("import app"):
+    ...     from sentinel_mrhat_cam.app import App
+    >>> report.uninstall()
+    >>> report.print()
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.imports: List[ImportRecord] = []
+        self.steps: List[StepRecord] = []
+        self.stack: List[ImportRecord] = []
+        self.installed = False
+
+    def install(self) -> None:
+        if not self.installed:
+            sys.meta_path.insert(0, self)
+            self.installed = True
+
+    def uninstall(self) -> None:
+        if self.installed:
+            sys.meta_path.remove(self)
+            self.installed = False
+
+    def find_spec(self, fullname: str, path: Any = None, target: Any = None) -> Any:
+        """
+        The `importlib.abc.MetaPathFinder` interface, finds the module with the other finders,
+        and wraps the loading of its module.
+        """
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # Built-in and frozen modules are loaded by classes, and some finders use one loader
+            # for many modules, only the loaders of a single module are timed
+            if loader is not None and not isinstance(loader, type) and not hasattr(loader, "startup_record"):
+                record = ImportRecord(fullname, -1, 0.0)
+                loader.startup_record = record
+                for method in ("create_module", "exec_module"):
+                    if hasattr(loader, method):
+                        setattr(loader, method, self.timed(record, getattr(loader, method)))
+            return spec
+        return None
+
+    def timed(self, record: ImportRecord, function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            if record.depth < 0:
+                record.depth = len(self.stack)
+                record.start = time.perf_counter() - self.start
+                self.imports.append(record)
+            parent = self.stack[-1] if self.stack else None
+            self.stack.append(record)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stack.pop()
+                record.cumulative += elapsed
+                if parent is not None:
+                    parent.children += elapsed
+        return wrapper
+
+    def add_tasks(self, timings: List[TaskTiming]) -> None:
+        """
+        Add the tasks run by `InitTasks` as steps, in the order they started.
+        """
+        for timing in sorted(timings, key=lambda timing: timing.start):
+            self.steps.append(StepRecord(f"  {timing.name}", timing.start - self.start, timing.duration))
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """
+        Record the code run inside the ``with`` block as an initialization step.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append(StepRecord(name, start - self.start, time.perf_counter() - start))
+
+    def format(self) -> str:
+        """
+        The report as text, with the times in milliseconds.
+        """
+        lines = ["Startup report", "", "import time: self [ms] | cumulative [ms] | module"]
+        for record in self.imports:
+            lines.append(f"import time: {record.self_time * 1000:9.2f} | {record.cumulative * 1000:15.2f} | "
+                         f"{'  ' * record.depth}{record.name}")
+        top_level = sum(record.cumulative for record in self.imports if record.depth == 0)
+        lines.append(f"{len(self.imports)} modules loaded in {top_level * 1000:.1f} ms")
+
+        lines += ["", "step time: start [ms] | duration [ms] | step"]
+        for step in self.steps:
+            lines.append(f"step time: {step.start * 1000:12.1f} | {step.duration * 1000:13.1f} | {step.name}")
+        lines.append(f"Startup took {(time.perf_counter() - self.start) * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    def print(self) -> None:
+        print(self.format(), file=self.stream or sys.stderr, flush=True)
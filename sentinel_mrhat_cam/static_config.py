@@ -32,6 +32,194 @@ PASSWORD = "rubin2024cam4"
 LOGGING_TOPIC = "cam4/log"
 LOG_LEVEL = logging.WARNING
 
+"""
+If not 0, the image messages are split into chunks of this many bytes, and only the chunks
+which were not acknowledged are re-sent after a reconnect. Requires QOS >= 1.
+"""
+IMAGE_CHUNK_SIZE = 0
+
+"""
+Seconds to wait for the next chunk acknowledgement before reconnecting and re-sending the pending chunks.
+"""
+CHUNK_ACK_TIMEOUT = 10
+
+"""
+The number of send rounds (connections) a chunked image transfer is allowed to take.
+"""
+CHUNK_MAX_ROUNDS = 5
+
+"""
+The maximum number of published messages waiting for their acknowledgement, and the seconds after which
+an unacknowledged message is reported as timed out (see `PublishWindow`).
+"""
+PUBLISH_WINDOW = 8
+PUBLISH_TIMEOUT = 5
+
+"""
+While the broker is not connected, the `Reconnector` tries to connect in the background. The delay between
+the attempts doubles from `RECONNECT_MIN_DELAY` up to `RECONNECT_MAX_DELAY` seconds, and a random fraction
+of at most `RECONNECT_JITTER` is taken off every delay. An attempt waits `CONNECT_TIMEOUT` seconds for the broker.
+"""
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+RECONNECT_JITTER = 0.5
+CONNECT_TIMEOUT = 10
+
+"""
+If True, the client speaks MQTT v5 (see `V5Transport`). The image and the log topics of the QoS 0 messages
+are replaced by topic aliases, the metadata of the binary image messages is sent as user properties next to
+the raw image, and the image messages expire after `IMAGE_EXPIRY` seconds. The broker keeps the session
+of the `CLIENT_ID` client (the subscriptions, and the messages queued for it) for `SESSION_EXPIRY` seconds,
+so a config sent while the device is shut down arrives when it connects. The receiver scripts use the same setting.
+"""
+MQTT_V5 = False
+IMAGE_EXPIRY = 3600
+SESSION_EXPIRY = 7 * 24 * 3600
+CLIENT_ID = USERNAME
+
+"""
+If True, the JPEG quality and the downscale factor of the images are adapted to the measured
+throughput of the link, so that sending an image takes at most `BITRATE_TARGET_FRACTION` of the period.
+"""
+ADAPTIVE_BITRATE = False
+BITRATE_TARGET_FRACTION = 0.5
+
+"""
+If True, frames which barely differ from the last transmitted one are not sent, only a small
+telemetry heartbeat is. `CHANGE_THRESHOLD` is the minimum difference (0-1) measured with `CHANGE_METRIC`
+("mad" or "histogram"), and every `KEYFRAME_INTERVAL`-th frame is sent regardless of the difference.
+"""
+CHANGE_DETECTION = False
+CHANGE_THRESHOLD = 0.02
+CHANGE_METRIC = "mad"
+KEYFRAME_INTERVAL = 10
+CHANGE_STATE_PATH = os.path.join(SCRIPT_DIR, 'change_state.npz')
+
+"""
+Used by the "tiles" message format: the frame is split into a grid of `TILE_SIZE` pixel tiles (a multiple of 32),
+and between two keyframes only the tiles whose difference is at least `TILE_THRESHOLD` (0-1) are sent.
+A keyframe is sent every `TILE_KEYFRAME_INTERVAL` frames.
+"""
+TILE_SIZE = 128
+TILE_THRESHOLD = 0.08
+TILE_KEYFRAME_INTERVAL = 30
+
+"""
+If True, the image messages carry a preview of `PREVIEW_WIDTH` pixels width, and the full resolution frames
+are kept in the on-device `FrameStore` (a `FRAME_STORE_CAPACITY` bytes ring of at most `FRAME_STORE_SLOTS` frames).
+The backend can request a full resolution frame on `FRAMEREQUESTTOPIC`, it is sent to `FULLFRAMETOPIC`.
+"""
+PREVIEW_FIRST = False
+PREVIEW_WIDTH = 640
+FRAME_STORE_PATH = os.path.join(SCRIPT_DIR, 'frames')
+FRAME_STORE_CAPACITY = 512 * 1024 * 1024
+FRAME_STORE_SLOTS = 1024
+FRAMEREQUESTTOPIC = "cam4/request"
+FULLFRAMETOPIC = "sentinel/cam4/full"
+
+"""
+The messages which could not be published are kept in the outbox on the SD card (at most `OUTBOX_MAX_BYTES`,
+the oldest messages are dropped above that), and sent after the next successful publish,
+at most `OUTBOX_BATCH_SIZE` messages at a time, at most `OUTBOX_DRAIN_RATE` bytes per second (0: no limit).
+If `OUTBOX_ENABLED` is False, the script exits instead, and `daemon.sh` restarts it.
+"""
+OUTBOX_ENABLED = True
+OUTBOX_PATH = os.path.join(SCRIPT_DIR, 'outbox')
+OUTBOX_MAX_BYTES = 256 * 1024 * 1024
+OUTBOX_SEGMENT_BYTES = 16 * 1024 * 1024
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_DRAIN_RATE = 256 * 1024
+
+"""
+The sysfs files the telemetry is read from, and how long a value read from each of them is reused, in seconds.
+"""
+BATTERY_UEVENT_PATH = '/sys/class/power_supply/bq2562x-battery/uevent'
+CHARGER_UEVENT_PATH = '/sys/class/power_supply/bq2562x-charger/uevent'
+CPU_THERMAL_PATH = '/sys/class/thermal/thermal_zone0/temp'
+TELEMETRY_TTL = {"cpu": 5, "battery": 30, "charger": 5}
+
+"""
+The interval of the clock drift check in seconds (0 disables it), and the largest tolerated drift
+between the anchored time and the system clock in seconds.
+"""
+CLOCK_RESYNC_INTERVAL = 3600
+CLOCK_MAX_DRIFT = 2
+
+"""
+If True, a background thread samples the battery and the charger `POWER_SAMPLE_RATE` times per second,
+into a ring buffer of `POWER_BUFFER_SIZE` samples. A summary of the samples taken since the previous message
+is sent along with the telemetry, and the raw samples are sent to `POWERDATATOPIC` when requested
+on `POWERREQUESTTOPIC` (see `mqtt_power_dump.py`).
+It is off by default, because the sampling thread wakes up in every mode and drains the battery itself.
+Enable it while the energy of the device is measured.
+"""
+POWER_SAMPLING = False
+POWER_SAMPLE_RATE = 20
+POWER_BUFFER_SIZE = 20 * 60 * 15
+POWERREQUESTTOPIC = "cam4/power-request"
+POWERDATATOPIC = "sentinel/cam4/power"
+
+"""
+The energy spent in every phase (capture, encode, publish, ...) is appended to `ENERGY_LOG_PATH` as CSV,
+and the totals are sent to `ENERGYTOPIC` every `ENERGY_REPORT_INTERVAL` seconds, and before shutting down.
+The energy is only measured if `POWER_SAMPLING` is enabled.
+"""
+ENERGY_LOG_PATH = os.path.join(SCRIPT_DIR, 'energy_log.csv')
+ENERGYTOPIC = "cam4/energy"
+ENERGY_REPORT_INTERVAL = 300
+
+"""
+The battery readings the trend of the power policy is computed from (see `PowerPolicy`).
+"""
+POWER_POLICY_STATE_PATH = os.path.join(SCRIPT_DIR, 'power_policy_state.json')
+
+"""
+The snapshot written before a shutdown, which lets the next boot skip the parsing of the configs,
+the broker probe and the time synchronization (see `ResumeState`). It is only used within `RESUME_MAX_AGE` seconds.
+"""
+RESUME_STATE_PATH = os.path.join(SCRIPT_DIR, 'resume_state.json')
+RESUME_MAX_AGE = 24 * 3600
+
+"""
+The maximum time in seconds the startup waits for the continuous autofocus to settle (see `Camera.wait_for_focus`).
+"""
+AF_SETTLE_TIMEOUT = 3.0
+
+"""
+If True, the camera does not run the autofocus after every boot. It moves the lens to the position saved in
+`FOCUS_STATE_PATH`, and only runs an autofocus cycle if the sharpness of the `FOCUS_LORES_SIZE` stream is below
+`FOCUS_SHARPNESS_RATIO` times the sharpness saved with the position. Meant for a fixed-mount camera
+(see `Camera.focus`).
+"""
+FOCUS_CACHE = False
+FOCUS_STATE_PATH = os.path.join(SCRIPT_DIR, 'focus_state.json')
+FOCUS_LORES_SIZE = (640, 480)
+FOCUS_SHARPNESS_RATIO = 0.5
+FOCUS_SETTLE_FRAMES = 3
+
+"""
+The outbound messages are of four classes, the `OUTBOUND_QOS` keys in the order of priority, each with its QoS level.
+`OUTBOUND_CLASSES` maps the topics to their class, the other topics are `OUTBOUND_DEFAULT_CLASS`.
+The messages of the `OUTBOUND_YIELDING` classes wait while a message of a higher class is in flight,
+at most `OUTBOUND_YIELD_TIMEOUT` seconds, so the logs do not compete with the image for the uplink.
+If `OUTBOUND_RATE` is set, the messages are shaped to that many bytes per second, with bursts of at most
+`OUTBOUND_BURST` bytes (0: no limit). The time the messages waited is reported by class (see `OutboundScheduler`).
+"""
+OUTBOUND_QOS = {"config-ack": QOS, "image": QOS, "telemetry": 1, "log": 0}
+OUTBOUND_CLASSES = {
+    CONFIGACKTOPIC: "config-ack",
+    IMAGETOPIC: "image",
+    FULLFRAMETOPIC: "image",
+    ENERGYTOPIC: "telemetry",
+    POWERDATATOPIC: "telemetry",
+    LOGGING_TOPIC: "log",
+}
+OUTBOUND_DEFAULT_CLASS = "telemetry"
+OUTBOUND_YIELDING = ("log",)
+OUTBOUND_YIELD_TIMEOUT = 10
+OUTBOUND_RATE = 0
+OUTBOUND_BURST = 64 * 1024
+
 # App configuration
 """
 if  `period` < **SHUTDOWN_THRESHOLD** :
@@ -44,9 +232,15 @@ SHUTDOWN_THRESHOLD = 40
 
 """
 This is the default time in seconds that, the he Pi takes to shutdown, and then to boot again.
+It is used until `BOOT_OVERHEAD_MIN_SAMPLES` shutdowns were measured, then the `BOOT_OVERHEAD_PERCENTILE`
+percentile of the last `BOOT_OVERHEAD_SAMPLES` measurements is used (see `BootOverhead`).
+`BOOT_OVERHEAD_ALPHA` is the smoothing factor of the reported moving average.
 """
 DEFAULT_BOOT_SHUTDOWN_TIME = 30
-TIME_TO_BOOT_AND_SHUTDOWN = 20
+BOOT_OVERHEAD_PERCENTILE = 90
+BOOT_OVERHEAD_SAMPLES = 50
+BOOT_OVERHEAD_MIN_SAMPLES = 3
+BOOT_OVERHEAD_ALPHA = 0.2
 
 """
 This is the minimum value for `period` in seconds.
@@ -57,3 +251,16 @@ MINIMUM_WAIT_TIME = 5
 This is the maximum value for `period` in seconds.
 """
 MAXIMUM_WAIT_TIME = 10800
+
+"""
+Depth of the bounded queues between the stages of the always-on pipeline.
+The capture queue holds raw frames waiting for encoding, the publish queue holds
+encoded messages waiting for the broker. Every queued raw 4K frame costs 12-25 MB of RAM.
+"""
+CAPTURE_QUEUE_DEPTH = 1
+PUBLISH_QUEUE_DEPTH = 1
+
+"""
+How often (in seconds) the always-on pipeline logs the throughput of its stages.
+"""
+PIPELINE_STATS_INTERVAL = 60
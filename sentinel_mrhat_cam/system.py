@@ -1,13 +1,11 @@
 import subprocess
 import logging
-from datetime import datetime
-from typing import List
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
 import pytz
 import time
-try:
-    from gpiozero import CPUTemperature
-except ImportError:
-    CPUTemperature = None
+from .static_config import CLOCK_RESYNC_INTERVAL, CLOCK_MAX_DRIFT
 
 
 class System:
@@ -86,6 +84,8 @@ class System:
         float
             The current CPU temperature in degrees Celsius.
         """
+        # gpiozero sets up the pin factory when imported, so it is only loaded when needed
+        from gpiozero import CPUTemperature
         cpu = CPUTemperature()
         return cpu.temperature
 
@@ -451,12 +451,30 @@ class RTC:
     @staticmethod
     def get_time() -> str:
         """
-        Get the current time, ensuring synchronization with NTP and RTC.
+        Get the current time in ISO 8601 format.
+
+        The time is answered by the shared `Clock`, which reads the clocks with `read_time`
+        only once per boot, so this method does not start any processes.
+
+        Returns
+        -------
+        str
+            The current time in ISO 8601 format.
+        """
+        return clock.get_time()
+
+    @staticmethod
+    def read_time() -> str:
+        """
+        Read the current time, ensuring synchronization with NTP and RTC.
 
         This method retrieves the current time from the system, if the time is not synchronized
         with the hardware RTC, or with the NTP servers, the function attempts to synchronize them
         and then return the current time in ISO 8601 format.
 
+        It runs `timedatectl`, and can block for up to a minute while waiting for NTP,
+        use `get_time` instead.
+
         Returns
         -------
         str
@@ -503,3 +521,136 @@ class RTC:
         except Exception as e:
             logging.error(f"Error reading system time: {e}")
             return datetime.now(pytz.UTC).isoformat()
+
+
+class Clock:
+    """
+    Answers the current UTC time from the monotonic clock.
+
+    The time is anchored once, by reading the clocks through `RTC.read_time`, and from then on
+    it is the anchor plus the time elapsed on `time.monotonic()`. This makes reading the time
+    cheap, and the timestamps never jump when the system clock is stepped.
+
+    A background thread (see `start`) compares the anchored time to the system clock every
+    `resync_interval` seconds, and anchors again if they drifted apart by more than `max_drift` seconds,
+    e.g. because NTP corrected the system clock after the boot.
+
+    Parameters
+    ----------
+    source : Callable[[], str], optional
+        Returns the verified current time in ISO 8601 format. Default is `RTC.read_time`.
+    resync_interval : float, optional
+        The interval of the drift check in seconds.
+    max_drift : float, optional
+        The largest difference to the system clock, in seconds, which is tolerated.
+
+    Examples
+    --------
+    >>> start = time.monotonic()
+    >>> timestamp = clock.get_time()
+    >>> elapsed = time.monotonic() - start
+    """
+
+    def __init__(self, source: Optional[Callable[[], str]] = None, resync_interval: float = CLOCK_RESYNC_INTERVAL,
+                 max_drift: float = CLOCK_MAX_DRIFT) -> None:
+        self.source = source or RTC.read_time
+        self.resync_interval = resync_interval
+        self.max_drift = max_drift
+        self.anchor_time: Optional[datetime] = None
+        self.anchor_monotonic = 0.0
+        self.verified = False
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def anchor(self) -> None:
+        """
+        Read the current time from the source, and anchor the monotonic clock to it.
+        """
+        anchor_time = datetime.fromisoformat(self.source())
+        if anchor_time.tzinfo is None:
+            anchor_time = pytz.UTC.localize(anchor_time)
+        with self.lock:
+            self.anchor_time, self.anchor_monotonic = anchor_time, time.monotonic()
+        self.verified = True
+
+    def resume(self) -> None:
+        """
+        Anchor to the system clock right away, and read the source in the background.
+
+        Used after a warm boot (see `ResumeState`), when the time was synchronized before the shutdown,
+        so the system clock set from the RTC at boot can be trusted until the source confirms it.
+        """
+        with self.lock:
+            self.anchor_time, self.anchor_monotonic = datetime.now(pytz.UTC), time.monotonic()
+        threading.Thread(target=self.verify, name="clock-verify", daemon=True).start()
+
+    def verify(self) -> None:
+        try:
+            before = self.now()
+            self.anchor()
+            difference = (self.now() - before).total_seconds()
+            if abs(difference) > self.max_drift:
+                logging.warning(f"Resumed clock was off by {difference:.3f} seconds")
+        except Exception as e:
+            logging.error(f"Error verifying the resumed clock: {e}")
+
+    def now(self) -> datetime:
+        """
+        Returns the current time as a timezone-aware datetime, anchoring the clock at the first call.
+        """
+        if self.anchor_time is None:
+            self.anchor()
+        with self.lock:
+            return self.anchor_time + timedelta(seconds=time.monotonic() - self.anchor_monotonic)
+
+    def get_time(self) -> str:
+        """
+        Returns the current time in ISO 8601 format.
+        """
+        return self.now().isoformat()
+
+    def check_drift(self) -> float:
+        """
+        Compare the anchored time to the system clock, and anchor again if they drifted apart.
+
+        Returns
+        -------
+        float
+            The drift in seconds, positive if the system clock is ahead.
+        """
+        drift = (datetime.now(pytz.UTC) - self.now()).total_seconds()
+        if abs(drift) > self.max_drift:
+            logging.warning(f"Clock drifted {drift:.3f} seconds from the system clock, anchoring again")
+            self.anchor()
+        return drift
+
+    def start(self) -> None:
+        """
+        Start the background drift check, if it is not running yet.
+        """
+        if self.thread is not None or self.resync_interval <= 0:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="clock", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.resync_interval):
+            try:
+                self.check_drift()
+            except Exception as e:
+                logging.error(f"Error checking the clock drift: {e}")
+
+    def stop(self) -> None:
+        """
+        Stop the background drift check.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+# The clock shared by the whole application, so the time is only anchored once per boot
+clock = Clock()
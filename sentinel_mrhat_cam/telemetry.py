@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+from .static_config import BATTERY_UEVENT_PATH, CHARGER_UEVENT_PATH, CPU_THERMAL_PATH, TELEMETRY_TTL
+
+
+@dataclass
+class TelemetrySnapshot:
+    """
+    The hardware values at a point in time. A value is None if its source could not be read.
+
+    Temperatures are in degrees Celsius, voltages in volts, currents in amperes.
+    """
+    cpu_temp: Optional[float] = None
+    battery_temp: Optional[float] = None
+    battery_percentage: Optional[int] = None
+    battery_voltage_now: Optional[float] = None
+    battery_voltage_avg: Optional[float] = None
+    battery_current_now: Optional[float] = None
+    battery_current_avg: Optional[float] = None
+    charger_voltage_now: Optional[float] = None
+    charger_current_now: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Telemetry:
+    """
+    Reads the telemetry values straight from sysfs, and caches them.
+
+    The files are opened once, and re-read with ``pread`` at offset 0, which makes the kernel
+    generate the content again. Reading a source takes microseconds, instead of starting
+    `upower`, `cat` and the gpiozero machinery for every message.
+
+    Every source has its own time to live: a value is only read again if it is older than that,
+    e.g. the battery charge changes slowly, while the CPU temperature follows the load.
+
+    Parameters
+    ----------
+    battery_path : str, optional
+        The uevent file of the battery (``POWER_SUPPLY_*`` values).
+    charger_path : str, optional
+        The uevent file of the charger.
+    thermal_path : str, optional
+        The CPU thermal zone, in millidegrees Celsius.
+    ttl : Dict[str, float], optional
+        The time to live of the "cpu", "battery" and "charger" sources in seconds.
+
+    Examples
+    --------
+    >>> telemetry = Telemetry()
+    >>> snapshot = telemetry.snapshot()
+    >>> print(f"CPU temperature: {snapshot.cpu_temp}°C")
+    """
+
+    def __init__(self, battery_path: str = BATTERY_UEVENT_PATH, charger_path: str = CHARGER_UEVENT_PATH,
+                 thermal_path: str = CPU_THERMAL_PATH, ttl: Dict[str, float] = TELEMETRY_TTL) -> None:
+        self.ttl = ttl
+        self.fds: Dict[str, Optional[int]] = {
+            "cpu": self.open(thermal_path),
+            "battery": self.open(battery_path),
+            "charger": self.open(charger_path),
+        }
+        self.read_at: Dict[str, float] = {source: float("-inf") for source in self.fds}
+        self.current = TelemetrySnapshot()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def open(path: str) -> Optional[int]:
+        try:
+            return os.open(path, os.O_RDONLY)
+        except OSError as e:
+            logging.warning(f"Telemetry source is not available: {e}")
+            return None
+
+    def read(self, source: str) -> Optional[str]:
+        """
+        Read the current content of a source, None if it is not available.
+        """
+        fd = self.fds[source]
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 4096, 0).decode("utf-8")
+        except OSError as e:
+            logging.error(f"Failed to read the {source} telemetry: {e}")
+            return None
+
+    @staticmethod
+    def parse_uevent(content: str) -> Dict[str, int]:
+        """
+        Parse the numeric ``POWER_SUPPLY_*`` values of a uevent file.
+        """
+        values = {}
+        for line in content.splitlines():
+            key, _, value = line.partition("=")
+            if value.lstrip("-").isdigit():
+                values[key] = int(value)
+        return values
+
+    def refresh(self, source: str) -> None:
+        """
+        Read a source, and update its values in the current snapshot.
+        """
+        content = self.read(source)
+        if content is None:
+            return
+
+        snapshot = self.current
+        if source == "cpu":
+            try:
+                snapshot.cpu_temp = int(content) / 1000
+            except ValueError:
+                logging.error(f"Invalid CPU temperature: {content!r}")
+            return
+
+        values = self.parse_uevent(content)
+        if source == "battery":
+            # POWER_SUPPLY_TEMP is in tenths of a degree, the same value upower reports
+            snapshot.battery_temp = values["POWER_SUPPLY_TEMP"] / 10 if "POWER_SUPPLY_TEMP" in values else None
+            snapshot.battery_percentage = values.get("POWER_SUPPLY_CAPACITY")
+            snapshot.battery_voltage_now = values.get("POWER_SUPPLY_VOLTAGE_NOW", 0) / 1000000
+            snapshot.battery_voltage_avg = values.get("POWER_SUPPLY_VOLTAGE_AVG", 0) / 1000000
+            snapshot.battery_current_now = values.get("POWER_SUPPLY_CURRENT_NOW", 0) / 1000000
+            snapshot.battery_current_avg = values.get("POWER_SUPPLY_CURRENT_AVG", 0) / 1000000
+        else:
+            snapshot.charger_voltage_now = values.get("POWER_SUPPLY_VOLTAGE_NOW", 0) / 1000000
+            snapshot.charger_current_now = values.get("POWER_SUPPLY_CURRENT_NOW", 0) / 1000000
+
+    def snapshot(self) -> TelemetrySnapshot:
+        """
+        Returns the current values, reading again the sources whose values have expired.
+
+        Returns
+        -------
+        TelemetrySnapshot
+            A copy of the current values, it is not changed by later reads.
+        """
+        with self.lock:
+            now = time.monotonic()
+            for source, read_at in self.read_at.items():
+                if now - read_at >= self.ttl[source]:
+                    self.refresh(source)
+                    self.read_at[source] = now
+            return TelemetrySnapshot(**self.current.as_dict())
+
+    def close(self) -> None:
+        """
+        Close the files of the sources.
+        """
+        for fd in self.fds.values():
+            if fd is not None:
+                os.close(fd)
+        self.fds = {source: None for source in self.fds}
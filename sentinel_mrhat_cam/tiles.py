@@ -0,0 +1,203 @@
+import io
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .camera import Camera
+from .static_config import TILE_SIZE, TILE_THRESHOLD, TILE_KEYFRAME_INTERVAL
+
+
+class TileEncoder:
+    """
+    Encodes the frames of the "tiles" message format: a full keyframe from time to time,
+    and in between only the tiles of the grid whose content has changed.
+
+    The frame is split into a grid of ``tile_size x tile_size`` tiles. The change of every tile is
+    measured on a luminance thumbnail, as the difference from the tile as it was last sent,
+    so slow changes (e.g. the light of the sunrise) add up until the tile is sent again.
+    Every changed tile is encoded into its own small JPEG.
+
+    A keyframe is sent instead of the changed tiles if the last keyframe is `keyframe_interval` frames old,
+    if the resolution or the downscale factor of the camera has changed, or if more than
+    `MAX_DELTA_FRACTION` of the tiles have changed, because then the full frame is smaller.
+
+    Parameters
+    ----------
+    camera : Camera
+        The camera which captures the frames, it encodes the JPEG images.
+    tile_size : int, optional
+        The size of the tiles in full resolution pixels, a multiple of 32 so it can be
+        downscaled by any factor of `BitrateController.LADDER` and stays aligned with the chroma planes.
+    threshold : float, optional
+        A tile is sent if the difference is at least this much. The difference is between 0 and 1.
+    keyframe_interval : int, optional
+        Every this many frames a keyframe is sent.
+
+    Attributes
+    ----------
+    keyframe_id : int
+        Identifies the last keyframe, the delta frames refer to it.
+    since_keyframe : int
+        The number of frames since the last keyframe.
+    """
+
+    # The luminance is compared on a thumbnail downscaled by this factor, which also smooths out the sensor noise
+    THUMBNAIL_FACTOR = 8
+
+    # Send a keyframe if more than this fraction of the tiles have changed
+    MAX_DELTA_FRACTION = 0.5
+
+    def __init__(self, camera: Camera, tile_size: int = TILE_SIZE, threshold: float = TILE_THRESHOLD,
+                 keyframe_interval: int = TILE_KEYFRAME_INTERVAL) -> None:
+        self.camera = camera
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.reference: Optional[np.ndarray] = None
+        self.settings: Optional[Tuple[int, int, int]] = None
+        self.keyframe_id = 0
+        self.since_keyframe = 0
+
+    def thumbnail(self, image: np.ndarray) -> np.ndarray:
+        """
+        Create the luminance thumbnail of a frame, as int16 so the differences do not overflow.
+        """
+        if self.camera.format == "YUV420":
+            luma = Camera.split_planes(image, self.camera.width, self.camera.height)[0]
+        else:
+            # The green channel carries most of the luminance, and needs no conversion
+            luma = image[..., 1]
+        return Camera.downscale(luma, self.THUMBNAIL_FACTOR).astype(np.int16)
+
+    def tile_differences(self, thumbnail: np.ndarray) -> np.ndarray:
+        """
+        The largest absolute difference of the thumbnail pixels from the reference in every tile, between 0 and 1.
+
+        The largest difference is used instead of the mean, so a bird which covers only a small part of a tile
+        is still noticed, while the noise is averaged out by the thumbnail.
+
+        Returns
+        -------
+        ndarray
+            A ``(rows, columns)`` array.
+        """
+        step = self.tile_size // self.THUMBNAIL_FACTOR
+        rows, columns = (np.arange(0, size, step) for size in thumbnail.shape)
+        difference = np.abs(thumbnail - self.reference)
+        return np.maximum.reduceat(np.maximum.reduceat(difference, rows, axis=0), columns, axis=1) / 255
+
+    def region(self, row: int, column: int) -> Tuple[int, int, int, int]:
+        """
+        The ``(left, top, width, height)`` of a tile in full resolution pixels.
+        """
+        left, top = column * self.tile_size, row * self.tile_size
+        return (left, top, min(self.tile_size, self.camera.width - left),
+                min(self.tile_size, self.camera.height - top))
+
+    def encode(self, image: np.ndarray) -> Tuple[Dict[str, Any], bytes]:
+        """
+        Encode a frame into a keyframe or into the tiles which have changed.
+
+        Parameters
+        ----------
+        image : ndarray
+            The captured frame, as returned by `Camera.capture`.
+
+        Returns
+        -------
+        Tuple[Dict[str, Any], bytes]
+            The metadata which describes the tiles, and the JPEG images.
+            For a keyframe the image is the whole frame. For a delta frame the images of the changed
+            tiles are concatenated, and ``tiles`` lists the ``[row, column, length]`` of each of them.
+        """
+        thumbnail = self.thumbnail(image)
+        settings = (self.camera.width, self.camera.height, self.camera.scale)
+
+        changed: List[Tuple[int, int]] = []
+        keyframe = self.reference is None or settings != self.settings or \
+            self.since_keyframe + 1 >= self.keyframe_interval
+        if not keyframe:
+            differences = self.tile_differences(thumbnail)
+            changed = [tuple(index) for index in np.argwhere(differences >= self.threshold)]
+            keyframe = len(changed) > self.MAX_DELTA_FRACTION * differences.size
+
+        metadata: Dict[str, Any] = {"keyframe": keyframe, "tileSize": self.tile_size // self.camera.scale}
+        if keyframe:
+            self.reference = thumbnail
+            self.settings = settings
+            self.keyframe_id = (self.keyframe_id + 1) % 2 ** 32
+            self.since_keyframe = 0
+            metadata["keyframeId"] = self.keyframe_id
+            return metadata, self.camera.encode_jpeg(image)
+
+        step = self.tile_size // self.THUMBNAIL_FACTOR
+        tiles, images = [], []
+        for row, column in changed:
+            jpeg = self.camera.encode_jpeg(image, self.region(row, column))
+            tiles.append([int(row), int(column), len(jpeg)])
+            images.append(jpeg)
+            # Only the sent tiles are updated, so the receiver and the reference stay in sync
+            area = (slice(row * step, (row + 1) * step), slice(column * step, (column + 1) * step))
+            self.reference[area] = thumbnail[area]
+
+        self.since_keyframe += 1
+        logging.info(f"Delta frame: {len(tiles)} changed tiles, {sum(tile[2] for tile in tiles)} bytes")
+        metadata.update({"keyframeId": self.keyframe_id, "tiles": tiles})
+        return metadata, b"".join(images)
+
+
+class TileCompositor:
+    """
+    Rebuilds the frames of the "tiles" message format at the receiver,
+    by pasting the changed tiles onto the last keyframe.
+
+    Attributes
+    ----------
+    canvas : PIL.Image.Image or None
+        The current state of the frame, None until the first keyframe arrives.
+    keyframe_id : int or None
+        The ID of the keyframe the canvas is based on.
+    """
+
+    def __init__(self, quality: int = 95) -> None:
+        self.quality = quality
+        self.canvas: Optional[Any] = None
+        self.keyframe_id: Optional[int] = None
+
+    def add(self, metadata: Dict[str, Any], images: bytes) -> Optional[bytes]:
+        """
+        Apply a keyframe or a delta frame.
+
+        Parameters
+        ----------
+        metadata : Dict[str, Any]
+            The metadata of the message, as created by `TileEncoder.encode`.
+        images : bytes
+            The image block of the message.
+
+        Returns
+        -------
+        Optional[bytes]
+            The whole frame as JPEG, or None if the keyframe of a delta frame is missing.
+        """
+        # PIL is only needed at the receiver, the camera does not load it
+        from PIL import Image
+        if metadata["keyframe"]:
+            self.canvas = Image.open(io.BytesIO(images))
+            self.canvas.load()
+            self.keyframe_id = metadata["keyframeId"]
+            return images
+
+        if self.canvas is None or metadata["keyframeId"] != self.keyframe_id:
+            logging.warning(f"Dropping delta frame, keyframe {metadata['keyframeId']} was not received")
+            return None
+
+        tile_size = metadata["tileSize"]
+        offset = 0
+        for row, column, length in metadata["tiles"]:
+            tile = Image.open(io.BytesIO(images[offset:offset + length]))
+            self.canvas.paste(tile, (column * tile_size, row * tile_size))
+            offset += length
+
+        buffer = io.BytesIO()
+        self.canvas.save(buffer, format="JPEG", quality=self.quality)
+        return buffer.getvalue()
@@ -1,16 +1,28 @@
 import logging
 import json
-import io
-from typing import Dict, Any, Tuple
-from PIL import Image
-import pybase64
+import time
+from queue import Queue, Empty
+from typing import Dict, Any, Optional, Tuple, Union
 from datetime import datetime
 import numpy as np
 from .utils import log_execution_time
-from .static_config import IMAGETOPIC, MINIMUM_WAIT_TIME
-from .system import System, RTC
+from .static_config import IMAGETOPIC, MINIMUM_WAIT_TIME, IMAGE_CHUNK_SIZE, ADAPTIVE_BITRATE, CHANGE_DETECTION
+from .static_config import PREVIEW_FIRST, PREVIEW_WIDTH, FRAMEREQUESTTOPIC, FULLFRAMETOPIC
+from .static_config import OUTBOX_ENABLED, OUTBOX_BATCH_SIZE, OUTBOX_DRAIN_RATE
+from .static_config import POWER_SAMPLING, POWERREQUESTTOPIC, POWERDATATOPIC, ENERGYTOPIC, ENERGY_REPORT_INTERVAL
+from .message import BinaryMessage
+from .bitrate import BitrateController
+from .change_detection import ChangeDetector
+from .tiles import TileEncoder
+from .frame_store import FrameStore
+from .outbox import Outbox
+from .telemetry import Telemetry, TelemetrySnapshot
+from .power import PowerSampler
+from .energy import EnergyMeter
+from .system import RTC
 from .camera import Camera
 from .mqtt import MQTT
+from .connection import ConnectionManager
 from .schedule import Schedule
 from .logger import Logger
 
@@ -30,9 +42,45 @@ class Transmit:
         An instance of the Schedule class used to manage operation schedules.
     mqtt : MQTT
         An instance of the MQTT class used to handle MQTT communication.
+    connection : ConnectionManager
+        Connects `mqtt`, and hands out the publishers of the topics.
+    message_format : str
+        The format of the image message, "json", "binary" or "tiles".
+    bitrate : BitrateController or None
+        Adapts the image quality to the link, if `ADAPTIVE_BITRATE` is enabled.
+    change_detector : ChangeDetector or None
+        Skips the frames which barely changed, if `CHANGE_DETECTION` is enabled.
+    tiles : TileEncoder
+        Creates the keyframes and the delta frames of the "tiles" format.
+    frame_store : FrameStore or None
+        Keeps the full resolution frames, if `PREVIEW_FIRST` is enabled. Only a preview is sent with the message.
+    frame_requests : Queue
+        The timestamps of the full resolution frames requested by the backend, and whether the request was retained.
+    outbox : Outbox or None
+        Keeps the messages which could not be published, if `OUTBOX_ENABLED` is set.
+    receiving : bool
+        True once the message receiving is set up, and the connecting is started by `connect_mqtt`.
+    telemetry : Telemetry
+        Provides the hardware values which are sent along with the image.
+    power : Optional[PowerSampler]
+        Samples the battery and the charger if `POWER_SAMPLING` is enabled, it is started by the app.
+    power_window_start : float
+        The monotonic time the power summary of the next message starts at.
+    energy : EnergyMeter
+        Accounts the energy spent in the phases of sending an image.
+    next_energy_report : float
+        The monotonic time the next energy report is due at.
+    warm_start : bool
+        True if the app resumed from the snapshot of the previous boot, see `ResumeState`.
+    first_publish : Optional[float]
+        The time of the first image publish, in seconds since the boot.
+    init_timings : Dict[str, float]
+        The duration of the initialization tasks of the `App` in seconds.
     """
 
-    def __init__(self, camera: Camera, logger: Logger, schedule: Schedule, mqtt: MQTT) -> None:
+    def __init__(self, camera: Camera, logger: Logger, schedule: Schedule, mqtt: MQTT,
+                 message_format: str = "json", telemetry: Optional[Telemetry] = None,
+                 connection: Optional[ConnectionManager] = None) -> None:
         """
         Initializes the Transmit class with instances of Camera, Logger,
         Schedule, and MQTT classes.
@@ -47,16 +95,41 @@ class Transmit:
             An instance of the Schedule class used to manage transmission schedules.
         mqtt : MQTT
             An instance of the MQTT class used to handle MQTT communication.
+        message_format : str, optional
+            The format of the image message, either "json" (base64 image inside a JSON document)
+            "binary" (see `BinaryMessage`) or "tiles" (a `BinaryMessage` with a keyframe or
+            the changed tiles, see `TileEncoder`). Default is "json".
+        telemetry : Telemetry, optional
+            The telemetry service to use, a new one is created if not given.
+        connection : ConnectionManager, optional
+            The connection `mqtt` is shared through, a new one owning `mqtt` is created if not given.
         """
         self.camera = camera
         self.logger = logger
         self.schedule = schedule
         self.mqtt = mqtt
+        self.connection = connection if connection is not None else ConnectionManager(mqtt)
+        self.message_format = message_format
+        self.bitrate = BitrateController(mqtt.link) if ADAPTIVE_BITRATE else None
+        self.change_detector = ChangeDetector() if CHANGE_DETECTION else None
+        self.tiles = TileEncoder(camera)
+        self.frame_store = FrameStore() if PREVIEW_FIRST else None
+        self.frame_requests: Queue = Queue()
+        self.outbox = Outbox() if OUTBOX_ENABLED else None
+        self.receiving = False
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.power = PowerSampler() if POWER_SAMPLING else None
+        self.power_window_start = time.monotonic()
+        self.energy = EnergyMeter(self.power)
+        self.next_energy_report = time.monotonic() + ENERGY_REPORT_INTERVAL
+        self.warm_start = False
+        self.first_publish: Optional[float] = None
+        self.init_timings: Dict[str, float] = {}
 
     def log_hardware_info(self, hardware_info: Dict[str, Any]) -> None:
         """
-        Logs the provided hardware information to a file.
-        This file will be the input of a Matlab script which plots the system metrics.
+        Logs the provided hardware information.
+        The power profile for the Matlab scripts is written by the `EnergyMeter` to `ENERGY_LOG_PATH`.
 
         Parameters
         ----------
@@ -64,10 +137,6 @@ class Transmit:
             A dictionary containing hardware information such as CPU temperature,
             battery temperature, and other system metrics.
         """
-        # sudo nano /etc/systemd/system.conf log_entry = ", ".join(f"{k}={v}" for k, v in hardware_info.items())
-        # with open("hardware_log.txt", "a") as log_file:
-            # log_file.write(f"{log_entry}\n")
-
         logging.info(f"battery_voltage_now: {hardware_info['battery_voltage_now']}")
         logging.info(f"battery_voltage_avg: {hardware_info['battery_voltage_avg']}")
         logging.info(f"battery_current_now: {hardware_info['battery_current_now']}")
@@ -75,14 +144,63 @@ class Transmit:
         logging.info(f"charger_voltage_now: {hardware_info['charger_voltage_now']}")
         logging.info(f"charger_current_now: {hardware_info['charger_current_now']}")
 
+    def create_jpeg_image(self, image_array: np.ndarray) -> bytes:
+        """
+        Converts a numpy array representing an image into JPEG encoded bytes.
+
+        The encoding is done by the camera, because the layout of the array depends on
+        the pixel format the camera was configured with, and the camera holds the JPEG quality.
+        If `frame_store` is set, the image is downscaled to the preview size.
+
+        Parameters
+        ----------
+        image_array : numpy.ndarray
+            The image data as a numpy array, as returned by `Camera.capture`.
+
+        Returns
+        -------
+        bytes
+            The JPEG encoded image.
+
+        Raises
+        ------
+        ValueError
+            If the input image_array is not in a valid format that can be converted
+            into a JPEG image.
+        """
+        if self.frame_store is not None:
+            return self.camera.encode_jpeg(image_array, scale=self.preview_scale())
+        return self.camera.encode_jpeg(image_array)
+
+    def preview_scale(self) -> int:
+        """
+        The downscale factor of the preview images, at least `Camera.scale`.
+        """
+        return max(self.camera.scale, self.camera.width // PREVIEW_WIDTH)
+
+    def store_frame(self, image_array: np.ndarray, timestamp: str) -> None:
+        """
+        Encodes the frame in full resolution, and keeps it in `frame_store` until the backend requests it.
+
+        Parameters
+        ----------
+        image_array : numpy.ndarray
+            The image data as a numpy array, as returned by `Camera.capture`.
+        timestamp : str
+            The timestamp in ISO 8601 format, the backend requests the frame with it.
+        """
+        try:
+            self.frame_store.put(timestamp, self.camera.encode_jpeg(image_array, scale=1))
+        except Exception as e:
+            logging.error(f"Failed to store the full resolution frame: {e}")
+
     def create_base64_image(self, image_array: np.ndarray) -> str:
         """
         Converts a numpy array representing an image into a base64-encoded JPEG string.
 
         This method is used to transform raw image data, stored as a numpy array.
-        The image data is first converted into a PIL Image object,
-        then encoded into JPEG format, and finally converted into a base64 string
-        for transmission.
+        The image data is first encoded into JPEG format by `create_jpeg_image`,
+        and then converted into a base64 string for transmission.
 
         Parameters
         ----------
@@ -112,91 +230,225 @@ class Transmit:
         if image_array is None:
             return "Error: Camera was unable to capture the image."
 
-        image: Image.Image = Image.fromarray(image_array)
-        image_bytes: io.BytesIO = io.BytesIO()
-        image.save(image_bytes, format="JPEG")
-        image_data: bytes = image_bytes.getvalue()
+        # Only the JSON message format needs pybase64
+        import pybase64
+        return pybase64.b64encode(self.create_jpeg_image(image_array)).decode("utf-8")
 
-        return pybase64.b64encode(image_data).decode("utf-8")
+    def gather_telemetry(self, timestamp: str) -> Dict[str, Any]:
+        """
+        Collects the telemetry values which are sent along with the image.
 
-    @log_execution_time("Creating the json message")
-    def create_message(self, image_array: np.ndarray, timestamp: str) -> str:
+        Parameters
+        ----------
+        timestamp : str
+            The timestamp in ISO 8601 format.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The timestamp, CPU temperature, battery temperature and battery charge percentage,
+            and the statistics of the MQTT connection and of the outbound message classes.
+
+        Notes
+        -----
+        - The function also logs additional hardware information for further analysis.
+        - The values come from the cached `telemetry` service, no process is started.
         """
-        Creates a JSON message containing image data, timestamp, CPU temperature,
+        snapshot: TelemetrySnapshot = self.telemetry.snapshot()
+
+        logging.info(f"Battery temp: {snapshot.battery_temp}°C, percentage: {snapshot.battery_percentage} %, "
+                     f"CPU temp: {snapshot.cpu_temp}°C")
+
+        # Log hardware info to a file for further analysis
+        if snapshot.battery_voltage_now is not None:
+            self.log_hardware_info(snapshot.as_dict())
+
+        telemetry: Dict[str, Any] = {
+            "timestamp": timestamp,
+            "cpuTemp": snapshot.cpu_temp,
+            "batteryTemp": snapshot.battery_temp,
+            "batteryCharge": snapshot.battery_percentage,
+            "connection": self.connection.stats(),
+            "outbound": self.connection.scheduler.report(),
+        }
+        if self.change_detector is not None:
+            telemetry.update(self.change_detector.counters())
+        if self.outbox is not None:
+            telemetry.update(self.outbox.metrics())
+        if self.power is not None:
+            # The samples taken since the previous message
+            power = self.power.summary(self.power_window_start)
+            self.power_window_start = time.monotonic()
+            if power is not None:
+                telemetry["power"] = power
+        return telemetry
+
+    @log_execution_time("Creating the message")
+    def create_message(self, image_array: np.ndarray, timestamp: str) -> Union[str, bytes]:
+        """
+        Creates the image message containing image data, timestamp, CPU temperature,
         battery temperature, and battery charge percentage.
 
+        Depending on `message_format` the message is either a JSON document with the
+        base64-encoded image, a `BinaryMessage` with the raw JPEG bytes, or a `BinaryMessage`
+        with a keyframe or the changed tiles of the frame (see `TileEncoder`).
+
         Parameters
         ----------
         image_array : numpy.ndarray
-            The image data as a numpy array. This data is converted into a base64-encoded
-            JPEG string before being included in the JSON message.
+            The image data as a numpy array. This data is converted into a JPEG image
+            before being included in the message.
         timestamp : str
             The timestamp in ISO 8601 format.
 
         Returns
         -------
-        str
-            The whole JSON message as a string.
+        Union[str, bytes]
+            The whole JSON message as a string, or the binary message as bytes.
 
         Raises
         ------
         Exception
             If any error occurs during the process of creating the message, such as
-            failing to retrieve system information or converting the image to base64.
+            failing to retrieve system information or encoding the image.
             The exception is logged, and the error is re-raised.
 
         Notes
         -----
-        - The function also logs additional hardware information to a separate file for further analysis.
         - This method is decorated with `@log_execution_time`, which logs the time taken to execute the method.
+        - If the camera failed to capture the image, the binary format falls back to the JSON message,
+        so the error description can still be sent.
+        - If `bitrate` is set, the JPEG quality and the downscale factor are chosen by it.
+        - If `frame_store` is set, the full resolution frame is stored, and the message only
+        carries a preview (except for the "tiles" format).
         """
         try:
-            battery_info: Dict[str, Any] = System.get_battery_info()
-            hardware_info: Dict[str, Any] = System.gather_hardware_info()
-            cpu_temp: float = System.get_cpu_temperature()
-
-            logging.info(
-                f"Battery temp: {battery_info['temperature']}°C, percentage: {battery_info['percentage']} %, CPU temp: {cpu_temp}°C")
-            message: Dict[str, Any] = {
-                "timestamp": timestamp,
-                "image": self.create_base64_image(image_array),
-                "cpuTemp": cpu_temp,
-                "batteryTemp": battery_info["temperature"],
-                "batteryCharge": battery_info["percentage"]
-            }
-
-            # Log hardware info to a file for further analysis
-            if hardware_info:
-                self.log_hardware_info(hardware_info)
-
-            return json.dumps(message)
+            message: Dict[str, Any] = self.gather_telemetry(timestamp)
+            if self.bitrate is not None:
+                self.bitrate.apply(self.camera, self.schedule.effective_period)
+
+            if self.frame_store is not None and image_array is not None and self.message_format != "tiles":
+                self.store_frame(image_array, timestamp)
+                message["preview"] = True
+
+            full_frame = image_array is not None
+            if self.message_format == "tiles" and image_array is not None:
+                tile_metadata, images = self.tiles.encode(image_array)
+                message.update(tile_metadata)
+                full_frame = tile_metadata["keyframe"]
+                payload: Union[str, bytes] = BinaryMessage.pack(message, images)
+            elif self.message_format == "binary" and image_array is not None:
+                payload = BinaryMessage.pack(message, self.create_jpeg_image(image_array))
+            else:
+                message["image"] = self.create_base64_image(image_array)
+                payload = json.dumps(message)
+
+            # The size of the delta frames says nothing about the size of the next full image
+            if self.bitrate is not None and full_frame:
+                self.bitrate.record_message(len(payload))
+            return payload
 
         except Exception as e:
             logging.error(f"Problem creating the message: {e}")
             raise
 
+    def create_heartbeat(self, timestamp: str) -> str:
+        """
+        Creates a telemetry-only message, which is sent instead of a frame that did not change.
+
+        Parameters
+        ----------
+        timestamp : str
+            The timestamp in ISO 8601 format.
+
+        Returns
+        -------
+        str
+            The JSON message, the same as the image message without the "image" key.
+        """
+        return json.dumps(self.gather_telemetry(timestamp))
+
+    def build_message(self, image_array: np.ndarray, timestamp: str) -> Union[str, bytes]:
+        """
+        Creates the message of a captured frame, which is the image message, or a heartbeat
+        if change detection is enabled and the frame did not change enough since the last sent one.
+
+        Parameters
+        ----------
+        image_array : numpy.ndarray
+            The image data as a numpy array, as returned by `Camera.capture`.
+        timestamp : str
+            The timestamp in ISO 8601 format.
+
+        Returns
+        -------
+        Union[str, bytes]
+            The message created by `create_message` or by `create_heartbeat`.
+        """
+        with self.energy.phase("encode"):
+            if self.change_detector is not None and image_array is not None:
+                thumbnail = ChangeDetector.thumbnail(image_array, self.camera)
+                if not self.change_detector.should_send(thumbnail):
+                    return self.create_heartbeat(timestamp)
+            return self.create_message(image_array, timestamp)
+
     def connect_mqtt(self) -> None:
         """
-        Connect to the MQTT broker and initialize message receiving.
+        Initialize message receiving, and start connecting to the MQTT broker in the background.
+        The subscriptions are renewed by the client on every connection.
         """
-        self.mqtt.connect()
         self.mqtt.init_receive()
+        if self.frame_store is not None:
+            self.mqtt.subscribe(FRAMEREQUESTTOPIC, self.on_frame_request)
+        if self.power is not None:
+            self.mqtt.subscribe(POWERREQUESTTOPIC, self.on_power_request)
+        self.connection.start()
+        self.receiving = True
+
+    def on_frame_request(self, client, userdata, msg) -> None:
+        """
+        Queues a full resolution frame request of the backend, it is served by `serve_frame_requests`.
+
+        The request is a JSON message: ``{"timestamp": "<the timestamp of the preview>"}``.
+        """
+        if not msg.payload:
+            # The empty message which cleared a retained request
+            return
+        try:
+            self.frame_requests.put((json.loads(msg.payload)["timestamp"], msg.retain))
+        except Exception as e:
+            logging.error(f"Invalid frame request: {e}")
+
+    def on_power_request(self, client, userdata, msg) -> None:
+        """
+        Sends the raw power samples to `POWERDATATOPIC`, see `PowerSampler.dump`.
+
+        The request is an optional JSON message: ``{"seconds": <the length of the window>}``,
+        the whole buffer is sent if it is empty.
+        """
+        try:
+            seconds = json.loads(msg.payload).get("seconds") if msg.payload else None
+            start = time.monotonic() - seconds if seconds else None
+            self.connection.publisher(POWERDATATOPIC).publish_nowait(self.power.dump(start))
+        except Exception as e:
+            logging.error(f"Invalid power dump request: {e}")
 
-    def get_message(self) -> str:
+    def get_message(self) -> Union[str, bytes]:
         """
         This method integrates the process of capturing an image, obtaining the
         current system time, and gathering additional system data into a single
-        JSON message.
+        message.
 
         Returns
         -------
-        str
-            A JSON string containing the image data, timestamp, CPU temperature, battery temperature,
-            and battery charge percentage as a string.
+        Union[str, bytes]
+            A JSON string or a binary message containing the image data, timestamp, CPU temperature,
+            battery temperature, and battery charge percentage.
         """
-        image_raw: np.ndarray = self.camera.capture()
+        with self.energy.phase("capture"):
+            image_raw: np.ndarray = self.camera.capture()
         timestamp: str = RTC.get_time()
-        message: str = self.create_message(image_raw, timestamp)
+        message: Union[str, bytes] = self.build_message(image_raw, timestamp)
         return message
 
     @log_execution_time("Taking a picture and sending it")
@@ -206,8 +458,8 @@ class Transmit:
 
         This method orchestrates the entire process of capturing an image, gathering
         system data, creating a message, and transmitting it to a predefined MQTT topic.
-        If the MQTT client is not already connected, the method attempts to establish
-        the connection in a blocking manner to ensure the message is sent successfully.
+        The client is connected in the background, if it is not connected, the message
+        is put into the outbox without waiting for the broker.
 
         Raises
         ------
@@ -226,19 +478,198 @@ class Transmit:
         taken to execute the method.
         """
         try:
-            message: str = self.get_message()
-
-            if not self.mqtt.client.is_connected():
-                self.connect_mqtt()
-            if self.logger.mqtt is None:
-                self.logger.start_mqtt_logging()
-
-            self.mqtt.publish(message, IMAGETOPIC)
+            message: Union[str, bytes] = self.get_message()
+            self.publish_message(message)
 
         except Exception as e:
             logging.error(f"Error in run method: {e}")
             raise
 
+    def publish_message(self, message: Union[str, bytes]) -> None:
+        """
+        Publishes an image message to the image topic. If it succeeds, the messages waiting in the outbox
+        and the pending frame requests are sent too.
+
+        Parameters
+        ----------
+        message : Union[str, bytes]
+            The message created by `create_message`.
+        """
+        if self.send(message, IMAGETOPIC):
+            self.energy.delivered()
+            if self.first_publish is None:
+                # The monotonic clock starts at the boot
+                self.first_publish = time.monotonic()
+                logging.info(f"First image published {self.first_publish:.1f} seconds after the boot "
+                             f"({'warm' if self.warm_start else 'cold'} start)")
+            self.drain_outbox()
+            self.serve_frame_requests()
+            if time.monotonic() >= self.next_energy_report:
+                self.report_energy()
+
+    def send(self, message: Union[str, bytes], topic: str) -> bool:
+        """
+        Publishes a message to a topic, or puts it into the outbox if that fails.
+
+        Parameters
+        ----------
+        message : Union[str, bytes]
+            The message to send.
+        topic : str
+            The topic to publish the message to.
+
+        Returns
+        -------
+        bool
+            True if the message was published, False if it was put into the outbox.
+
+        Raises
+        ------
+        SystemExit
+            If the message could not be published, and the outbox is disabled.
+        """
+        if self.ensure_connected() and self.publish(message, topic):
+            return True
+
+        if self.outbox is None:
+            logging.error(f"Failed to publish the message to {topic}, restarting script...")
+            exit(1)
+        self.outbox.append(topic, message)
+        logging.warning(f"Failed to publish the message to {topic}, stored in the outbox "
+                        f"({self.outbox.depth} messages, {self.outbox.size} bytes waiting)")
+        return False
+
+    def ensure_connected(self, timeout: float = 0) -> bool:
+        """
+        Starts connecting to the MQTT broker in the background if it is not started yet, and starts
+        the MQTT logging once the broker accepted the connection.
+
+        By default it does not wait for the connection, so the capturing is not held up while the broker
+        is not reachable, the messages go to the outbox meanwhile.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum seconds to wait for the connection.
+
+        Returns
+        -------
+        bool
+            True if the client is connected.
+        """
+        if not self.receiving:
+            self.connect_mqtt()
+        if not self.connection.wait():
+            if not timeout:
+                return False
+            with self.energy.phase("connect"):
+                if not self.connection.wait(timeout):
+                    return False
+        if self.logger.mqtt is None:
+            self.logger.start_mqtt_logging()
+        return True
+
+    def publish(self, message: Union[str, bytes], topic: str) -> bool:
+        """
+        Publishes a message over the connected client.
+        If `IMAGE_CHUNK_SIZE` is set, the message is sent in resumable chunks.
+
+        Returns
+        -------
+        bool
+            True if the broker acknowledged the message.
+        """
+        publisher = self.connection.publisher(topic)
+        with self.energy.phase("publish"):
+            if IMAGE_CHUNK_SIZE:
+                return publisher.publish_chunked(message, IMAGE_CHUNK_SIZE)
+            return publisher.publish(message) is not None
+
+    def drain_outbox(self) -> None:
+        """
+        Sends the oldest messages of the outbox, at most `OUTBOX_BATCH_SIZE` of them,
+        at most `OUTBOX_DRAIN_RATE` bytes per second, so the new images are not held up for long.
+
+        The messages are published without waiting for each acknowledgement (see `PublishWindow`), and they are
+        committed in order, up to the first one which was not delivered. The messages after it are sent again
+        with the next batch, even if they were delivered.
+        """
+        if self.outbox is None or not self.outbox.depth:
+            return
+
+        sent = 0
+        items = self.outbox.peek(OUTBOX_BATCH_SIZE)
+        if IMAGE_CHUNK_SIZE:
+            # A chunked transfer waits for its own acknowledgements
+            for item in items:
+                start = time.monotonic()
+                if not self.publish(item.message, item.topic):
+                    break
+                self.outbox.commit(item)
+                sent += 1
+                self.throttle_outbox(item.size, start)
+        else:
+            with self.energy.phase("publish"):
+                handles = []
+                for item in items:
+                    start = time.monotonic()
+                    handles.append(self.connection.publisher(item.topic).publish_async(item.message))
+                    self.throttle_outbox(item.size, start)
+                for item, handle in zip(items, handles):
+                    if not handle.wait():
+                        break
+                    self.outbox.commit(item)
+                    sent += 1
+
+        logging.info(f"Sent {sent} messages from the outbox, "
+                     f"{self.outbox.depth} messages ({self.outbox.size} bytes) waiting")
+
+    @staticmethod
+    def throttle_outbox(size: int, start: float) -> None:
+        """
+        Sleep, so sending a message of `size` bytes which started at `start` takes at least
+        as long as `OUTBOX_DRAIN_RATE` allows.
+        """
+        if OUTBOX_DRAIN_RATE:
+            time.sleep(max(0.0, size / OUTBOX_DRAIN_RATE - (time.monotonic() - start)))
+
+    def report_energy(self) -> None:
+        """
+        Sends the report of the `EnergyMeter` to `ENERGYTOPIC`, the next one is due `ENERGY_REPORT_INTERVAL`
+        seconds later. The report also tells if the app resumed from a snapshot, and the time of the first publish.
+        """
+        self.next_energy_report = time.monotonic() + ENERGY_REPORT_INTERVAL
+        report = self.energy.report()
+        report["boot"] = {"warmStart": self.warm_start,
+                          "timeToFirstPublish": round(self.first_publish, 3) if self.first_publish else None,
+                          "init": self.init_timings}
+        self.send(json.dumps(report), ENERGYTOPIC)
+
+    def serve_frame_requests(self) -> None:
+        """
+        Sends the requested full resolution frames to `FULLFRAMETOPIC`, as binary messages.
+
+        A frame which is not in the store anymore is answered with a JSON message with an "error" key.
+        Retained requests are cleared once served, so the backend can leave a request for a device
+        which is shut down, and it is served after the next boot.
+        """
+        while True:
+            try:
+                timestamp, retained = self.frame_requests.get_nowait()
+            except Empty:
+                return
+
+            jpeg = self.frame_store.get(timestamp)
+            if jpeg is None:
+                logging.warning(f"Requested frame {timestamp} is not in the frame store")
+                self.send(json.dumps({"timestamp": timestamp, "error": "Frame not found"}), FULLFRAMETOPIC)
+            else:
+                logging.info(f"Sending the full resolution frame {timestamp} ({len(jpeg)} bytes)")
+                self.send(BinaryMessage.pack({"timestamp": timestamp, "fullResolution": True}, jpeg), FULLFRAMETOPIC)
+
+            if retained:
+                self.connection.publisher(FRAMEREQUESTTOPIC).publish_nowait(b"", retain=True)
+
     def transmit_message_with_time_measure(self) -> Tuple[float, datetime]:
         """
         Run the `transmit_message` method while timing how long it takes to complete.
@@ -253,12 +684,10 @@ class Transmit:
             - datetime: The ending time of the transmiting process, represented as a datetime object.
         """
         try:
-            start_time: str = RTC.get_time()
+            start_time: float = time.monotonic()
             self.transmit_message()
-            end_time: str = RTC.get_time()
-            elapsed_time: float = (datetime.fromisoformat(end_time) -
-                                   datetime.fromisoformat(start_time)).total_seconds()
-            waiting_time: float = self.schedule.period - elapsed_time
+            elapsed_time: float = time.monotonic() - start_time
+            waiting_time: float = self.schedule.effective_period - elapsed_time
         except Exception as e:
             logging.error(f"Error in run_with_time_measure method: {e}")
         return max(waiting_time, MINIMUM_WAIT_TIME)
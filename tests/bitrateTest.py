@@ -0,0 +1,73 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+from sentinel_mrhat_cam.bitrate import LinkEstimator, BitrateController
+from sentinel_mrhat_cam.camera import Camera
+
+
+def link_with(throughput, latency, sizes=(200, 1_000_000, 500_000)):
+    link = LinkEstimator()
+    for size in sizes:
+        link.record(size, latency + size / throughput)
+    return link
+
+
+def test_estimate_fits_throughput_and_latency():
+    throughput, latency = link_with(100_000, 0.3).estimate()
+    assert throughput == pytest.approx(100_000)
+    assert latency == pytest.approx(0.3)
+
+
+def test_estimate_without_size_spread_is_conservative():
+    link = LinkEstimator()
+    link.record(1000, 1.0)
+    assert link.estimate() == (1000.0, 0.0)
+    assert LinkEstimator().estimate() is None
+
+
+def test_controller_keeps_full_quality_on_good_link():
+    camera = MagicMock()
+    controller = BitrateController(link_with(10_000_000, 0.05), target_fraction=0.5)
+    controller.record_message(1_500_000)
+    controller.apply(camera, period=30)
+    assert (camera.scale, camera.quality) == (1, 95)
+
+
+def test_controller_steps_down_then_recovers_one_step_at_a_time():
+    camera = MagicMock()
+    controller = BitrateController(link_with(20_000, 0.5), target_fraction=0.5)
+    controller.record_message(1_500_000)
+    controller.apply(camera, period=30)
+
+    # 15 s budget on a 20 kB/s link: at most ~290 kB per image
+    low_level = controller.level
+    assert low_level > 0
+    assert controller.predicted_time(low_level, 20_000, 0.5) <= 15
+
+    controller.link = link_with(10_000_000, 0.05)
+    controller.record_message(1_500_000 * BitrateController.relative_size(low_level)
+                              / BitrateController.relative_size(0))
+    controller.apply(camera, period=30)
+    assert controller.level == low_level - 1
+
+
+def test_controller_uses_smallest_settings_when_nothing_fits():
+    controller = BitrateController(link_with(100, 2), target_fraction=0.5)
+    controller.record_message(1_500_000)
+    controller.apply(MagicMock(), period=10)
+    assert controller.level == len(BitrateController.LADDER) - 1
+
+
+@pytest.mark.parametrize("shape", [(8, 12), (8, 12, 3)])
+def test_camera_downscale(shape):
+    image = np.arange(np.prod(shape), dtype=np.uint8).reshape(shape)
+    small = Camera.downscale(image, 2)
+    assert small.shape == (4, 6) + shape[2:]
+    assert small[0, 0].tolist() == image[:2, :2].mean(axis=(0, 1)).astype(np.uint8).tolist()
+
+
+def test_camera_encodes_downscaled_jpeg():
+    camera = Camera({'quality': 'HD'})
+    full = camera.capture_jpeg()
+    camera.scale = 2
+    assert len(camera.capture_jpeg()) < len(full) / 2
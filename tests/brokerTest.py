@@ -0,0 +1,40 @@
+import threading
+from sentinel_mrhat_cam.connection import ConnectionManager
+from sentinel_mrhat_cam.mqtt import MQTT
+from benchmarks.broker import Broker, matches
+from benchmarks.end_to_end import run_resolution
+
+
+def test_topic_filters():
+    assert matches("sentinel/#", "sentinel/cam4/full")
+    assert matches("+/log", "cam4/log") and not matches("+/log", "cam4/log/old")
+    assert not matches("sentinel/cam4", "sentinel")
+
+
+def test_client_publishes_through_the_broker_stand_in():
+    with Broker() as broker:
+        mqtt = MQTT()
+        mqtt.broker, mqtt.port = broker.host, broker.port
+        connection = ConnectionManager(mqtt)
+        received = threading.Event()
+        connection.subscribe("cam4/request", lambda client, userdata, msg: received.set())
+        try:
+            connection.connect(timeout=5)
+            assert connection.publisher("sentinel/cam4").publish(b"\xff" * 100000) is not None
+            assert connection.publisher("cam4/request").publish_nowait(b"full", retain=True)
+            assert received.wait(5)
+        finally:
+            connection.disconnect()
+
+    assert [(message.topic, message.size, message.qos) for message in broker.received] == \
+        [("sentinel/cam4", 100000, 2), ("cam4/request", 4, 1)]
+    assert broker.retained == {"cam4/request": b"full"}
+
+
+def test_pipeline_runs_end_to_end(monkeypatch):
+    monkeypatch.setattr(ConnectionManager, "_shared", None)
+    result = run_resolution("HD", frames=2, warmup=1, message_format="binary")
+
+    assert result["frames"] == 2 and result["fps"] > 0
+    assert 0 < result["latency_ms"]["p50"] <= result["latency_ms"]["max"]
+    assert result["bytes_per_frame"] > 0 and set(result["stages"]) == {"capture", "encode", "publish"}
@@ -1,6 +1,13 @@
+from sentinel_mrhat_cam import camera as camera_module
 from sentinel_mrhat_cam.camera import Camera
+import importlib.util
+import os
+import sys
+import types
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, NonCallableMagicMock
+import numpy as np
 
 Picamera2 = MagicMock()
 controls = MagicMock()
@@ -48,3 +55,122 @@ class TestCamera(unittest.TestCase):
         self.assertEqual(camera.height, 1440)
         self.assertEqual(camera.quality, 95)
         mock_logging_error.assert_called_once_with("Invalid quality specified: invalid. Defaulting to 3K quality.")
+
+
+class TestCameraOnThePi(unittest.TestCase):
+    def test_real_camera_is_not_emulated(self):
+        # Stand-ins of the picamera2 and libcamera packages of the Pi, which import without errors
+        picamera2 = types.ModuleType("picamera2")
+        picamera2.Picamera2 = NonCallableMagicMock
+        libcamera = types.ModuleType("libcamera")
+        libcamera.controls = MagicMock()
+        # A fresh copy of the module, which imports them
+        spec = importlib.util.spec_from_file_location("sentinel_mrhat_cam.camera_on_the_pi", camera_module.__file__)
+        module = importlib.util.module_from_spec(spec)
+        with patch.dict(sys.modules, {"picamera2": picamera2, "libcamera": libcamera}):
+            spec.loader.exec_module(module)
+
+        self.assertFalse(module.Camera({'quality': 'HD'}).emulated)
+
+
+class TestCameraJpeg(unittest.TestCase):
+    def setUp(self):
+        self.camera = Camera({'quality': 'HD'})
+
+    def test_emulated_camera(self):
+        self.assertTrue(self.camera.emulated)
+        image = self.camera.capture()
+        if self.camera.format == "YUV420":
+            self.assertEqual(image.shape, (1080 * 3 // 2, 1920))
+        else:
+            self.assertEqual(image.shape, (1080, 1920, 3))
+
+    def test_capture_jpeg_honours_quality(self):
+        self.camera.quality = 90
+        high = self.camera.capture_jpeg()
+        self.camera.quality = 30
+        low = self.camera.capture_jpeg()
+
+        self.assertEqual(high[:2], b"\xff\xd8")
+        self.assertLess(len(low), len(high))
+
+    def test_encode_jpeg_rgb_fallback(self):
+        self.camera.format = "BGR888"
+        jpeg = self.camera.capture_jpeg()
+        # The reused buffer must not leak data from a previous, larger image
+        self.camera.quality = 10
+        self.assertLess(len(self.camera.capture_jpeg()), len(jpeg))
+
+    def test_split_planes(self):
+        rgb = np.full((4, 8, 3), (255, 0, 0), dtype=np.uint8)
+        y, u, v = Camera.split_planes(Camera.rgb_to_yuv420(rgb), 8, 4)
+
+        self.assertEqual((y.shape, u.shape, v.shape), ((4, 8), (2, 4), (2, 4)))
+        self.assertTrue(np.all(y == 76))
+        self.assertTrue(np.all(v == 255))
+
+    def test_set_resolution_restarts_running_camera(self):
+        self.camera.start()
+        self.camera.cam.reset_mock()
+        self.camera.set_resolution('4K')
+
+        self.camera.cam.stop.assert_called_once()
+        self.camera.cam.start.assert_called_once_with(show_preview=False)
+        self.assertEqual((self.camera.width, self.camera.height), (3840, 2160))
+
+    def test_wait_for_focus(self):
+        from sentinel_mrhat_cam import camera as camera_module
+        states = camera_module.controls.AfStateEnum
+        self.camera.emulated = False
+        self.camera.cam = MagicMock()
+        self.camera.cam.capture_metadata.side_effect = [{"AfState": states.Scanning}, {"AfState": states.Focused}]
+        self.assertTrue(self.camera.wait_for_focus(timeout=1))
+
+        self.camera.cam.capture_metadata.side_effect = None
+        self.camera.cam.capture_metadata.return_value = {"AfState": states.Failed}
+        self.assertFalse(self.camera.wait_for_focus(timeout=1))
+
+
+class TestCameraFocus(unittest.TestCase):
+    def setUp(self):
+        self.camera = Camera({'quality': 'HD'})
+        self.camera.emulated = False
+        self.camera.focus_cache = True
+        self.camera.cam = MagicMock()
+        self.camera.cam.capture_metadata.return_value = {"LensPosition": 2.5}
+        self.sharp = np.tile(np.array([[0, 255], [255, 0]], dtype=np.uint8), (240, 320))
+        self.blurred = np.full((480, 640), 128, dtype=np.uint8)
+        self.directory = tempfile.TemporaryDirectory()
+        self.camera.focus_state_path = os.path.join(self.directory.name, "focus_state.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sharpness(self):
+        self.assertGreater(Camera.sharpness(self.sharp), Camera.sharpness(self.blurred))
+        self.assertEqual(Camera.sharpness(self.blurred), 0)
+
+    def test_autofocus_without_cache(self):
+        self.camera.cam.capture_array.return_value = self.sharp
+        self.assertTrue(self.camera.focus())
+
+        self.camera.cam.autofocus_cycle.assert_called_once()
+        self.assertEqual(self.camera.load_focus()["lensPosition"], 2.5)
+
+    def test_cached_position_skips_autofocus(self):
+        self.camera.cam.capture_array.return_value = self.sharp
+        self.camera.lens_position = 1.5
+        self.camera.save_focus(Camera.sharpness(self.sharp))
+
+        self.assertTrue(self.camera.focus())
+        self.camera.cam.autofocus_cycle.assert_not_called()
+        self.assertEqual(self.camera.lens_position, 1.5)
+
+    def test_sharpness_drop_runs_autofocus(self):
+        self.camera.lens_position = 1.5
+        self.camera.save_focus(Camera.sharpness(self.sharp))
+        self.camera.cam.capture_array.return_value = self.blurred
+
+        self.camera.focus()
+        self.camera.cam.autofocus_cycle.assert_called_once()
+        self.assertEqual(self.camera.lens_position, 2.5)
@@ -0,0 +1,81 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+from sentinel_mrhat_cam.change_detection import ChangeDetector
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.transmit import Transmit
+
+
+def scene(seed=0, width=640, height=480):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 200, width, dtype=np.float32)
+    y = np.linspace(0, 50, height, dtype=np.float32)[:, None]
+    luma = x + y + rng.normal(0, 12, (height, width))
+    return np.clip(luma, 0, 255).astype(np.uint8)
+
+
+def thumbnail(frame):
+    return Camera.downscale(frame, 8)
+
+
+def test_thumbnail_of_yuv_and_rgb_frames():
+    camera = Camera({"quality": "HD"})
+    camera.format = "YUV420"
+    yuv = Camera.rgb_to_yuv420(Camera.synthetic_rgb(camera.width, camera.height))
+    assert ChangeDetector.thumbnail(yuv, camera).shape == (38, 68)
+
+    camera.format = "BGR888"
+    rgb = Camera.synthetic_rgb(camera.width, camera.height)
+    small = ChangeDetector.thumbnail(rgb, camera)
+    assert small.dtype == np.uint8
+    assert small.shape == (38, 68)
+
+
+@pytest.mark.parametrize("metric", ["mad", "histogram"])
+def test_noise_is_suppressed_and_changes_are_sent(metric):
+    detector = ChangeDetector(metric=metric, threshold=0.02, keyframe_interval=100, state_path=None)
+    assert detector.should_send(thumbnail(scene(0)))
+    assert not detector.should_send(thumbnail(scene(1)))
+
+    changed = scene(2)
+    changed[100:400, 100:400] = 250
+    assert detector.should_send(thumbnail(changed))
+    assert detector.counters() == {"framesSent": 2, "framesSuppressed": 1}
+
+
+def test_keyframe_is_forced():
+    detector = ChangeDetector(threshold=1.0, keyframe_interval=3, state_path=None)
+    decisions = [detector.should_send(thumbnail(scene())) for _ in range(7)]
+    assert decisions == [True, False, False, True, False, False, True]
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / "state.npz")
+    detector = ChangeDetector(state_path=path)
+    detector.should_send(thumbnail(scene(0)))
+    detector.should_send(thumbnail(scene(1)))
+
+    restarted = ChangeDetector(state_path=path)
+    assert restarted.counters() == {"framesSent": 1, "framesSuppressed": 1}
+    assert restarted.since_keyframe == 1
+    assert not restarted.should_send(thumbnail(scene(3)))
+
+
+def test_invalid_metric():
+    with pytest.raises(ValueError):
+        ChangeDetector(metric="ssim", state_path=None)
+
+
+def test_transmit_sends_heartbeat_for_unchanged_frame(monkeypatch):
+    camera = Camera({"quality": "HD"})
+    transmit = Transmit(camera, None, None, MagicMock())
+    transmit.change_detector = ChangeDetector(keyframe_interval=100, state_path=None)
+    monkeypatch.setattr(transmit, "gather_telemetry", lambda timestamp: {"timestamp": timestamp})
+
+    frame = camera.capture()
+    first = transmit.build_message(frame, "2024-01-01T00:00:00")
+    second = transmit.build_message(frame, "2024-01-01T00:00:05")
+
+    assert "image" in json.loads(first)
+    assert json.loads(second) == {"timestamp": "2024-01-01T00:00:05"}
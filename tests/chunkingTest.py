@@ -0,0 +1,153 @@
+import random
+import pytest
+from unittest.mock import MagicMock, patch
+from sentinel_mrhat_cam.chunking import ChunkedMessage, ChunkedTransfer, ChunkAssembler
+from sentinel_mrhat_cam.connection import ConnectionManager
+from sentinel_mrhat_cam.mqtt import MQTT
+from sentinel_mrhat_cam.static_config import IMAGETOPIC
+
+
+@pytest.fixture
+def message():
+    return bytes(random.Random(0).getrandbits(8) for _ in range(10000))
+
+
+def test_split_and_reassemble_out_of_order(message):
+    chunks = ChunkedMessage.split(message, 1024)
+    assert len(chunks) == 10
+
+    random.Random(1).shuffle(chunks)
+    assembler = ChunkAssembler()
+    results = [assembler.add(chunk) for chunk in chunks + chunks[:2]]
+
+    # Only the chunk completing the transfer returns the message, late duplicates are ignored
+    assert results[:9] == [None] * 9
+    assert results[9] == message
+    assert results[10:] == [None, None]
+
+
+def test_str_message_is_encoded():
+    chunks = ChunkedMessage.split('{"image": "é"}', 4)
+    assembler = ChunkAssembler()
+    assert [assembler.add(chunk) for chunk in chunks][-1] == '{"image": "é"}'.encode()
+
+
+def test_corrupted_chunk_is_rejected(message):
+    chunk = bytearray(ChunkedMessage.split(message, 1024)[3])
+    chunk[-1] ^= 0xFF
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        ChunkAssembler().add(bytes(chunk))
+
+
+def test_oldest_incomplete_transfer_is_dropped(message):
+    assembler = ChunkAssembler(max_transfers=2)
+    for transfer_id in range(3):
+        assembler.add(ChunkedMessage.split(message, 1024, transfer_id)[0])
+    assert list(assembler.transfers) == [1, 2]
+
+
+def test_chunk_with_a_different_total_is_rejected(message):
+    assembler = ChunkAssembler()
+    chunks = ChunkedMessage.split(message, 1024, transfer_id=7)
+    assembler.add(chunks[0])
+    # The same transfer ID, split into 20 chunks
+    with pytest.raises(ValueError, match="has 20 chunks, the earlier chunks have 10"):
+        assembler.add(ChunkedMessage.split(message, 512, transfer_id=7)[15])
+
+    assert [assembler.add(chunk) for chunk in chunks[1:]][-1] == message
+
+
+def test_chunk_out_of_range_is_rejected(message):
+    chunk = bytearray(ChunkedMessage.split(message, 1024, transfer_id=7)[9])
+    # Sequence number 10 of 10 chunks
+    chunk[10:14] = (10).to_bytes(4, "big")
+    with pytest.raises(ValueError, match="out of range"):
+        ChunkAssembler().add(bytes(chunk))
+
+
+def publish_handle(delivered):
+    return MagicMock(**{"wait.return_value": delivered, "delivered": delivered})
+
+
+def test_only_unacknowledged_chunks_are_resent(message):
+    transfer = ChunkedTransfer(message, 1024)
+    # The link drops after the first 4 chunks were acknowledged
+    publish = MagicMock(side_effect=[publish_handle(seq < 4) for seq in range(10)])
+    transfer.send(publish, ack_timeout=1)
+    assert transfer.pending() == list(range(4, 10))
+
+    publish = MagicMock(return_value=publish_handle(True))
+    transfer.send(publish, ack_timeout=1)
+
+    assert transfer.complete
+    resent = [call.args[0] for call in publish.call_args_list]
+    assert resent == transfer.chunks[4:]
+
+
+def acknowledging_mqtt():
+    mqtt = MQTT()
+    mqtt.client = MagicMock()
+    mqtt.client.is_connected.return_value = True
+    mids = iter(range(1, 100))
+
+    def publish(topic, payload, qos, retain, properties):
+        info = MagicMock(rc=0, mid=next(mids))
+        # The broker acknowledges before the window registers the chunk
+        mqtt.window.on_publish(None, None, info.mid)
+        return info
+
+    mqtt.window.client = MagicMock(**{"publish.side_effect": publish})
+    return mqtt
+
+
+def test_chunks_go_through_the_window_and_the_scheduler(message):
+    mqtt = acknowledging_mqtt()
+    connection = ConnectionManager(mqtt)
+    assert connection.publisher(IMAGETOPIC).publish_chunked(message, 1024)
+
+    assert mqtt.window.client.publish.call_count == 10 and not mqtt.window.early_acks
+    assert connection.scheduler.stats["image"].messages == 10 and connection.scheduler.in_flight["image"] == 0
+    # The transfer is one sample of the link, not ten
+    assert [size for size, _ in mqtt.link.samples] == [ChunkedTransfer(message, 1024).size]
+
+
+def test_link_sample_of_a_str_message_is_in_bytes():
+    mqtt = acknowledging_mqtt()
+    message = "\u00e9" * 3000
+    assert mqtt.publish_chunked(message, "topic", 1024)
+
+    size = ChunkedTransfer(message, 1024).size
+    assert size > len(message.encode("utf-8")) > len(message)
+    assert [size for size, _ in mqtt.link.samples] == [size]
+
+
+def test_publish_chunked_reconnects_and_resends(message):
+    mqtt = MQTT()
+    mqtt.client = MagicMock()
+    mqtt.client.is_connected.return_value = True
+    rounds = iter([False, True])
+
+    def send(self, publish, ack_timeout):
+        if next(rounds):
+            self.acknowledged.update(range(len(self.chunks)))
+
+    with patch.object(ChunkedTransfer, "send", send), patch.object(MQTT, "reconnect") as mock_reconnect:
+        mqtt.publish_chunked(message, "topic", 1024)
+
+    mock_reconnect.assert_called_once()
+
+
+def test_publish_chunked_gives_up(message):
+    mqtt = MQTT()
+    mqtt.client = MagicMock()
+    with patch.object(ChunkedTransfer, "send"), patch.object(MQTT, "reconnect"):
+        assert not mqtt.publish_chunked(message, "topic", 1024)
+
+
+def test_publish_chunked_without_broker(message):
+    mqtt = MQTT()
+    mqtt.client = MagicMock()
+    mqtt.client.is_connected.return_value = False
+    with patch.object(MQTT, "reconnect", side_effect=ConnectionError), patch.object(MQTT, "wait_for_connection",
+                                                                                    return_value=False):
+        assert not mqtt.publish_chunked(message, "topic", 1024)
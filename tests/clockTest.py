@@ -0,0 +1,41 @@
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytz
+from sentinel_mrhat_cam.system import Clock
+
+
+def test_time_is_anchored_once():
+    anchor = datetime(2024, 8, 14, 15, 57, 40, tzinfo=pytz.UTC)
+    source = MagicMock(return_value=anchor.isoformat())
+    clock = Clock(source)
+
+    first = clock.now()
+    time.sleep(0.05)
+    second = clock.now()
+
+    source.assert_called_once()
+    assert timedelta(0) <= first - anchor < timedelta(seconds=0.05)
+    assert timedelta(seconds=0.05) <= second - first < timedelta(seconds=1)
+    assert datetime.fromisoformat(clock.get_time()).tzinfo is not None
+
+
+def test_drift_anchors_again():
+    source = MagicMock(side_effect=[(datetime.now(pytz.UTC) - timedelta(seconds=100)).isoformat(),
+                                    datetime.now(pytz.UTC).isoformat()])
+    clock = Clock(source, max_drift=2)
+
+    assert clock.check_drift() > 99
+    assert source.call_count == 2
+    assert abs(clock.check_drift()) < 2
+    assert source.call_count == 2
+
+
+def test_drift_check_runs_in_background():
+    source = MagicMock(side_effect=lambda: (datetime.now(pytz.UTC) - timedelta(seconds=100)).isoformat())
+    clock = Clock(source, resync_interval=0.01)
+    clock.now()
+    clock.start()
+    time.sleep(0.1)
+    clock.stop()
+    assert source.call_count > 1
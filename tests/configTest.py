@@ -0,0 +1,28 @@
+import json
+import pytest
+from sentinel_mrhat_cam.app_config import Config
+
+# A config.json written before the message formats and the power policy
+PRE_SERIES_CONFIG = {
+    "quality": "HD",
+    "mode": "periodic",
+    "period": 60,
+    "wakeUpTime": "06:00:00",
+    "shutDownTime": "21:00:00",
+}
+
+
+def test_pre_series_config_is_loaded(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(PRE_SERIES_CONFIG))
+    config = Config(str(path))
+
+    assert config.data == {**Config.get_default_config(), **PRE_SERIES_CONFIG}
+    assert config.data["messageFormat"] == "json"
+
+
+def test_unknown_key_is_rejected():
+    with pytest.raises(ValueError, match="messageFromat"):
+        Config.validate_config(dict(PRE_SERIES_CONFIG, messageFromat="binary"))
+    with pytest.raises(ValueError):
+        Config.validate_config(dict(PRE_SERIES_CONFIG, messageFormat="png"))
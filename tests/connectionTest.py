@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock
+import pytest
+from sentinel_mrhat_cam.connection import ConnectionManager, Publisher
+from sentinel_mrhat_cam.mqtt import MQTT
+
+
+@pytest.fixture
+def mqtt():
+    mqtt = MagicMock()
+    mqtt.connection_listeners = []
+    mqtt.qos = 2
+    mqtt.wait_for_connection.return_value = True
+    mqtt.reconnector.attempts = 1
+    mqtt.reconnector.failed_attempts = 0
+    mqtt.reconnector.state = "connected"
+    return mqtt
+
+
+def test_users_share_one_connection(mqtt):
+    connection = ConnectionManager(mqtt)
+    # The logger and the config connect before sending too
+    connection.connect()
+    connection.connect(timeout=0)
+
+    assert mqtt.reconnector.start.call_count == 2
+    assert [call.args for call in mqtt.wait_for_connection.call_args_list] == [(10,), (0,)]
+    mqtt.connect.assert_not_called()
+
+
+def test_connect_raises_without_link(mqtt):
+    connection = ConnectionManager(mqtt)
+    mqtt.wait_for_connection.return_value = False
+    with pytest.raises(ConnectionError):
+        connection.connect(timeout=0)
+    assert not connection.wait()
+
+
+def test_stats_count_the_reconnects(mqtt):
+    connection = ConnectionManager(mqtt)
+    mqtt.is_connected.return_value = True
+    for listener in mqtt.connection_listeners:
+        listener(True)
+        listener(False)
+        listener(True)
+
+    stats = connection.stats()
+    assert (stats["connects"], stats["reconnects"], stats["disconnects"]) == (2, 1, 1)
+    assert stats["uptime"] is not None and stats["clients"] == MQTT.clients
+    assert (stats["attempts"], stats["failures"], stats["state"]) == (1, 0, "connected")
+
+
+def test_publishers_are_shared_per_topic(mqtt):
+    connection = ConnectionManager(mqtt)
+    logs = connection.publisher("logs", qos=0)
+    assert connection.publisher("logs") is logs and connection.publisher("images") is not logs
+
+    mqtt.publish_nowait.return_value = True
+    assert logs.publish_nowait("message")
+    mqtt.publish_nowait.assert_called_once_with("message", "logs", 0, False)
+
+    mqtt.publish.side_effect = [0.1, None]
+    images = connection.publisher("images")
+    images.publish(b"12345")
+    images.publish(b"123")
+
+    assert connection.publisher_stats() == {"logs": {"messages": 1, "bytes": 7, "failures": 0},
+                                            "images": {"messages": 2, "bytes": 8, "failures": 1}}
+
+
+def test_rejected_message_is_a_failure(mqtt):
+    mqtt.publish_nowait.return_value = False
+    publisher = Publisher(ConnectionManager(mqtt), "power")
+
+    assert not publisher.publish_nowait("samples", retain=True)
+    assert publisher.failures == 1
+    # The topics which are not listed are telemetry
+    mqtt.publish_nowait.assert_called_once_with("samples", "power", 1, True)
+
+
+def test_shared_manager_is_created_once(monkeypatch, mqtt):
+    monkeypatch.setattr(ConnectionManager, "_shared", None)
+    monkeypatch.setattr("sentinel_mrhat_cam.connection.MQTT", lambda: mqtt)
+
+    assert ConnectionManager.shared() is ConnectionManager.shared()
+    assert len(mqtt.connection_listeners) == 1
@@ -0,0 +1,72 @@
+import csv
+import json
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from sentinel_mrhat_cam.energy import EnergyMeter
+from sentinel_mrhat_cam.power import PowerSampler
+
+
+@pytest.fixture
+def sampler(tmp_path):
+    sampler = PowerSampler(str(tmp_path / "battery"), str(tmp_path / "charger"), rate=10, capacity=100)
+    # 4 V, 0.5 A from 0 to 5 s, then 4 V, 1 A
+    for t in np.arange(0, 10, 0.1):
+        index = sampler.count
+        sampler.times[index] = t
+        sampler.values[index] = (4, -0.5 if t < 5 else -1, np.nan, np.nan)
+        sampler.count += 1
+    return sampler
+
+
+def test_phases_are_integrated(sampler, tmp_path):
+    meter = EnergyMeter(sampler, str(tmp_path / "energy.csv"))
+    meter.record("capture", 1, 3)
+    meter.record("capture", 6, 7)
+    meter.record("publish", 7, 9)
+    meter.delivered()
+
+    report = meter.report()
+    assert report["phases"]["capture"] == {"count": 2, "seconds": 3, "joules": 8.0, "mAh": 0.5556}
+    assert report["phases"]["publish"]["joules"] == 8.0
+    assert report["images"] == 1
+    assert report["joulesPerImage"] == 16.0
+
+    with open(tmp_path / "energy.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["phase"] for row in rows] == ["capture", "capture", "publish"]
+    assert rows[0]["joules"] == "4.0000" and rows[0]["batteryVoltage"] == "4.000"
+
+
+def test_phase_before_the_first_sample_is_estimated(sampler, tmp_path):
+    sampler.times += 100
+    meter = EnergyMeter(sampler, None)
+    meter.record("boot", 0, 99.5)
+    assert meter.report()["phases"]["boot"]["joules"] == pytest.approx(199)
+
+
+def test_without_sampler_only_durations_are_accounted(tmp_path):
+    meter = EnergyMeter(None, str(tmp_path / "energy.csv"))
+    with meter.phase("encode"):
+        pass
+    phase = meter.report()["phases"]["encode"]
+    assert phase["count"] == 1 and phase["joules"] == 0
+    assert meter.report()["joulesPerImage"] is None
+    assert not (tmp_path / "energy.csv").exists()
+
+
+def test_report_is_sent_when_due(tmp_path):
+    from sentinel_mrhat_cam.camera import Camera
+    from sentinel_mrhat_cam.transmit import Transmit
+    transmit = Transmit(Camera({"quality": "HD"}), MagicMock(), None, MagicMock())
+    transmit.outbox = None
+    transmit.send = MagicMock(return_value=True)
+
+    transmit.publish_message("image")
+    assert transmit.send.call_count == 1
+
+    transmit.next_energy_report = 0
+    transmit.publish_message("image")
+    message, topic = transmit.send.call_args.args
+    assert topic == "cam4/energy"
+    assert json.loads(message)["images"] == 2
@@ -0,0 +1,101 @@
+import io
+import json
+from unittest.mock import MagicMock
+import pytest
+from PIL import Image
+from sentinel_mrhat_cam.frame_store import FrameStore
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.message import BinaryMessage
+from sentinel_mrhat_cam.transmit import Transmit
+
+TIMESTAMPS = [f"2024-07-11T18:52:{second:02d}.179690+00:00" for second in range(60)]
+
+
+def test_frames_are_found_by_timestamp(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=10_000, slots=16)
+    store.put(TIMESTAMPS[0], b"first")
+    store.put(TIMESTAMPS[1], b"second")
+    assert store.get(TIMESTAMPS[0]) == b"first"
+    assert store.get(TIMESTAMPS[1]) == b"second"
+    assert store.get(TIMESTAMPS[2]) is None
+
+
+def test_oldest_frames_are_overwritten(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=1000, slots=16)
+    for timestamp in TIMESTAMPS[:10]:
+        store.put(timestamp, timestamp.encode() * 8)
+
+    # 264 bytes per frame, so only the last 3 fit into the segment
+    assert [store.get(timestamp) is not None for timestamp in TIMESTAMPS[:10]] == [False] * 7 + [True] * 3
+    assert store.get(TIMESTAMPS[9]) == TIMESTAMPS[9].encode() * 8
+
+
+def test_slots_limit_the_number_of_frames(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=100_000, slots=4)
+    for timestamp in TIMESTAMPS[:6]:
+        store.put(timestamp, b"frame")
+    assert len(store.timestamps()) == 4
+    assert store.timestamps()[0] == FrameStore.key(TIMESTAMPS[2])
+
+
+def test_index_survives_restart(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=10_000, slots=16)
+    store.put(TIMESTAMPS[0], b"first")
+    store.close()
+
+    reopened = FrameStore(str(tmp_path), capacity=10_000, slots=16)
+    assert reopened.get(TIMESTAMPS[0]) == b"first"
+    reopened.put(TIMESTAMPS[1], b"second")
+    assert reopened.get(TIMESTAMPS[0]) == b"first"
+
+    resized = FrameStore(str(tmp_path), capacity=20_000, slots=16)
+    assert resized.timestamps() == []
+
+
+def test_corrupted_frame_is_not_returned(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=10_000, slots=16)
+    store.put(TIMESTAMPS[0], b"first")
+    with open(store.segment_path, "r+b") as f:
+        f.write(b"X")
+    assert store.get(TIMESTAMPS[0]) is None
+
+
+def test_frame_larger_than_the_store(tmp_path):
+    store = FrameStore(str(tmp_path), capacity=10, slots=16)
+    with pytest.raises(ValueError):
+        store.put(TIMESTAMPS[0], b"x" * 11)
+
+
+@pytest.fixture
+def transmit(tmp_path, monkeypatch):
+    transmit = Transmit(Camera({"quality": "HD"}), MagicMock(), None, MagicMock(), message_format="binary")
+    transmit.frame_store = FrameStore(str(tmp_path), capacity=10_000_000, slots=16)
+    monkeypatch.setattr(transmit, "gather_telemetry", lambda timestamp: {"timestamp": timestamp})
+    monkeypatch.setattr(transmit, "send", MagicMock())
+    return transmit
+
+
+def test_preview_is_sent_and_full_frame_is_served(transmit):
+    metadata, preview = BinaryMessage.unpack(transmit.create_message(transmit.camera.capture(), TIMESTAMPS[0]))
+    assert metadata["preview"]
+    assert Image.open(io.BytesIO(preview)).size == (640, 360)
+
+    request = MagicMock(payload=json.dumps({"timestamp": TIMESTAMPS[0]}).encode(), retain=True)
+    transmit.on_frame_request(None, None, request)
+    transmit.serve_frame_requests()
+
+    message, topic = transmit.send.call_args.args
+    metadata, full = BinaryMessage.unpack(message)
+    assert metadata == {"timestamp": TIMESTAMPS[0], "fullResolution": True}
+    assert Image.open(io.BytesIO(full)).size == (1920, 1080)
+    # The retained request is cleared
+    assert transmit.mqtt.publish_nowait.call_args.args[3]
+
+
+def test_missing_frame_is_answered_with_error(transmit):
+    transmit.on_frame_request(None, None, MagicMock(payload=json.dumps({"timestamp": TIMESTAMPS[5]}).encode(),
+                                                    retain=False))
+    transmit.serve_frame_requests()
+    message, _ = transmit.send.call_args.args
+    assert json.loads(message)["error"] == "Frame not found"
+    transmit.mqtt.client.publish.assert_not_called()
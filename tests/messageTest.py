@@ -0,0 +1,62 @@
+import json
+import pytest
+from unittest.mock import patch
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.message import BinaryMessage
+from sentinel_mrhat_cam.transmit import Transmit
+
+
+@pytest.fixture
+def metadata():
+    return {
+        "timestamp": "2024-07-11T18:52:05.179690+00:00",
+        "cpuTemp": 35.6,
+        "batteryTemp": 48.5,
+        "batteryCharge": 95
+    }
+
+
+@pytest.fixture
+def transmit():
+    return Transmit(Camera({"quality": "HD"}), None, None, None, message_format="binary")
+
+
+def test_pack_unpack_roundtrip(metadata):
+    image = b"\xff\xd8" + bytes(range(256)) * 10 + b"\xff\xd9"
+    payload = BinaryMessage.pack(metadata, image)
+
+    assert BinaryMessage.is_binary(payload)
+    assert len(payload) == BinaryMessage.HEADER.size + len(json.dumps(metadata, separators=(",", ":"))) + len(image)
+    assert BinaryMessage.unpack(payload) == (metadata, image)
+
+
+def test_json_payload_is_not_binary(metadata):
+    assert not BinaryMessage.is_binary(json.dumps(metadata).encode())
+
+
+@pytest.mark.parametrize("payload, error", [
+    (b"SMCI", "shorter"),
+    (b"XXXX" + bytes(8), "not a binary"),
+    (BinaryMessage.HEADER.pack(b"SMCI", 99, 0, 0, 0), "version"),
+    (BinaryMessage.HEADER.pack(b"SMCI", 1, 0, 2, 5) + b"{}", "length"),
+])
+def test_unpack_invalid(payload, error):
+    with pytest.raises(ValueError, match=error):
+        BinaryMessage.unpack(payload)
+
+
+def test_create_message_binary(transmit, metadata):
+    image = transmit.camera.capture()
+    with patch.object(Transmit, "gather_telemetry", return_value=dict(metadata)):
+        message = transmit.create_message(image, metadata["timestamp"])
+
+    decoded_metadata, jpeg = BinaryMessage.unpack(message)
+    assert decoded_metadata == metadata
+    assert jpeg[:2] == b"\xff\xd8"
+
+
+def test_create_message_binary_falls_back_to_json_on_capture_error(transmit, metadata):
+    with patch.object(Transmit, "gather_telemetry", return_value=dict(metadata)):
+        message = transmit.create_message(None, metadata["timestamp"])
+
+    assert json.loads(message)["image"] == "Error: Camera was unable to capture the image."
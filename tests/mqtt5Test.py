@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+from paho.mqtt import client as mqtt_client
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from sentinel_mrhat_cam import mqtt as mqtt_module
+from sentinel_mrhat_cam.message import BinaryMessage
+from sentinel_mrhat_cam.mqtt import MQTT
+from sentinel_mrhat_cam.mqtt5 import V5Transport
+
+
+def connack(alias_maximum):
+    properties = Properties(PacketTypes.CONNACK)
+    properties.TopicAliasMaximum = alias_maximum
+    return properties
+
+
+def test_binary_message_metadata_goes_into_user_properties():
+    transport = V5Transport(alias_topics=(), expiry={"images": 60})
+    metadata = {"timestamp": "2024-07-11T18:52:05+00:00", "cpuTemp": 35.6, "connection": {"clients": 1}}
+    topic, payload, properties = transport.prepare("images", BinaryMessage.pack(metadata, b"\xff\xd8jpeg"), 2)
+
+    assert (topic, payload) == ("images", b"\xff\xd8jpeg")
+    assert properties.MessageExpiryInterval == 60
+    assert V5Transport.unpack(payload, properties) == (metadata, b"\xff\xd8jpeg")
+
+    # The other messages are sent as they are
+    topic, payload, properties = transport.prepare("logs", "log line", 0)
+    assert payload == "log line" and V5Transport.unpack(payload, properties) is None
+    assert not hasattr(properties, "MessageExpiryInterval")
+
+
+def test_alias_replaces_the_topic_after_the_first_message():
+    transport = V5Transport(alias_topics=("images", "logs"))
+    transport.on_connect(SimpleNamespace(session_present=True), connack(1))
+
+    first, second = [transport.prepare("images", b"frame", 0) for _ in range(2)]
+    assert (first[0], first[2].TopicAlias) == ("images", 1)
+    assert (second[0], second[2].TopicAlias) == ("", 1)
+    # The broker accepts a single alias
+    assert transport.prepare("logs", "line", 0)[0] == "logs"
+    assert transport.session_present
+
+
+def test_resendable_messages_keep_their_topic():
+    transport = V5Transport(alias_topics=("images",))
+    transport.on_connect(SimpleNamespace(session_present=False), connack(1))
+
+    # The client resends the QoS 1 and 2 messages after a reconnect, where the broker does not know the alias
+    for qos in (1, 2):
+        topic, _, properties = transport.prepare("images", b"frame", qos)
+        assert topic == "images" and not hasattr(properties, "TopicAlias")
+
+
+def test_aliases_are_not_used_between_connections():
+    transport = V5Transport(alias_topics=("images",))
+    transport.on_connect(SimpleNamespace(session_present=False), connack(1))
+    transport.prepare("images", b"frame", 0)
+    transport.on_disconnect()
+    assert transport.prepare("images", b"frame", 0)[0] == "images" and transport.aliases == {}
+
+    # The new connection establishes the alias again
+    transport.on_connect(SimpleNamespace(session_present=False), connack(1))
+    assert [transport.prepare("images", b"frame", 0)[0] for _ in range(2)] == ["images", ""]
+
+
+def test_client_uses_a_persistent_v5_session(monkeypatch):
+    monkeypatch.setattr(mqtt_module, "MQTT_V5", True)
+    mqtt = MQTT()
+
+    assert mqtt.v5 is not None and mqtt.client.protocol == mqtt_client.MQTTv5
+    assert mqtt.v5.connect_properties().SessionExpiryInterval == mqtt.v5.session_expiry
+    assert MQTT().v5 is not mqtt.v5
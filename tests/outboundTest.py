@@ -0,0 +1,93 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from sentinel_mrhat_cam.connection import ConnectionManager
+from sentinel_mrhat_cam.outbound import OutboundScheduler
+from sentinel_mrhat_cam.publish_window import PublishHandle
+
+QOS = {"config-ack": 2, "image": 2, "telemetry": 1, "log": 0}
+CLASSES = {"ack": "config-ack", "images": "image", "logs": "log"}
+
+
+def scheduler(**kwargs):
+    return OutboundScheduler(qos=QOS, classes=CLASSES, **kwargs)
+
+
+def in_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_topics_have_the_qos_of_their_class():
+    outbound = scheduler()
+    assert [outbound.classify(topic) for topic in ("ack", "images", "logs", "energy")] == \
+        ["config-ack", "image", "log", "telemetry"]
+    assert [outbound.qos(outbound.classify(topic)) for topic in ("images", "logs")] == [2, 0]
+
+
+def test_token_bucket_shapes_the_rate():
+    outbound = scheduler(rate=1000, burst=100)
+    start = time.monotonic()
+    for _ in range(3):
+        with outbound.slot("telemetry", 100):
+            pass
+
+    # The first message goes with the full bucket, the others wait for it to fill up
+    assert time.monotonic() - start >= 0.19
+    assert outbound.stats["telemetry"].max_wait >= 0.09
+
+
+def test_waiting_image_goes_before_the_logs():
+    outbound = scheduler(rate=1000, burst=100, yielding=())
+    outbound.acquire("telemetry", 100)
+    order = []
+    image = in_thread(lambda: order.append(("image", outbound.acquire("image", 50))))
+    time.sleep(0.01)
+    log = in_thread(lambda: order.append(("log", outbound.acquire("log", 10))))
+    image.join(1)
+    log.join(1)
+
+    assert [name for name, _ in order] == ["image", "log"]
+    # The log needed fewer tokens, but it had to wait for the image
+    assert outbound.report()["log"]["meanWait"] >= 0.04
+
+
+def test_logs_yield_while_an_image_is_in_flight():
+    outbound = scheduler(yield_timeout=1)
+    outbound.acquire("image", 1000)
+    # The telemetry does not yield
+    outbound.acquire("telemetry", 10)
+    log = in_thread(outbound.acquire, "log", 10)
+    time.sleep(0.05)
+    assert log.is_alive()
+
+    outbound.release("image")
+    log.join(1)
+    assert not log.is_alive()
+    assert outbound.stats["log"].yields == 1 and outbound.stats["log"].max_wait >= 0.05
+
+
+def test_yield_is_limited():
+    outbound = scheduler(yield_timeout=0.05)
+    outbound.acquire("image", 1000)
+    assert outbound.acquire("log", 10) >= 0.05
+    assert outbound.in_flight == {"config-ack": 0, "image": 1, "telemetry": 0, "log": 1}
+
+
+def test_published_image_holds_its_slot_until_delivered():
+    mqtt = MagicMock()
+    mqtt.connection_listeners = []
+    handle = PublishHandle(SimpleNamespace(lock=threading.RLock()), "images", 5, timeout=1)
+    mqtt.publish_async.return_value = handle
+    connection = ConnectionManager(mqtt, scheduler())
+
+    assert connection.publisher("images").publish_async(b"12345") is handle
+    mqtt.publish_async.assert_called_once_with(b"12345", "images", False, 2, measured=True)
+    assert connection.scheduler.in_flight["image"] == 1
+
+    handle.finish(PublishHandle.DELIVERED)
+    assert connection.scheduler.in_flight["image"] == 0
+    assert connection.scheduler.report() == {"image": {"messages": 1, "bytes": 5, "meanWait": 0.0,
+                                                       "maxWait": 0.0, "yields": 0}}
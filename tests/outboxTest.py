@@ -0,0 +1,113 @@
+import os
+from unittest.mock import MagicMock
+import pytest
+from sentinel_mrhat_cam.outbox import Outbox
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.transmit import Transmit
+
+
+def drain(outbox, count=100):
+    messages = outbox.peek(count)
+    for message in messages:
+        outbox.commit(message)
+    return [(message.topic, message.message) for message in messages]
+
+
+def test_messages_come_back_oldest_first(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox"))
+    assert outbox.depth == 0 and not os.path.exists(tmp_path / "outbox")
+
+    outbox.append("images", '{"timestamp": 1}')
+    outbox.append("images", b"SMCI\x01binary")
+    outbox.append("full", "third")
+    assert outbox.metrics() == {"outboxDepth": 3, "outboxBytes": outbox.size}
+
+    assert drain(outbox, 2) == [("images", '{"timestamp": 1}'), ("images", b"SMCI\x01binary")]
+    assert drain(outbox) == [("full", "third")]
+    assert outbox.depth == 0 and outbox.size == 0
+
+
+def test_outbox_survives_restart(tmp_path):
+    outbox = Outbox(str(tmp_path), segment_bytes=50)
+    for i in range(5):
+        outbox.append("images", f"message {i}")
+    drain(outbox, 2)
+
+    reopened = Outbox(str(tmp_path), segment_bytes=50)
+    assert reopened.depth == 3
+    assert [message for _, message in drain(reopened)] == ["message 2", "message 3", "message 4"]
+    # The segments which were read to their end are deleted
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".seg")]) == 1
+
+
+def test_incomplete_record_is_cut_off(tmp_path):
+    outbox = Outbox(str(tmp_path))
+    outbox.append("images", "complete")
+    outbox.append("images", "cut by a power loss")
+    segment = outbox.segment_path(max(outbox.segments))
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - 5)
+
+    reopened = Outbox(str(tmp_path))
+    assert reopened.depth == 1
+    reopened.append("images", "after restart")
+    assert [message for _, message in drain(reopened)] == ["complete", "after restart"]
+
+
+def test_oldest_messages_are_evicted(tmp_path):
+    outbox = Outbox(str(tmp_path), max_bytes=200, segment_bytes=60)
+    for i in range(20):
+        outbox.append("images", f"message {i:02d} " + "x" * 20)
+
+    assert outbox.size <= 200
+    assert outbox.dropped == 20 - outbox.depth
+    messages = [message for _, message in drain(outbox)]
+    assert messages[-1].startswith("message 19")
+    assert messages == sorted(messages)
+
+
+@pytest.fixture
+def transmit(tmp_path):
+    mqtt = MagicMock()
+    transmit = Transmit(Camera({"quality": "HD"}), MagicMock(), None, mqtt)
+    transmit.outbox = Outbox(str(tmp_path))
+    return transmit
+
+
+def test_offline_messages_are_stored_and_drained(transmit):
+    transmit.mqtt.wait_for_connection.return_value = False
+
+    transmit.publish_message("first")
+    transmit.publish_message("second")
+    # The client is connected in the background, the messages do not wait for the broker
+    assert transmit.mqtt.reconnector.start.call_count == 1
+    assert [call.args for call in transmit.mqtt.wait_for_connection.call_args_list] == [(0,), (0,)]
+    assert transmit.outbox.depth == 2
+
+    transmit.mqtt.wait_for_connection.return_value = True
+    transmit.mqtt.publish.return_value = 0.1
+    transmit.mqtt.publish_async.return_value.wait.return_value = True
+    transmit.publish_message("third")
+
+    published = [call.args[0] for call in transmit.mqtt.publish.call_args_list]
+    drained = [call.args[0] for call in transmit.mqtt.publish_async.call_args_list]
+    assert published + drained == ["third", "first", "second"]
+    assert transmit.outbox.depth == 0
+
+
+def test_failed_publish_is_stored(transmit):
+    transmit.mqtt.client.is_connected.return_value = True
+    transmit.mqtt.publish.return_value = None
+    assert not transmit.send("message", "topic")
+    assert drain(transmit.outbox) == [("topic", "message")]
+
+
+def test_drain_commits_up_to_the_first_undelivered(transmit):
+    for message in ("first", "second", "third"):
+        transmit.outbox.append("topic", message)
+    handles = [MagicMock(**{"wait.return_value": delivered}) for delivered in (True, False, True)]
+    transmit.mqtt.publish_async.side_effect = handles
+
+    transmit.drain_outbox()
+    assert transmit.mqtt.publish_async.call_count == 3
+    assert drain(transmit.outbox) == [("topic", "second"), ("topic", "third")]
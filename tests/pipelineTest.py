@@ -0,0 +1,60 @@
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from sentinel_mrhat_cam.pipeline import Pipeline
+
+
+@pytest.fixture
+def transmit():
+    transmit = MagicMock()
+    transmit.camera.capture.side_effect = range(1000)
+    transmit.build_message.side_effect = lambda image, timestamp: f"message-{image}"
+    return transmit
+
+
+@pytest.fixture(autouse=True)
+def mock_rtc():
+    with patch('sentinel_mrhat_cam.pipeline.RTC.get_time', return_value="2024-08-14T15:57:40+00:00"):
+        yield
+
+
+def test_frames_are_published_in_order(transmit):
+    pipeline = Pipeline(transmit)
+    published = []
+
+    def publish(message):
+        published.append(message)
+        if len(published) == 5:
+            pipeline.stop()
+    transmit.publish_message.side_effect = publish
+
+    pipeline.run(stats_interval=0.1)
+
+    assert published == [f"message-{i}" for i in range(5)]
+    assert pipeline.stats[2].items == 5
+    assert pipeline.stats[0].items >= 5
+
+
+def test_capture_runs_while_publishing(transmit):
+    pipeline = Pipeline(transmit, capture_queue_depth=1, publish_queue_depth=1)
+
+    def publish(message):
+        time.sleep(0.2)
+        pipeline.stop()
+    transmit.publish_message.side_effect = publish
+
+    pipeline.run(stats_interval=0.1)
+
+    # While the first message was being published, the next frames were captured and encoded
+    assert pipeline.stats[0].items >= 3
+    assert pipeline.stats[1].items >= 2
+    assert pipeline.stats[2].summary()["busy"] > pipeline.stats[0].summary()["busy"]
+
+
+def test_stage_error_stops_the_pipeline(transmit):
+    transmit.publish_message.side_effect = SystemExit(1)
+    pipeline = Pipeline(transmit)
+
+    with pytest.raises(SystemExit):
+        pipeline.run(stats_interval=0.1)
+    assert pipeline.stop_event.is_set()
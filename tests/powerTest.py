@@ -0,0 +1,94 @@
+import io
+import json
+import time
+from unittest.mock import MagicMock
+import numpy as np
+from sentinel_mrhat_cam.power import PowerSampler
+
+BATTERY = "POWER_SUPPLY_VOLTAGE_NOW={voltage}\nPOWER_SUPPLY_CURRENT_NOW={current}\n"
+
+
+def create_sampler(tmp_path, capacity=100):
+    (tmp_path / "battery").write_text(BATTERY.format(voltage=4000000, current=500000))
+    return PowerSampler(str(tmp_path / "battery"), str(tmp_path / "charger"), rate=100, capacity=capacity)
+
+
+def set_samples(sampler, times, voltage, current):
+    for t, v, i in zip(times, voltage, current):
+        index = sampler.count % len(sampler.times)
+        sampler.times[index] = t
+        sampler.values[index] = (v, i, np.nan, np.nan)
+        sampler.count += 1
+
+
+def test_sample_reads_the_uevent_file(tmp_path):
+    sampler = create_sampler(tmp_path)
+    sampler.sample()
+    times, values = sampler.window()
+    assert len(times) == 1
+    assert values[0, :2].tolist() == [4.0, 0.5]
+    # The charger is missing
+    assert np.isnan(values[0, 2:]).all()
+
+
+def test_stats_of_a_window(tmp_path):
+    sampler = create_sampler(tmp_path)
+    set_samples(sampler, [0, 1, 2, 3, 4], [4, 4, 4, 4, 4], [0.5, 0.5, 1, 1, 1])
+
+    stats = sampler.stats(start=1, end=3)
+    assert stats["batteryCurrent"] == {"min": 0.5, "max": 1, "mean": 2.5 / 3, "integral": 1.75}
+    assert stats["batteryPower"]["integral"] == 7
+    assert "chargerVoltage" not in stats
+
+    summary = sampler.summary(start=1)
+    assert summary["samples"] == 4 and summary["duration"] == 3
+    assert summary["batteryVoltage"] == [4, 4, 4]
+    assert summary["batteryEnergy"] == 11
+    assert sampler.summary(start=10) is None
+
+
+def test_oldest_samples_are_overwritten(tmp_path):
+    sampler = create_sampler(tmp_path, capacity=4)
+    set_samples(sampler, range(10), range(10), [1] * 10)
+    times, values = sampler.window()
+    assert times.tolist() == [6, 7, 8, 9]
+    assert values[:, 0].tolist() == [6, 7, 8, 9]
+
+
+def test_exactly_full_buffer(tmp_path):
+    sampler = create_sampler(tmp_path, capacity=4)
+    set_samples(sampler, range(4), range(4), [1] * 4)
+    times, values = sampler.window()
+    assert times.tolist() == [0, 1, 2, 3]
+    assert values[:, 0].tolist() == [0, 1, 2, 3]
+    assert sampler.stats()["batteryVoltage"]["max"] == 3
+
+
+def test_sampling_thread(tmp_path):
+    sampler = create_sampler(tmp_path)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.close()
+    assert 5 < sampler.count < 40
+
+
+def test_dump(tmp_path):
+    sampler = create_sampler(tmp_path)
+    now = time.monotonic()
+    set_samples(sampler, [now - 1, now], [4, 4], [0.5, 1])
+    samples = np.load(io.BytesIO(sampler.dump()))
+    assert samples["batteryCurrent"].tolist() == [0.5, 1]
+    assert abs(samples["time"][1] - time.time()) < 1
+
+
+def test_power_request_is_answered(tmp_path):
+    from sentinel_mrhat_cam.camera import Camera
+    from sentinel_mrhat_cam.transmit import Transmit
+    transmit = Transmit(Camera({"quality": "HD"}), MagicMock(), None, MagicMock())
+    transmit.power = create_sampler(tmp_path)
+    transmit.power.sample()
+
+    transmit.on_power_request(None, None, MagicMock(payload=json.dumps({"seconds": 60}).encode()))
+    payload, topic, _, _ = transmit.mqtt.publish_nowait.call_args.args
+    assert topic == "sentinel/cam4/power"
+    assert len(np.load(io.BytesIO(payload))["time"]) == 1
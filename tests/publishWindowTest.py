@@ -0,0 +1,92 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from sentinel_mrhat_cam.publish_window import PublishHandle, PublishWindow
+
+
+class FakeClient:
+    """
+    Hands out message IDs, the test acknowledges them by calling ``on_publish``.
+    """
+
+    def __init__(self, rc=0, ack_immediately=False):
+        self.rc = rc
+        self.ack_immediately = ack_immediately
+        self.published = []
+        self.on_publish = None
+        self.max_inflight = None
+
+    def max_inflight_messages_set(self, count):
+        self.max_inflight = count
+
+    def publish(self, topic, message, qos=0, retain=False, properties=None):
+        mid = len(self.published) + 1
+        self.published.append((topic, message, qos))
+        if self.ack_immediately:
+            # The network thread can acknowledge before publish returns
+            self.on_publish(self, None, mid, None, None)
+        return SimpleNamespace(mid=mid, rc=self.rc)
+
+
+@pytest.fixture
+def results():
+    return []
+
+
+def test_messages_are_in_flight_together(results):
+    client = FakeClient()
+    window = PublishWindow(client, qos=2, max_inflight=4, timeout=1, on_result=results.append)
+    handles = [window.submit(f"message {i}", "topic") for i in range(3)]
+
+    assert window.in_flight == 3 and client.max_inflight == 4
+    assert not any(handle.done for handle in handles)
+    for handle in reversed(handles):
+        client.on_publish(client, None, handle.mid, None, None)
+
+    assert all(handle.wait() for handle in handles)
+    assert [handle.mid for handle in results] == [3, 2, 1]
+    assert window.stats[PublishHandle.DELIVERED] == 3 and window.in_flight == 0
+
+
+def test_early_acknowledgement_is_not_lost(results):
+    window = PublishWindow(FakeClient(ack_immediately=True), on_result=results.append)
+    handle = window.submit(b"payload", "topic")
+
+    assert handle.delivered and handle.size == 7
+    assert results == [handle]
+
+
+def test_timeout_is_reported(results):
+    window = PublishWindow(FakeClient(), timeout=0.05, on_result=results.append)
+    handle = window.submit("lost", "topic")
+
+    assert not handle.wait()
+    assert handle.status == PublishHandle.TIMEOUT and results == [handle]
+    # A late acknowledgement does not change the result
+    window.on_publish(None, None, handle.mid, None, None)
+    assert handle.status == PublishHandle.TIMEOUT and window.stats[PublishHandle.DELIVERED] == 0
+
+
+def test_rejected_publish_fails(results):
+    window = PublishWindow(FakeClient(rc=15), on_result=results.append)
+    handle = window.submit("message", "topic")
+
+    assert handle.status == PublishHandle.FAILED and not handle.wait()
+    assert window.in_flight == 0
+
+
+def test_full_window_waits_for_the_oldest():
+    client = FakeClient()
+    window = PublishWindow(client, max_inflight=2, timeout=5)
+    first = window.submit("1", "topic")
+    window.submit("2", "topic")
+
+    timer = threading.Timer(0.1, client.on_publish, args=(client, None, first.mid, None, None))
+    timer.start()
+    start = time.monotonic()
+    window.submit("3", "topic")
+
+    assert 0.05 < time.monotonic() - start < 2
+    assert first.delivered and window.in_flight == 2
+    assert [handle.mid for handle in window.flush(timeout=0.05)] == [2, 3]
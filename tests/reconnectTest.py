@@ -0,0 +1,83 @@
+import random
+import threading
+import time
+from unittest.mock import MagicMock
+from sentinel_mrhat_cam.reconnect import Reconnector
+
+
+class FakeMQTT:
+    """
+    Fails the first `failures` connection attempts, then the broker accepts the connection.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.connection_listeners = []
+        self.client = MagicMock()
+        self.attempts = []
+
+    def connect(self):
+        self.attempts.append(time.monotonic())
+        if len(self.attempts) <= self.failures:
+            raise ConnectionError("Broker is not reachable")
+        threading.Timer(0.01, self.notify, args=(True,)).start()
+
+    def notify(self, connected):
+        for listener in self.connection_listeners:
+            listener(connected)
+
+
+def test_delay_doubles_up_to_the_cap_with_jitter():
+    reconnector = Reconnector(FakeMQTT(), min_delay=1, max_delay=8, jitter=0.5, rng=random.Random(1))
+    delays = []
+    for failures in range(6):
+        reconnector.failures = failures
+        delays.append(reconnector.delay())
+
+    caps = [1, 2, 4, 8, 8, 8]
+    assert all(cap / 2 <= delay <= cap for delay, cap in zip(delays, caps))
+    assert len(set(delays)) == len(delays)
+
+
+def test_connects_in_the_background_after_failures():
+    mqtt = FakeMQTT(failures=2)
+    reconnector = Reconnector(mqtt, min_delay=0.05, max_delay=1, jitter=0)
+    start = time.monotonic()
+    reconnector.start()
+    # Starting does not wait for the broker
+    assert time.monotonic() - start < 0.05 and not reconnector.wait(0)
+
+    try:
+        assert reconnector.wait(2)
+        first, second, third = mqtt.attempts
+        assert second - first >= 0.05 and third - second >= 0.1
+        assert (reconnector.state, reconnector.failures, reconnector.failed_attempts) == (Reconnector.CONNECTED, 0, 2)
+    finally:
+        reconnector.stop(timeout=1)
+    assert not reconnector.running and reconnector.state == Reconnector.STOPPED
+
+
+def test_dropped_link_is_connected_again():
+    mqtt = FakeMQTT()
+    events = []
+    mqtt.connection_listeners.append(events.append)
+    reconnector = Reconnector(mqtt, min_delay=0.02, jitter=0)
+    reconnector.start()
+    try:
+        assert reconnector.wait(1)
+        mqtt.notify(False)
+        assert reconnector.link_down.is_set() and not reconnector.link_up.is_set()
+
+        assert reconnector.wait(1)
+        assert len(mqtt.attempts) == 2 and events == [True, False, True]
+    finally:
+        reconnector.stop(timeout=1)
+
+
+def test_unanswered_connection_is_dropped():
+    mqtt = FakeMQTT()
+    mqtt.connect = lambda: mqtt.attempts.append(time.monotonic())
+    reconnector = Reconnector(mqtt, connect_timeout=0.01)
+
+    assert not reconnector.attempt()
+    mqtt.client.disconnect.assert_called_once()
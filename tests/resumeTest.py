@@ -0,0 +1,86 @@
+import json
+import os
+import time
+import pytest
+from sentinel_mrhat_cam import resume as resume_module
+from sentinel_mrhat_cam.app_config import Config
+from sentinel_mrhat_cam.mqtt import MQTT
+from sentinel_mrhat_cam.resume import ResumeState
+from sentinel_mrhat_cam.static_config import BROKER
+
+
+@pytest.fixture
+def boot(monkeypatch):
+    boot_id = {"value": "boot-1"}
+    monkeypatch.setattr(ResumeState, "boot_id", classmethod(lambda cls: boot_id["value"]))
+    monkeypatch.setattr(MQTT, "verified_broker", None)
+    return boot_id
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(Config.get_default_config()))
+    return str(path)
+
+
+def save(path, files, boot):
+    ResumeState(path).save(files)
+    boot["value"] = "boot-2"
+
+
+def test_snapshot_is_restored_once(tmp_path, boot, config_file):
+    path = str(tmp_path / "resume.json")
+    data = {"period": 30}
+    save(path, {config_file: (ResumeState.signature(config_file), data)}, boot)
+
+    state = ResumeState(path)
+    assert state.warm
+    assert state.cached(config_file) == data
+    assert not os.path.exists(path)
+    assert not ResumeState(path).warm
+
+
+def test_changed_file_is_read_again(tmp_path, boot, config_file):
+    path = str(tmp_path / "resume.json")
+    save(path, {config_file: (ResumeState.signature(config_file), {"period": 30})}, boot)
+    with open(config_file, "a") as f:
+        f.write(" ")
+
+    assert ResumeState(path).cached(config_file) is None
+
+
+def test_config_uses_the_cached_data(boot, config_file):
+    data = dict(Config.get_default_config(), period=42)
+    assert Config(config_file, data).data["period"] == 42
+
+
+@pytest.mark.parametrize("reboot, age, reason", [
+    (False, 0, "this boot"),
+    (True, 2 * resume_module.RESUME_MAX_AGE, "seconds old"),
+])
+def test_cold_start(tmp_path, boot, reboot, age, reason):
+    path = str(tmp_path / "resume.json")
+    ResumeState(path).save({})
+    if reboot:
+        boot["value"] = "boot-2"
+    with open(path) as f:
+        snapshot = json.load(f)
+    snapshot["written"] = time.time() - age
+    with open(path, "w") as f:
+        json.dump(snapshot, f)
+
+    state = ResumeState(path)
+    assert not state.warm
+    assert reason in state.cold_reason
+
+
+def test_apply_skips_the_broker_check(tmp_path, boot, monkeypatch):
+    path = str(tmp_path / "resume.json")
+    MQTT.verified_broker = BROKER
+    monkeypatch.setattr(resume_module.clock, "verified", False)
+    save(path, {}, boot)
+    MQTT.verified_broker = None
+
+    ResumeState(path).apply()
+    assert MQTT.verified_broker == BROKER
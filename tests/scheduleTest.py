@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from sentinel_mrhat_cam.app_config import Config
+from sentinel_mrhat_cam.schedule import BootOverhead, PowerPolicy, Schedule
+from sentinel_mrhat_cam.telemetry import TelemetrySnapshot
+
+
+@pytest.fixture
+def policy(tmp_path):
+    config = dict(Config.get_default_config()["powerPolicy"], enabled=True)
+    return PowerPolicy(config, str(tmp_path / "state.json"))
+
+
+@pytest.mark.parametrize("percentage, charger_current, trend, expected", [
+    (80, 0.05, None, (60, None, False)),
+    (80, 0.7, None, (5, None, True)),
+    (50, 0.7, None, (60, None, False)),
+    (30, 0.05, None, (240, None, False)),
+    (30, 0.05, -8.0, (960, None, False)),
+    (30, 0.5, -8.0, (60, None, False)),
+    (10, 0.7, None, (960, "HD", False)),
+    (None, 0.7, None, (60, None, False)),
+])
+def test_decisions(policy, percentage, charger_current, trend, expected):
+    decision = policy.decide(60, percentage, charger_current, trend)
+    assert decision[:3] == expected
+    assert decision.reason
+
+
+def test_stretched_period_is_limited(policy):
+    assert policy.decide(10000, 10, None, None).period == 10800
+
+
+def test_disabled_policy_keeps_the_period(policy):
+    policy.config["enabled"] = False
+    assert policy.decide(60, 10, None, None)[:3] == (60, None, False)
+
+
+def test_trend_survives_restart(policy, tmp_path):
+    policy.history = [[0, 50], [1800, 48]]
+    policy.save()
+    reopened = PowerPolicy(policy.config, str(tmp_path / "state.json"))
+    assert reopened.trend() == pytest.approx(-4)
+    reopened.history = [[0, 50], [300, 48]]
+    assert reopened.trend() is None
+
+
+def test_schedule_follows_the_decision(policy):
+    schedule = Schedule(60, policy)
+    schedule.adapt(TelemetrySnapshot(battery_percentage=80, charger_current_now=0.7))
+    assert schedule.effective_period == 5
+    assert not schedule.should_shutdown(100)
+
+    schedule.adapt(TelemetrySnapshot(battery_percentage=30, charger_current_now=0.0))
+    assert schedule.effective_period == 240
+    assert schedule.should_shutdown(100)
+
+
+def test_invalid_policy_is_rejected():
+    config = Config.get_default_config()
+    config["powerPolicy"]["lowBattery"] = "low"
+    with pytest.raises(TypeError):
+        Config.validate_config(config)
+    config["powerPolicy"] = {"enabled": True, "lowBatery": 30}
+    with pytest.raises(ValueError):
+        Config.validate_config(config)
+
+
+def test_missing_policy_keys_are_defaults():
+    config = Config.get_default_config()
+    defaults = config.pop("powerPolicy")
+    assert Config.validate_config(config)["powerPolicy"] == defaults
+
+    config["powerPolicy"] = {"enabled": True, "lowBattery": 30}
+    assert Config.validate_config(config)["powerPolicy"] == dict(defaults, enabled=True, lowBattery=30)
+
+
+@pytest.fixture
+def boot_overhead(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("sentinel_mrhat_cam.schedule.clock.now",
+                        lambda: datetime.fromtimestamp(now[0], tz=timezone.utc))
+    sleeps = []
+    monkeypatch.setattr("sentinel_mrhat_cam.schedule.timer.sleep", sleeps.append)
+    overhead = BootOverhead(str(tmp_path / "state.json"))
+    overhead.now, overhead.sleeps = now, sleeps
+    return overhead
+
+
+def cycle(boot_overhead, overhead, waiting_time=100):
+    shutdown_duration = Schedule(60, boot_overhead=boot_overhead).calculate_shutdown_duration(waiting_time)
+    boot_overhead.shutting_down(shutdown_duration, waiting_time)
+    boot_overhead.now[0] += shutdown_duration + overhead
+    reopened = BootOverhead(boot_overhead.path)
+    reopened.now, reopened.sleeps = boot_overhead.now, boot_overhead.sleeps
+    return reopened, reopened.woke_up()
+
+
+def test_boot_overhead_is_learned(boot_overhead):
+    assert boot_overhead.estimate() == 30
+    for overhead in (24, 26, 25, 40):
+        boot_overhead, measured = cycle(boot_overhead, overhead)
+        assert measured == pytest.approx(overhead)
+
+    learned = boot_overhead.state["bootOverhead"]
+    assert learned["samples"] == [24, 26, 25, 40]
+    assert learned["p50"] == 25.5
+    assert boot_overhead.estimate() == pytest.approx(np.percentile([24, 26, 25, 40], 90))
+
+
+def test_early_wake_up_waits_for_the_planned_start(boot_overhead):
+    # Slept 70 seconds, ready after 20 more, so 10 seconds early
+    boot_overhead, measured = cycle(boot_overhead, 20)
+    assert measured == pytest.approx(20)
+    assert boot_overhead.sleeps == [pytest.approx(10)]
+
+
+def test_manual_boot_is_not_learned(boot_overhead):
+    boot_overhead, measured = cycle(boot_overhead, 3600)
+    assert measured == 0 and boot_overhead.samples == []
+    assert boot_overhead.woke_up() == 0
@@ -0,0 +1,91 @@
+import io
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from sentinel_mrhat_cam.startup import InitTasks, StartupReport
+
+
+def test_package_import_is_lazy():
+    code = ("import sys, sentinel_mrhat_cam as s; "
+            "assert 'numpy' not in sys.modules and 'sentinel_mrhat_cam.transmit' not in sys.modules; "
+            "assert s.BROKER and s.ResumeState.__module__ == 'sentinel_mrhat_cam.resume'")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_app_modules_do_not_load_pil():
+    code = "import sys, sentinel_mrhat_cam.transmit; assert 'PIL' not in sys.modules, 'PIL was imported'"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_report_times_imports_and_steps(tmp_path, monkeypatch):
+    (tmp_path / "startup_outer.py").write_text("import time\nimport startup_inner\ntime.sleep(0.02)\n")
+    (tmp_path / "startup_inner.py").write_text("import time\ntime.sleep(0.01)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    stream = io.StringIO()
+    report = StartupReport(stream)
+    report.install()
+    try:
+        with report.step("import"):
+            import startup_outer  # noqa: F401
+    finally:
+        report.uninstall()
+        sys.modules.pop("startup_outer", None)
+        sys.modules.pop("startup_inner", None)
+
+    outer, inner = report.imports
+    assert (outer.name, outer.depth, inner.name, inner.depth) == ("startup_outer", 0, "startup_inner", 1)
+    assert outer.cumulative >= inner.cumulative + 0.02
+    assert outer.self_time >= 0.02
+    assert report.steps[0].name == "import" and report.steps[0].duration >= outer.cumulative
+    assert report not in sys.meta_path
+
+    report.print()
+    assert "  startup_inner" in stream.getvalue()
+
+
+def test_init_tasks_run_in_parallel_after_their_dependencies():
+    times = {}
+    # Camera and connect only get past the barrier if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def task(name, parallel=False):
+        def run():
+            start = time.perf_counter()
+            if parallel:
+                barrier.wait()
+            time.sleep(0.05)
+            times[name] = (start, time.perf_counter())
+            return name
+        return run
+
+    tasks = InitTasks()
+    tasks.add("camera", task("camera", parallel=True))
+    tasks.add("connect", task("connect", parallel=True))
+    tasks.add("focus", task("focus"), after=("camera",))
+    assert tasks.run() == {"camera": "camera", "connect": "connect", "focus": "focus"}
+
+    assert times["camera"][0] < times["connect"][1] and times["connect"][0] < times["camera"][1]
+    assert times["focus"][0] >= times["camera"][1]
+    assert {timing.name for timing in tasks.timings} == {"camera", "connect", "focus"}
+
+
+def test_init_task_failure_skips_the_dependent_tasks():
+    ran = []
+
+    def fail():
+        raise RuntimeError("no camera")
+
+    tasks = InitTasks()
+    tasks.add("camera", fail)
+    tasks.add("focus", lambda: ran.append("focus"), after=("camera",))
+    tasks.add("connect", lambda: ran.append("connect"))
+    with pytest.raises(RuntimeError, match="no camera"):
+        tasks.run()
+
+    assert ran == ["connect"]
+    assert [(timing.name, timing.failed) for timing in tasks.timings if timing.name == "camera"] == [("camera", True)]
+    with pytest.raises(ValueError):
+        tasks.add("late", fail, after=("unknown",))
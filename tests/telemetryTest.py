@@ -0,0 +1,60 @@
+from sentinel_mrhat_cam.telemetry import Telemetry
+
+BATTERY = """POWER_SUPPLY_NAME=bq2562x-battery
+POWER_SUPPLY_STATUS=Discharging
+POWER_SUPPLY_CAPACITY=87
+POWER_SUPPLY_TEMP=285
+POWER_SUPPLY_VOLTAGE_NOW=3912000
+POWER_SUPPLY_VOLTAGE_AVG=3920000
+POWER_SUPPLY_CURRENT_NOW=-412000
+POWER_SUPPLY_CURRENT_AVG=-398000
+"""
+CHARGER = """POWER_SUPPLY_NAME=bq2562x-charger
+POWER_SUPPLY_VOLTAGE_NOW=5080000
+POWER_SUPPLY_CURRENT_NOW=0
+"""
+
+
+def create_telemetry(tmp_path, ttl=None):
+    (tmp_path / "battery").write_text(BATTERY)
+    (tmp_path / "charger").write_text(CHARGER)
+    (tmp_path / "temp").write_text("45123\n")
+    return Telemetry(str(tmp_path / "battery"), str(tmp_path / "charger"), str(tmp_path / "temp"),
+                     ttl or {"cpu": 0, "battery": 0, "charger": 0})
+
+
+def test_values_are_parsed(tmp_path):
+    snapshot = create_telemetry(tmp_path).snapshot()
+    assert snapshot.cpu_temp == 45.123
+    assert snapshot.battery_temp == 28.5
+    assert snapshot.battery_percentage == 87
+    assert snapshot.battery_voltage_now == 3.912
+    assert snapshot.battery_current_avg == -0.398
+    assert snapshot.charger_voltage_now == 5.08
+    assert snapshot.charger_current_now == 0
+
+
+def test_values_are_cached_until_they_expire(tmp_path):
+    telemetry = create_telemetry(tmp_path, {"cpu": 0, "battery": 3600, "charger": 3600})
+    assert telemetry.snapshot().battery_percentage == 87
+
+    (tmp_path / "battery").write_text(BATTERY.replace("CAPACITY=87", "CAPACITY=86"))
+    (tmp_path / "temp").write_text("50000\n")
+    snapshot = telemetry.snapshot()
+    assert snapshot.battery_percentage == 87
+    assert snapshot.cpu_temp == 50.0
+
+
+def test_snapshot_is_a_copy(tmp_path):
+    telemetry = create_telemetry(tmp_path)
+    snapshot = telemetry.snapshot()
+    (tmp_path / "temp").write_text("60000\n")
+    telemetry.snapshot()
+    assert snapshot.cpu_temp == 45.123
+
+
+def test_missing_source_gives_none(tmp_path):
+    telemetry = Telemetry(str(tmp_path / "battery"), str(tmp_path / "charger"), str(tmp_path / "temp"))
+    snapshot = telemetry.snapshot()
+    assert snapshot.cpu_temp is None and snapshot.battery_percentage is None
+    telemetry.close()
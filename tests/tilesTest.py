@@ -0,0 +1,80 @@
+import io
+import pytest
+import numpy as np
+from PIL import Image
+from sentinel_mrhat_cam.camera import Camera
+from sentinel_mrhat_cam.message import BinaryMessage
+from sentinel_mrhat_cam.tiles import TileEncoder, TileCompositor
+
+
+@pytest.fixture(params=["YUV420", "BGR888"])
+def camera(request):
+    camera = Camera({"quality": "HD"})
+    camera.format = request.param
+    camera.quality = 90
+    return camera
+
+
+def frame_with_bird(camera, left, top):
+    rgb = Camera.synthetic_rgb(camera.width, camera.height)
+    rgb[top:top + 100, left:left + 150] = (250, 250, 250)
+    return Camera.rgb_to_yuv420(rgb) if camera.format == "YUV420" else rgb
+
+
+def decode(jpeg):
+    return np.asarray(Image.open(io.BytesIO(jpeg)).convert("L"), dtype=np.int16)
+
+
+def test_only_changed_tiles_are_sent(camera):
+    encoder = TileEncoder(camera, keyframe_interval=10)
+    metadata, keyframe = encoder.encode(frame_with_bird(camera, 0, 0))
+    assert metadata["keyframe"]
+
+    metadata, images = encoder.encode(frame_with_bird(camera, 500, 300))
+    assert not metadata["keyframe"]
+    assert metadata["keyframeId"] == encoder.keyframe_id
+    # The old and the new place of the bird, out of the 15 x 9 tiles
+    assert sorted((row, column) for row, column, _ in metadata["tiles"]) == [
+        (0, 0), (0, 1), (2, 3), (2, 4), (2, 5), (3, 3), (3, 4), (3, 5)]
+    assert len(images) == sum(length for _, _, length in metadata["tiles"])
+    assert len(images) < len(keyframe) / 4
+
+    metadata, images = encoder.encode(frame_with_bird(camera, 500, 300))
+    assert metadata["tiles"] == [] and images == b""
+
+
+def test_compositor_rebuilds_the_frame(camera):
+    encoder = TileEncoder(camera, keyframe_interval=10)
+    compositor = TileCompositor()
+    compositor.add(*encoder.encode(frame_with_bird(camera, 0, 0)))
+    metadata, images = encoder.encode(frame_with_bird(camera, 500, 300))
+    payload = BinaryMessage.pack(metadata, images)
+
+    composite = decode(compositor.add(*BinaryMessage.unpack(payload)))
+    expected = decode(camera.encode_jpeg(frame_with_bird(camera, 500, 300)))
+    assert composite.shape == expected.shape
+    assert np.abs(composite - expected).mean() < 3
+    assert composite[300:400, 500:650].mean() > 200
+
+
+def test_keyframe_when_interval_or_settings_change(camera):
+    encoder = TileEncoder(camera, keyframe_interval=3)
+    frame = frame_with_bird(camera, 0, 0)
+    assert [encoder.encode(frame)[0]["keyframe"] for _ in range(4)] == [True, False, False, True]
+
+    camera.scale = 2
+    metadata, _ = encoder.encode(frame)
+    assert metadata["keyframe"] and metadata["tileSize"] == 64
+
+
+def test_keyframe_when_most_tiles_change(camera):
+    encoder = TileEncoder(camera)
+    encoder.encode(frame_with_bird(camera, 0, 0))
+    rgb = 255 - Camera.synthetic_rgb(camera.width, camera.height)
+    frame = Camera.rgb_to_yuv420(rgb) if camera.format == "YUV420" else rgb
+    assert encoder.encode(frame)[0]["keyframe"]
+
+
+def test_compositor_drops_delta_without_keyframe():
+    compositor = TileCompositor()
+    assert compositor.add({"keyframe": False, "keyframeId": 3, "tileSize": 128, "tiles": []}, b"") is None